@@ -9,148 +9,206 @@ setInterval(updateTime, 1000);
 updateTime();
 
 // Глобальные переменные
-let allStudents = [];
-let filteredStudents = [];
+let allStudents = [];          // Загруженные страницы списка учеников
+let studentsCursor = null;     // Курсор следующей страницы (X-Next-Cursor)
+let studentsRequestId = 0;     // Отбрасываем ответы устаревших запросов
+let studentsSearchTimer = null;
+const STUDENTS_PAGE_SIZE = 200;
 
 // Загрузка при старте
 document.addEventListener('DOMContentLoaded', function() {
-    loadDashboard();
     loadStudentsStats();
     loadCodesStats();
     loadSessions();
-    loadRecentActivity();
     loadGlobalNotificationStatus();
     loadOlympiadNotificationStatus();
 
-    // Автообновление каждые 30 секунд
-    setInterval(() => {
+    // Статистика и активность приходят из живой ленты, опрос - запасной вариант
+    connectDashboardStream();
+});
+
+// ==================== ЖИВАЯ ЛЕНТА ====================
+
+const DASHBOARD_POLL_INTERVAL = 30000;
+const RECENT_ACTIVITY_LIMIT = 10;
+let dashboardState = null;     // Последняя статистика дашборда
+let recentActivity = [];       // Последняя активность (новые сверху)
+let dashboardPollTimer = null;
+
+function startDashboardPolling() {
+    if (dashboardPollTimer) return;
+    loadDashboard();
+    loadRecentActivity();
+    dashboardPollTimer = setInterval(() => {
         loadDashboard();
         loadRecentActivity();
-    }, 30000);
-});
+    }, DASHBOARD_POLL_INTERVAL);
+}
+
+function stopDashboardPolling() {
+    clearInterval(dashboardPollTimer);
+    dashboardPollTimer = null;
+}
+
+// Server-Sent Events: сначала состояние целиком, затем только изменения.
+// Пока соединение разорвано (EventSource переподключается сам), работает опрос.
+function connectDashboardStream() {
+    if (!window.EventSource) {
+        startDashboardPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/monitoring/stream');
+
+    source.onopen = stopDashboardPolling;
+    source.onerror = startDashboardPolling;
+
+    source.addEventListener('dashboard', event => {
+        // Приходят только изменившиеся разделы статистики
+        dashboardState = Object.assign({}, dashboardState, JSON.parse(event.data));
+        renderDashboard(dashboardState);
+    });
+
+    source.addEventListener('activity', event => {
+        const data = JSON.parse(event.data);
+        const items = new Map((data.reset ? [] : recentActivity).map(item => [item.id, item]));
+        data.items.forEach(item => items.set(item.id, item));
+        recentActivity = [...items.values()]
+            .sort((a, b) => b.timestamp.localeCompare(a.timestamp) || b.id - a.id)
+            .slice(0, RECENT_ACTIVITY_LIMIT);
+        renderActivity(recentActivity);
+    });
+}
 
 // ==================== ДАШБОРД ====================
 
 async function loadDashboard() {
     try {
         const response = await fetch('/api/monitoring/dashboard');
-        const data = await response.json();
-        
-        // Карточки статистики
-        const statsHTML = `
-            <div class="col-md-3">
-                <div class="card stat-card primary">
-                    <div class="card-body">
-                        <h6 class="text-muted mb-2"><i class="bi bi-people"></i> Всего учеников</h6>
-                        <h2 class="mb-0">${data.students.total}</h2>
-                    </div>
+        dashboardState = await response.json();
+        renderDashboard(dashboardState);
+    } catch (error) {
+        console.error('Ошибка загрузки дашборда:', error);
+    }
+}
+
+function renderDashboard(data) {
+// Карточки статистики
+    const statsHTML = `
+        <div class="col-md-3">
+            <div class="card stat-card primary">
+                <div class="card-body">
+                    <h6 class="text-muted mb-2"><i class="bi bi-people"></i> Всего учеников</h6>
+                    <h2 class="mb-0">${data.students.total}</h2>
                 </div>
             </div>
-            <div class="col-md-3">
-                <div class="card stat-card success">
-                    <div class="card-body">
-                        <h6 class="text-muted mb-2"><i class="bi bi-check-circle"></i> Зарегистрировано</h6>
-                        <h2 class="mb-0">${data.students.registered}</h2>
-                    </div>
+        </div>
+        <div class="col-md-3">
+            <div class="card stat-card success">
+                <div class="card-body">
+                    <h6 class="text-muted mb-2"><i class="bi bi-check-circle"></i> Зарегистрировано</h6>
+                    <h2 class="mb-0">${data.students.registered}</h2>
                 </div>
             </div>
-            <div class="col-md-3">
-                <div class="card stat-card warning">
-                    <div class="card-body">
-                        <h6 class="text-muted mb-2"><i class="bi bi-exclamation-circle"></i> Не зарегистрировано</h6>
-                        <h2 class="mb-0">${data.students.not_registered}</h2>
-                    </div>
+        </div>
+        <div class="col-md-3">
+            <div class="card stat-card warning">
+                <div class="card-body">
+                    <h6 class="text-muted mb-2"><i class="bi bi-exclamation-circle"></i> Не зарегистрировано</h6>
+                    <h2 class="mb-0">${data.students.not_registered}</h2>
                 </div>
             </div>
-            <div class="col-md-3">
-                <div class="card stat-card info">
-                    <div class="card-body">
-                        <h6 class="text-muted mb-2"><i class="bi bi-calendar-event"></i> Всего сессий</h6>
-                        <h2 class="mb-0">${data.total_sessions}</h2>
-                    </div>
+        </div>
+        <div class="col-md-3">
+            <div class="card stat-card info">
+                <div class="card-body">
+                    <h6 class="text-muted mb-2"><i class="bi bi-calendar-event"></i> Всего сессий</h6>
+                    <h2 class="mb-0">${data.total_sessions}</h2>
                 </div>
             </div>
-        `;
-        document.getElementById('statsCards').innerHTML = statsHTML;
+        </div>
+    `;
+    document.getElementById('statsCards').innerHTML = statsHTML;
+    
+    // Активная сессия
+    if (data.active_session) {
+        const session = data.active_session;
+        const progress = session.total_codes > 0 
+            ? Math.round((session.issued_codes / session.total_codes) * 100)
+            : 0;
         
-        // Активная сессия
-        if (data.active_session) {
-            const session = data.active_session;
-            const progress = session.total_codes > 0 
-                ? Math.round((session.issued_codes / session.total_codes) * 100)
-                : 0;
-            
-            const activeHTML = `
-                <h4>${session.subject}</h4>
-                <p class="text-muted">${new Date(session.date).toLocaleDateString('ru-RU')}</p>
-                <hr>
-                <div class="row text-center mb-3">
-                    <div class="col-4">
-                        <h3>${session.total_codes}</h3>
-                        <small class="text-muted">Всего кодов</small>
-                    </div>
-                    <div class="col-4">
-                        <h3>${session.issued_codes}</h3>
-                        <small class="text-muted">Выдано</small>
-                    </div>
-                    <div class="col-4">
-                        <h3>${session.screenshots}</h3>
-                        <small class="text-muted">Скриншотов</small>
-                    </div>
+        const activeHTML = `
+            <h4>${session.subject}</h4>
+            <p class="text-muted">${new Date(session.date).toLocaleDateString('ru-RU')}</p>
+            <hr>
+            <div class="row text-center mb-3">
+                <div class="col-4">
+                    <h3>${session.total_codes}</h3>
+                    <small class="text-muted">Всего кодов</small>
                 </div>
-                <div class="progress" style="height: 25px;">
-                    <div class="progress-bar bg-success" style="width: ${progress}%">
-                        ${progress}%
-                    </div>
+                <div class="col-4">
+                    <h3>${session.issued_codes}</h3>
+                    <small class="text-muted">Выдано</small>
                 </div>
-            `;
-            document.getElementById('activeSessionCard').innerHTML = activeHTML;
-        } else {
-            document.getElementById('activeSessionCard').innerHTML = `
-                <div class="alert alert-warning mb-0">
-                    <i class="bi bi-exclamation-triangle"></i> Нет активной сессии
+                <div class="col-4">
+                    <h3>${session.screenshots}</h3>
+                    <small class="text-muted">Скриншотов</small>
                 </div>
-            `;
-        }
-    } catch (error) {
-        console.error('Ошибка загрузки дашборда:', error);
+            </div>
+            <div class="progress" style="height: 25px;">
+                <div class="progress-bar bg-success" style="width: ${progress}%">
+                    ${progress}%
+                </div>
+            </div>
+        `;
+        document.getElementById('activeSessionCard').innerHTML = activeHTML;
+    } else {
+        document.getElementById('activeSessionCard').innerHTML = `
+            <div class="alert alert-warning mb-0">
+                <i class="bi bi-exclamation-triangle"></i> Нет активной сессии
+            </div>
+        `;
     }
 }
 
 async function loadRecentActivity() {
     try {
-        const response = await fetch('/api/monitoring/recent-activity?limit=10');
+        const response = await fetch(`/api/monitoring/recent-activity?limit=${RECENT_ACTIVITY_LIMIT}`);
         const data = await response.json();
-        
-        if (data.activity.length === 0) {
-            document.getElementById('recentActivity').innerHTML = `
-                <p class="text-muted mb-0">Пока нет активности</p>
-            `;
-            return;
-        }
-        
-        const activityHTML = data.activity.map(item => {
-            const icon = item.screenshot ? 'bi-camera-fill text-success' : 'bi-key text-primary';
-            const time = new Date(item.timestamp).toLocaleTimeString('ru-RU');
-            
-            return `
-                <div class="activity-item">
-                    <i class="bi ${icon}"></i>
-                    <strong>${item.student}</strong> 
-                    <small class="text-muted">- ${item.subject}</small>
-                    <br>
-                    <small class="text-muted">${time}</small>
-                    ${item.screenshot ? '<span class="badge bg-success ms-2">Скриншот</span>' : ''}
-                </div>
-            `;
-        }).join('');
-        
-        document.getElementById('recentActivity').innerHTML = activityHTML;
+        recentActivity = data.activity;
+        renderActivity(recentActivity);
     } catch (error) {
         console.error('Ошибка загрузки активности:', error);
     }
 }
 
+function renderActivity(items) {
+    if (items.length === 0) {
+        document.getElementById('recentActivity').innerHTML = `
+            <p class="text-muted mb-0">Пока нет активности</p>
+        `;
+        return;
+    }
+    
+    const activityHTML = items.map(item => {
+        const icon = item.screenshot ? 'bi-camera-fill text-success' : 'bi-key text-primary';
+        const time = new Date(item.timestamp).toLocaleTimeString('ru-RU');
+        
+        return `
+            <div class="activity-item">
+                <i class="bi ${icon}"></i>
+                <strong>${item.student}</strong> 
+                <small class="text-muted">- ${item.subject}</small>
+                <br>
+                <small class="text-muted">${time}</small>
+                ${item.screenshot ? '<span class="badge bg-success ms-2">Скриншот</span>' : ''}
+            </div>
+        `;
+    }).join('');
+    
+    document.getElementById('recentActivity').innerHTML = activityHTML;
+}
+
 // ==================== УЧЕНИКИ ====================
 
 async function loadStudentsStats() {
@@ -215,60 +273,93 @@ async function loadStudentsStats() {
     }
 }
 
+// Список учеников загружается страницами; фильтры применяются на сервере
 async function loadStudentsList() {
+    allStudents = [];
+    studentsCursor = null;
+    populateStudentsFilters();
+    await loadStudentsPage();
+}
+
+function studentsQuery() {
+    const params = new URLSearchParams({ limit: STUDENTS_PAGE_SIZE });
+    const classFilter = document.getElementById('filterClass').value;
+    const parallelFilter = document.getElementById('filterParallel').value;
+    const statusFilter = document.getElementById('filterStatus').value;
+    const nameFilter = document.getElementById('filterName').value.trim();
+
+    if (statusFilter) {
+        params.set('registered', statusFilter === 'registered');
+    } else {
+        params.set('include_inactive', true);
+    }
+    if (classFilter) params.set('class_number', classFilter);
+    if (parallelFilter) params.set('parallel', parallelFilter);
+    if (nameFilter) params.set('name', nameFilter);
+    if (studentsCursor) params.set('after', studentsCursor);
+
+    return params;
+}
+
+async function loadStudentsPage() {
+    const requestId = ++studentsRequestId;
+
     try {
-        // Загружаем всех учеников, включая не зарегистрированных
-        const response = await fetch('/api/students/?include_inactive=true');
-        allStudents = await response.json();
+        const response = await fetch(`/api/students/?${studentsQuery()}`);
+        const page = await response.json();
 
-        // Заполняем фильтры
-        populateStudentsFilters();
+        if (requestId !== studentsRequestId) {
+            return;  // Фильтры изменились, пока шел запрос
+        }
 
-        // Показываем учеников
-        filteredStudents = allStudents;
-        displayStudents(filteredStudents);
+        allStudents = allStudents.concat(page);
+        studentsCursor = response.headers.get('X-Next-Cursor');
+        displayStudents(allStudents);
     } catch (error) {
         console.error('Ошибка загрузки списка учеников:', error);
     }
 }
 
-function populateStudentsFilters() {
-    // Собираем уникальные классы и параллели
-    const classes = new Set();
-    const parallels = new Set();
+async function populateStudentsFilters() {
+    const classSelect = document.getElementById('filterClass');
+    const parallelSelect = document.getElementById('filterParallel');
 
-    allStudents.forEach(s => {
-        if (s.class_number) {
-            classes.add(s.class_number);
-            if (s.parallel) {
-                parallels.add(s.parallel);
-            }
-        }
-    });
+    // Фильтры уже заполнены - сохраняем выбор пользователя
+    if (classSelect.options.length > 1) {
+        return;
+    }
 
-    // Заполняем селект классов
-    const classSelect = document.getElementById('filterClass');
-    classSelect.innerHTML = '<option value="">Все классы</option>';
-    [...classes].sort((a, b) => a - b).forEach(c => {
-        const option = document.createElement('option');
-        option.value = c;
-        option.textContent = `${c} класс`;
-        classSelect.appendChild(option);
-    });
+    try {
+        // Классы и параллели - из агрегата, а не из списка учеников
+        const response = await fetch('/api/students/classes');
+        const data = await response.json();
 
-    // Заполняем селект параллелей
-    const parallelSelect = document.getElementById('filterParallel');
-    parallelSelect.innerHTML = '<option value="">Все параллели</option>';
-    [...parallels].sort().forEach(p => {
-        const option = document.createElement('option');
-        option.value = p;
-        option.textContent = p;
-        parallelSelect.appendChild(option);
-    });
+        const classes = [...new Set(data.classes.map(c => c.class_number))].sort((a, b) => a - b);
+        const parallels = [...new Set(data.classes.map(c => c.parallel).filter(p => p))].sort();
+
+        classes.forEach(c => {
+            const option = document.createElement('option');
+            option.value = c;
+            option.textContent = `${c} класс`;
+            classSelect.appendChild(option);
+        });
+
+        parallels.forEach(p => {
+            const option = document.createElement('option');
+            option.value = p;
+            option.textContent = p;
+            parallelSelect.appendChild(option);
+        });
+    } catch (error) {
+        console.error('Ошибка загрузки фильтров:', error);
+    }
 }
 
 function displayStudents(students) {
     const tbody = document.querySelector('#studentsTable tbody');
+    const moreButton = document.getElementById('studentsLoadMore');
+
+    moreButton.style.display = studentsCursor ? 'block' : 'none';
 
     if (students.length === 0) {
         tbody.innerHTML = `
@@ -299,43 +390,28 @@ function displayStudents(students) {
     `).join('');
 
     tbody.innerHTML = rows;
-    document.getElementById('studentsCount').textContent = `Показано: ${students.length} из ${allStudents.length}`;
+    document.getElementById('studentsCount').textContent = studentsCursor
+        ? `Показано: ${students.length} (есть еще)`
+        : `Показано: ${students.length}`;
 }
 
 function filterStudents() {
-    const classFilter = document.getElementById('filterClass').value;
-    const parallelFilter = document.getElementById('filterParallel').value;
-    const statusFilter = document.getElementById('filterStatus').value;
-
-    filteredStudents = allStudents.filter(s => {
-        // Фильтр по классу
-        if (classFilter && s.class_number != classFilter) {
-            return false;
-        }
-
-        // Фильтр по параллели
-        if (parallelFilter && s.parallel !== parallelFilter) {
-            return false;
-        }
-
-        // Фильтр по статусу
-        if (statusFilter === 'registered' && !s.is_registered) {
-            return false;
-        }
-        if (statusFilter === 'not_registered' && s.is_registered) {
-            return false;
-        }
-
-        return true;
-    });
+    allStudents = [];
+    studentsCursor = null;
+    loadStudentsPage();
+}
 
-    displayStudents(filteredStudents);
+function searchStudents() {
+    // Поиск по ФИО - после паузы в наборе
+    clearTimeout(studentsSearchTimer);
+    studentsSearchTimer = setTimeout(filterStudents, 300);
 }
 
 function resetFilters() {
     document.getElementById('filterClass').value = '';
     document.getElementById('filterParallel').value = '';
     document.getElementById('filterStatus').value = '';
+    document.getElementById('filterName').value = '';
     filterStudents();
 }
 
@@ -485,7 +561,17 @@ async function uploadCodes() {
                     <p class="mb-0">${result.reservation.message}</p>
                 `;
             }
-            
+
+            if (result.skipped && result.skipped.length) {
+                html += `
+                    <hr>
+                    <h6><i class="bi bi-exclamation-triangle"></i> Не загружено (класс не определен):</h6>
+                    <ul class="mb-0">
+                        ${result.skipped.map(item => `<li>${item.file}: ${item.subject} - ${item.codes_count} кодов</li>`).join('')}
+                    </ul>
+                `;
+            }
+
             html += '</div>';
             resultDiv.innerHTML = html;
             
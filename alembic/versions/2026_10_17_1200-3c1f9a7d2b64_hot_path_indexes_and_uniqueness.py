@@ -0,0 +1,90 @@
+"""Индексы для горячих запросов бота и уникальность запросов и кодов
+
+Revision ID: 3c1f9a7d2b64
+Revises:
+Create Date: 2026-10-17 12:00:00
+
+Первая миграция: до нее таблицы создавались init_db (create_all).
+Все операции идемпотентны (IF NOT EXISTS), поэтому миграция применяется
+и к старой базе, и к базе, созданной уже по текущим моделям.
+
+Перед созданием уникальных индексов удаляются дубли:
+- code_requests (student_id, session_id): остается запрос со скриншотом,
+  иначе самый ранний; напоминания удаляемых запросов удаляются;
+- olympiad_codes (session_id, code): остается выданный/распределенный
+  код, иначе самый ранний.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a7d2b64'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (имя, таблица, колонки, unique, условие частичного индекса)
+INDEXES = [
+    ("ix_olympiad_codes_available", "olympiad_codes", ["session_id", "class_number"], False, "NOT is_issued"),
+    ("uq_olympiad_codes_session_code", "olympiad_codes", ["session_id", "code"], True, None),
+    ("ix_grade8_reserve_codes_available", "grade8_reserve_codes", ["session_id", "class_parallel"], False, "NOT is_used"),
+    ("uq_code_requests_student_session", "code_requests", ["student_id", "session_id"], True, None),
+    ("ix_reminders_request_sent_at", "reminders", ["request_id", "sent_at"], False, None),
+]
+
+DUPLICATE_CODE_REQUESTS = """
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY student_id, session_id
+            ORDER BY COALESCE(screenshot_submitted, false) DESC, id
+        ) AS rn
+        FROM code_requests
+        WHERE student_id IS NOT NULL
+    ) ranked
+    WHERE rn > 1
+"""
+
+DUPLICATE_OLYMPIAD_CODES = """
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY session_id, code
+            ORDER BY COALESCE(is_issued, false) DESC, COALESCE(is_assigned, false) DESC, id
+        ) AS rn
+        FROM olympiad_codes
+    ) ranked
+    WHERE rn > 1
+"""
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        tables = set(sa.inspect(op.get_bind()).get_table_names())
+        if "olympiad_codes" not in tables:
+            # Пустая база: таблицы вместе с индексами создаст init_db
+            return
+
+    op.execute(f"DELETE FROM reminders WHERE request_id IN ({DUPLICATE_CODE_REQUESTS})")
+    op.execute(f"DELETE FROM code_requests WHERE id IN ({DUPLICATE_CODE_REQUESTS})")
+    op.execute(f"DELETE FROM olympiad_codes WHERE id IN ({DUPLICATE_OLYMPIAD_CODES})")
+
+    # CONCURRENTLY не блокирует запись в таблицы, но работает только вне транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=unique,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                sqlite_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
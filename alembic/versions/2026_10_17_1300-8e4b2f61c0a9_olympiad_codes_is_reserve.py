@@ -0,0 +1,46 @@
+"""Флаг is_reserve у кодов: код 9 класса отдан в резерв 8 класса
+
+Revision ID: 8e4b2f61c0a9
+Revises: 3c1f9a7d2b64
+Create Date: 2026-10-17 13:00:00
+
+Зарезервированный код больше не выдается 9-классникам и не
+резервируется повторно. Коды, уже скопированные в grade8_reserve_codes,
+помечаются флагом при миграции.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4b2f61c0a9'
+down_revision = '3c1f9a7d2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        inspector = sa.inspect(op.get_bind())
+        if "olympiad_codes" not in inspector.get_table_names():
+            # Пустая база: таблицы создаст init_db
+            return
+        if "is_reserve" in {column["name"] for column in inspector.get_columns("olympiad_codes")}:
+            return
+
+    op.add_column(
+        "olympiad_codes",
+        sa.Column("is_reserve", sa.Boolean(), server_default=sa.text("false"), nullable=False)
+    )
+    op.execute("""
+        UPDATE olympiad_codes SET is_reserve = true
+        WHERE class_number = 9
+          AND EXISTS (
+              SELECT 1 FROM grade8_reserve_codes r
+              WHERE r.session_id = olympiad_codes.session_id AND r.code = olympiad_codes.code
+          )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column("olympiad_codes", "is_reserve")
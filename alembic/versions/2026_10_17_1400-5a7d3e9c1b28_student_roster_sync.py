@@ -0,0 +1,61 @@
+"""Сверка списка учеников: is_active, updated_at и история изменений
+
+Revision ID: 5a7d3e9c1b28
+Revises: 8e4b2f61c0a9
+Create Date: 2026-10-17 14:00:00
+
+- students.is_active: выбывшие ученики не удаляются, а деактивируются
+  (сохраняются выданные коды и запросы);
+- students.updated_at: время последнего изменения сверкой;
+- student_history: журнал созданий, переводов и выбытий.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7d3e9c1b28'
+down_revision = '8e4b2f61c0a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = set()
+    tables = set()
+    if not op.get_context().as_sql:
+        inspector = sa.inspect(op.get_bind())
+        tables = set(inspector.get_table_names())
+        if "students" not in tables:
+            # Пустая база: таблицы создаст init_db
+            return
+        columns = {column["name"] for column in inspector.get_columns("students")}
+
+    if "is_active" not in columns:
+        op.add_column(
+            "students",
+            sa.Column("is_active", sa.Boolean(), server_default=sa.text("true"), nullable=False)
+        )
+    if "updated_at" not in columns:
+        op.add_column("students", sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+    if "student_history" not in tables:
+        op.create_table(
+            "student_history",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("action", sa.String(50), nullable=False),
+            sa.Column("old_data", sa.Text(), nullable=True),
+            sa.Column("new_data", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_student_history_id", "student_history", ["id"])
+        op.create_index("ix_student_history_student_id", "student_history", ["student_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_student_history_student_id", table_name="student_history")
+    op.drop_index("ix_student_history_id", table_name="student_history")
+    op.drop_table("student_history")
+    op.drop_column("students", "updated_at")
+    op.drop_column("students", "is_active")
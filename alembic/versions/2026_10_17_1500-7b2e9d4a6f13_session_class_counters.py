@@ -0,0 +1,80 @@
+"""Счетчики кодов сессии по классам (session_class_counters)
+
+Revision ID: 7b2e9d4a6f13
+Revises: 5a7d3e9c1b28
+Create Date: 2026-10-17 15:00:00
+
+Статистика кодов читается из счетчиков вместо COUNT по olympiad_codes
+и grade8_reserve_codes. Триггеры PostgreSQL (database/counters.py)
+добавляют изменения в session_class_counter_deltas, бот периодически
+сворачивает их в счетчики; при миграции счетчики заполняются пересчетом.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from database.counters import COUNTER_TRIGGERS_SQL, rebuild_statements
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e9d4a6f13'
+down_revision = '5a7d3e9c1b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    tables = set()
+    if not op.get_context().as_sql:
+        inspector = sa.inspect(op.get_bind())
+        tables = set(inspector.get_table_names())
+        if "olympiad_codes" not in tables:
+            # Пустая база: таблицы и триггеры создаст init_db
+            return
+
+    if "session_class_counters" not in tables:
+        op.create_table(
+            "session_class_counters",
+            sa.Column("session_id", sa.Integer(), primary_key=True),
+            sa.Column("class_number", sa.Integer(), primary_key=True),
+            sa.Column("parallel", sa.String(10), primary_key=True, server_default=""),
+            sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("assigned", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("issued", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("reserve_total", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("reserve_used", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+    if "session_class_counter_deltas" not in tables:
+        op.create_table(
+            "session_class_counter_deltas",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("session_id", sa.Integer(), nullable=False),
+            sa.Column("class_number", sa.Integer(), nullable=False),
+            sa.Column("parallel", sa.String(10), nullable=False, server_default=""),
+            sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("assigned", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("issued", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("reserve_total", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("reserve_used", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+    if op.get_context().dialect.name == "postgresql":
+        for statement in COUNTER_TRIGGERS_SQL:
+            op.execute(statement)
+
+    for statement in rebuild_statements(op.get_context().dialect.name):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        for table, function in (
+            ("olympiad_codes", "session_class_counters_codes"),
+            ("grade8_reserve_codes", "session_class_counters_reserve"),
+        ):
+            for operation in ("insert", "update", "delete"):
+                op.execute(f"DROP TRIGGER IF EXISTS {function}_{operation} ON {table}")
+            op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+        op.execute("DROP FUNCTION IF EXISTS session_class_counters_add(integer, integer, varchar, integer, integer, integer, integer, integer)")
+    op.drop_table("session_class_counter_deltas")
+    op.drop_table("session_class_counters")
@@ -0,0 +1,51 @@
+"""Доставленные сообщения массовых рассылок (notification_deliveries)
+
+Revision ID: c6e1a8f3d250
+Revises: 7b2e9d4a6f13
+Create Date: 2026-10-17 16:00:00
+
+Прогресс рассылок (utils/broadcast.py): повторный запуск кампании не
+отправляет сообщение тем, кто его уже получил.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1a8f3d250'
+down_revision = '7b2e9d4a6f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        inspector = sa.inspect(op.get_bind())
+        tables = set(inspector.get_table_names())
+        if "students" not in tables or "notification_deliveries" in tables:
+            # Пустая база (таблицы создаст init_db) или таблица уже создана init_db
+            return
+
+    op.create_table(
+        "notification_deliveries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("campaign", sa.String(100), nullable=False),
+        sa.Column(
+            "session_id", sa.Integer(),
+            sa.ForeignKey("olympiad_sessions.id", ondelete="CASCADE"), nullable=True
+        ),
+        sa.Column(
+            "student_id", sa.Integer(),
+            sa.ForeignKey("students.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("campaign", "student_id", name="uq_notification_delivery"),
+    )
+    op.create_index("ix_notification_deliveries_id", "notification_deliveries", ["id"])
+    op.create_index("ix_notification_deliveries_session_id", "notification_deliveries", ["session_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notification_deliveries_session_id", table_name="notification_deliveries")
+    op.drop_index("ix_notification_deliveries_id", table_name="notification_deliveries")
+    op.drop_table("notification_deliveries")
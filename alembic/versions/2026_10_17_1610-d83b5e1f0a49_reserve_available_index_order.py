@@ -0,0 +1,50 @@
+"""Порядок выдачи в частичном индексе резервных кодов
+
+Revision ID: d83b5e1f0a49
+Revises: c6e1a8f3d250
+Create Date: 2026-10-17 16:10:00
+
+Захват резервного кода берет первый свободный код параллели по id.
+С индексом (session_id, class_parallel) PostgreSQL выбирал обход
+первичного ключа по id с фильтром; с id в конце частичного индекса
+первая подходящая строка читается прямо из него.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd83b5e1f0a49'
+down_revision = 'c6e1a8f3d250'
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_grade8_reserve_codes_available"
+TABLE = "grade8_reserve_codes"
+
+
+def _recreate(columns) -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name=TABLE, if_exists=True, postgresql_concurrently=True)
+        op.create_index(
+            INDEX,
+            TABLE,
+            columns,
+            postgresql_concurrently=True,
+            postgresql_where=sa.text("NOT is_used"),
+            sqlite_where=sa.text("NOT is_used"),
+        )
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        tables = set(sa.inspect(op.get_bind()).get_table_names())
+        if TABLE not in tables:
+            # Пустая база: таблицы вместе с индексами создаст init_db
+            return
+
+    _recreate(["session_id", "class_parallel", "id"])
+
+
+def downgrade() -> None:
+    _recreate(["session_id", "class_parallel"])
@@ -0,0 +1,49 @@
+"""Индекс порядка списков учеников
+
+Revision ID: e2a7c4f91b36
+Revises: d83b5e1f0a49
+Create Date: 2026-10-17 17:00:00
+
+Списки учеников (crud.list_students) сортируются и листаются курсором по
+(coalesce(class_number, 99), coalesce(parallel, ''), full_name, id).
+Индекс по тем же выражениям отдает страницу без сортировки всей таблицы.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c4f91b36'
+down_revision = 'd83b5e1f0a49'
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_students_list_order"
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        tables = set(sa.inspect(op.get_bind()).get_table_names())
+        if "students" not in tables:
+            # Пустая база: таблицы вместе с индексами создаст init_db
+            return
+
+    # Выражения должны совпадать с crud._STUDENT_LIST_KEY
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX,
+            "students",
+            [
+                sa.text("coalesce(class_number, 99)"),
+                sa.text("coalesce(parallel, '')"),
+                "full_name",
+                "id",
+            ],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="students", if_exists=True, postgresql_concurrently=True)
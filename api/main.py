@@ -10,6 +10,10 @@ import os
 from api.routers import students, codes, monitoring, admin, dashboard, notifications, screenshots, auth
 from api.routers.auth import get_current_user, get_db
 from database.models import User
+from database import events
+from utils.loop_monitor import start_loop_monitor
+from utils.auth_sessions import auth_sessions
+from utils.event_bus import dashboard_feed
 from api.middleware import AuthMiddleware
 
 # Создаем приложение
@@ -47,6 +51,27 @@ app.include_router(admin.router)
 app.include_router(notifications.router)
 app.include_router(screenshots.router)
 
+
+@app.on_event("startup")
+async def on_startup():
+    """Подписка на события БД (сброс кэшей при изменениях из бота)"""
+    events.start_listener()
+    # Детектор блокировок event loop (только при DEBUG_LOOP_BLOCKING_MS)
+    app.state.loop_monitor = start_loop_monitor()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Остановка подписки на события БД"""
+    await events.stop_listener()
+    # Сохраняем накопленные отметки last_activity
+    await auth_sessions.stop()
+    # Закрываем живую ленту дашборда
+    await dashboard_feed.stop()
+    if app.state.loop_monitor:
+        await app.state.loop_monitor.stop()
+
+
 # Создаем директории если их нет
 os.makedirs("admin_panel/static", exist_ok=True)
 os.makedirs("admin_panel/templates", exist_ok=True)
@@ -5,11 +5,9 @@ Middleware для проверки авторизации API
 from fastapi import Request, HTTPException
 from fastapi.responses import RedirectResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
 import logging
 
-from database.database import SessionLocal
-from database.models import Session as DBSession, moscow_now
+from utils.auth_sessions import auth_sessions
 
 logger = logging.getLogger(__name__)
 
@@ -61,38 +59,25 @@ class AuthMiddleware(BaseHTTPMiddleware):
             # Если это веб-страница, редиректим на логин
             return RedirectResponse(url="/login", status_code=302)
 
-        # Проверяем сессию в БД
-        db = SessionLocal()
+        # Проверяем сессию (проверенные сессии кэшируются, last_activity пишется пакетно)
         try:
-            db_session = db.query(DBSession).filter(
-                DBSession.session_token == session_token,
-                DBSession.expires_at > moscow_now()
-            ).first()
-
-            if not db_session:
-                # Сессия истекла или недействительна
-                if path.startswith("/api/"):
-                    raise HTTPException(status_code=401, detail="Сессия истекла")
-                return RedirectResponse(url="/login", status_code=302)
-
-            # Обновляем время последней активности
-            db_session.last_activity = moscow_now()
-            db.commit()
-
-            # Добавляем информацию о пользователе в request state
-            request.state.user_id = db_session.user_id
-            request.state.session_id = db_session.id
-
-            logger.debug(f"Пользователь {db_session.user_id} авторизован для {path}")
-
-        except HTTPException:
-            raise
+            auth = await auth_sessions.validate(session_token)
         except Exception as e:
             logger.error(f"Ошибка при проверке авторизации: {e}")
             if path.startswith("/api/"):
                 raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
             return RedirectResponse(url="/login", status_code=302)
-        finally:
-            db.close()
+
+        if not auth:
+            # Сессия истекла или недействительна
+            if path.startswith("/api/"):
+                raise HTTPException(status_code=401, detail="Сессия истекла")
+            return RedirectResponse(url="/login", status_code=302)
+
+        # Добавляем информацию о пользователе в request state
+        request.state.user_id = auth.user_id
+        request.state.session_id = auth.session_id
+
+        logger.debug(f"Пользователь {auth.user_id} авторизован для {path}")
 
         return await call_next(request)
@@ -5,11 +5,9 @@ Middleware для проверки авторизации на API endpoints
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
 import logging
 
-from database.database import SessionLocal
-from database.models import Session as DBSession, User, moscow_now
+from utils.auth_sessions import auth_sessions
 
 logger = logging.getLogger(__name__)
 
@@ -47,50 +45,36 @@ class AuthMiddleware(BaseHTTPMiddleware):
             return await call_next(request)
 
         # Проверяем авторизацию для защищенных путей
-        db = SessionLocal()
-        try:
-            session_token = request.cookies.get("session_token")
-
-            if not session_token:
-                return self.unauthorized_response("Требуется авторизация")
-
-            # Проверяем сессию
-            db_session = db.query(DBSession).filter(
-                DBSession.session_token == session_token,
-                DBSession.expires_at > moscow_now()
-            ).first()
+        session_token = request.cookies.get("session_token")
 
-            if not db_session:
-                return self.unauthorized_response("Недействительная или истекшая сессия")
+        if not session_token:
+            return self.unauthorized_response("Требуется авторизация")
 
-            # Получаем пользователя
-            user = db.query(User).filter(User.id == db_session.user_id).first()
-
-            if not user or not user.is_active:
-                return self.unauthorized_response("Пользователь не активен")
+        try:
+            # Проверенные сессии кэшируются, last_activity пишется пакетно
+            auth = await auth_sessions.validate(session_token)
+        except Exception as e:
+            logger.error(f"Auth middleware error: {e}")
+            return self.unauthorized_response("Ошибка проверки авторизации")
 
-            # Обновляем последнюю активность
-            db_session.last_activity = moscow_now()
-            db.commit()
+        if not auth:
+            return self.unauthorized_response("Недействительная или истекшая сессия")
 
-            # Добавляем пользователя в state для использования в handlers
-            request.state.user = user
+        user = auth.user
 
-            # Логируем доступ (опционально, только для важных операций)
-            if request.method in ["POST", "PUT", "DELETE"]:
-                logger.info(
-                    f"User {user.telegram_id} ({user.role}) accessed {request.method} {request.url.path}"
-                )
+        if not user.is_active:
+            return self.unauthorized_response("Пользователь не активен")
 
-            response = await call_next(request)
-            return response
+        # Добавляем пользователя в state для использования в handlers
+        request.state.user = user
 
-        except Exception as e:
-            logger.error(f"Auth middleware error: {e}")
-            return self.unauthorized_response("Ошибка проверки авторизации")
+        # Логируем доступ (опционально, только для важных операций)
+        if request.method in ["POST", "PUT", "DELETE"]:
+            logger.info(
+                f"User {user.telegram_id} ({user.role}) accessed {request.method} {request.url.path}"
+            )
 
-        finally:
-            db.close()
+        return await call_next(request)
 
     def is_public_path(self, path: str) -> bool:
         """Проверка, является ли путь публичным"""
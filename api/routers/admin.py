@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.database import get_async_session
-from database import crud
+from database import crud, events
+from database.models import Student
 from utils.auth import generate_multiple_codes
-from typing import List, Dict
+from utils.student_import import StudentImporter
+from api.routers.students import STUDENTS_PAGE_MAX, students_page
+from utils.statistics import get_export_statistics, get_olympiad_code_stats, get_overview, get_student_statistics
+from utils.excel_export import ExportTable, OLYMPIADS_TABLE, STUDENTS_TABLE, export_table
+from typing import List, Dict, Optional
 from pydantic import BaseModel
+import os
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
@@ -53,22 +60,19 @@ async def create_students_bulk(
     """
     Массовое создание учеников
     """
-    # Генерируем коды для всех учеников
-    codes = generate_multiple_codes(len(data.students))
-    
-    created_students = []
-    
-    for full_name, code in zip(data.students, codes):
-        student = await crud.create_student(
-            session,
-            full_name=full_name.strip(),
-            registration_code=code
-        )
-        created_students.append({
-            "id": student.id,
-            "full_name": student.full_name,
-            "registration_code": student.registration_code
-        })
+    # Один многострочный INSERT, коды генерируются для всех учеников сразу
+    importer = StudentImporter(session, skip_existing=False)
+    created = await importer.add({"full_name": full_name.strip()} for full_name in data.students)
+    await session.commit()
+
+    created_students = [
+        {
+            "id": student["id"],
+            "full_name": student["full_name"],
+            "registration_code": student["registration_code"]
+        }
+        for student in created
+    ]
     
     return {
         "success": True,
@@ -79,22 +83,34 @@ async def create_students_bulk(
 
 @router.get("/students")
 async def get_all_students(
+    response: Response,
+    registered: Optional[bool] = Query(None),
+    class_number: Optional[int] = Query(None),
+    parallel: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Начало ФИО"),
+    after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=STUDENTS_PAGE_MAX, description="Размер страницы (без limit - все)"),
     session: AsyncSession = Depends(get_async_session)
 ) -> List[Dict]:
     """
     Получить список всех учеников
     """
-    students = await crud.get_all_students(session)
-    
+    students = await students_page(
+        session, response,
+        [Student.registration_code, Student.is_registered, Student.telegram_id, Student.created_at, Student.registered_at],
+        after=after, limit=limit,
+        registered=registered, class_number=class_number, parallel=parallel, name_prefix=name
+    )
+
     return [
         {
-            "id": s.id,
-            "full_name": s.full_name,
-            "registration_code": s.registration_code,
-            "is_registered": s.is_registered,
-            "telegram_id": s.telegram_id,
-            "created_at": s.created_at.isoformat() if s.created_at else None,
-            "registered_at": s.registered_at.isoformat() if s.registered_at else None
+            "id": s["id"],
+            "full_name": s["full_name"],
+            "registration_code": s["registration_code"],
+            "is_registered": s["is_registered"],
+            "telegram_id": s["telegram_id"],
+            "created_at": s["created_at"].isoformat() if s["created_at"] else None,
+            "registered_at": s["registered_at"].isoformat() if s["registered_at"] else None
         }
         for s in students
     ]
@@ -102,22 +118,32 @@ async def get_all_students(
 
 @router.get("/students/unregistered")
 async def get_unregistered_students(
+    response: Response,
+    class_number: Optional[int] = Query(None),
+    parallel: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Начало ФИО"),
+    after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=STUDENTS_PAGE_MAX, description="Размер страницы (без limit - все)"),
     session: AsyncSession = Depends(get_async_session)
 ) -> List[Dict]:
     """
     Получить список незарегистрированных учеников
     """
-    students = await crud.get_all_students(session)
-    unregistered = [s for s in students if not s.is_registered]
-    
+    students = await students_page(
+        session, response,
+        [Student.registration_code, Student.created_at],
+        after=after, limit=limit,
+        registered=False, class_number=class_number, parallel=parallel, name_prefix=name
+    )
+
     return [
         {
-            "id": s.id,
-            "full_name": s.full_name,
-            "registration_code": s.registration_code,
-            "created_at": s.created_at.isoformat() if s.created_at else None
+            "id": s["id"],
+            "full_name": s["full_name"],
+            "registration_code": s["registration_code"],
+            "created_at": s["created_at"].isoformat() if s["created_at"] else None
         }
-        for s in unregistered
+        for s in students
     ]
 
 
@@ -260,42 +286,51 @@ async def get_all_classes(
     """
     Получить список всех классов с количеством учеников
     """
-    classes = await crud.get_all_classes(session)
-
-    result = []
-    for class_num in classes:
-        students = await crud.get_students_by_class(session, class_num)
-        result.append({
-            "class_number": class_num,
-            "total_students": len(students),
-            "registered": sum(1 for s in students if s.is_registered),
-            "unregistered": sum(1 for s in students if not s.is_registered)
-        })
+    stats = await get_student_statistics(session)
 
-    return result
+    return [
+        {
+            "class_number": class_stats.class_number,
+            "total_students": class_stats.total,
+            "registered": class_stats.registered,
+            "unregistered": class_stats.unregistered
+        }
+        for class_stats in stats.by_class().values()
+    ]
 
 
 @router.get("/classes/{class_number}/students")
 async def get_students_by_class(
     class_number: int,
+    response: Response,
+    registered: Optional[bool] = Query(None),
+    parallel: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Начало ФИО"),
+    after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=STUDENTS_PAGE_MAX, description="Размер страницы (без limit - все)"),
     session: AsyncSession = Depends(get_async_session)
 ) -> List[Dict]:
     """
     Получить всех учеников определенного класса
     """
-    students = await crud.get_students_by_class(session, class_number)
+    students = await students_page(
+        session, response,
+        [Student.registration_code, Student.is_registered, Student.telegram_id, Student.created_at, Student.registered_at],
+        after=after, limit=limit,
+        registered=registered, class_number=class_number, parallel=parallel, name_prefix=name
+    )
 
     return [
         {
-            "id": s.id,
-            "full_name": s.full_name,
-            "class_number": s.class_number,
-            "parallel": s.parallel,
-            "registration_code": s.registration_code,
-            "is_registered": s.is_registered,
-            "telegram_id": s.telegram_id,
-            "created_at": s.created_at.isoformat() if s.created_at else None,
-            "registered_at": s.registered_at.isoformat() if s.registered_at else None
+            "id": s["id"],
+            "full_name": s["full_name"],
+            "class_number": s["class_number"],
+            "parallel": s["parallel"],
+            "registration_code": s["registration_code"],
+            "is_registered": s["is_registered"],
+            "telegram_id": s["telegram_id"],
+            "created_at": s["created_at"].isoformat() if s["created_at"] else None,
+            "registered_at": s["registered_at"].isoformat() if s["registered_at"] else None
         }
         for s in students
     ]
@@ -457,6 +492,7 @@ async def deactivate_olympiad(
     olympiad_session.is_active = False
     await session.commit()
     await session.refresh(olympiad_session)
+    await events.publish(session, events.TOPIC_ACTIVE_SESSION)
 
     return {
         "success": True,
@@ -474,42 +510,7 @@ async def get_statistics_overview(
     """
     Получить общую статистику системы
     """
-    all_students = await crud.get_all_students(session)
-    registered_students = [s for s in all_students if s.is_registered]
-    all_sessions = await crud.get_all_sessions(session)
-    active_session = await crud.get_active_session(session)
-    classes = await crud.get_all_classes(session)
-
-    # Статистика по классам
-    classes_stats = []
-    for class_num in classes:
-        class_students = await crud.get_students_by_class(session, class_num)
-        class_registered = sum(1 for s in class_students if s.is_registered)
-        classes_stats.append({
-            "class_number": class_num,
-            "total": len(class_students),
-            "registered": class_registered,
-            "unregistered": len(class_students) - class_registered
-        })
-
-    return {
-        "students": {
-            "total": len(all_students),
-            "registered": len(registered_students),
-            "unregistered": len(all_students) - len(registered_students)
-        },
-        "olympiads": {
-            "total": len(all_sessions),
-            "active": 1 if active_session else 0,
-            "inactive": len(all_sessions) - (1 if active_session else 0)
-        },
-        "classes": classes_stats,
-        "active_olympiad": {
-            "id": active_session.id,
-            "subject": active_session.subject,
-            "date": active_session.date.isoformat()
-        } if active_session else None
-    }
+    return await get_overview(session)
 
 
 @router.get("/statistics/olympiad/{session_id}")
@@ -520,53 +521,15 @@ async def get_olympiad_statistics(
     """
     Получить детальную статистику по олимпиаде
     """
-    from sqlalchemy import select, func
-    from database.models import Grade8Code, Grade9Code, CodeRequest
-
     olympiad = await crud.get_session_by_id(session, session_id)
 
     if not olympiad:
         raise HTTPException(status_code=404, detail="Олимпиада не найдена")
 
-    # Статистика по кодам 8 класса
-    grade8_total = await session.execute(
-        select(func.count(Grade8Code.id)).where(Grade8Code.session_id == session_id)
-    )
-    grade8_issued = await session.execute(
-        select(func.count(Grade8Code.id)).where(
-            Grade8Code.session_id == session_id,
-            Grade8Code.is_issued == True
-        )
-    )
-
-    # Статистика по кодам 9 класса
-    grade9_total = await session.execute(
-        select(func.count(Grade9Code.id)).where(Grade9Code.session_id == session_id)
-    )
-    grade9_used = await session.execute(
-        select(func.count(Grade9Code.id)).where(
-            Grade9Code.session_id == session_id,
-            Grade9Code.is_used == True
-        )
-    )
-
-    # Статистика по запросам
-    requests_total = await session.execute(
-        select(func.count(CodeRequest.id)).where(CodeRequest.session_id == session_id)
-    )
-    screenshots = await session.execute(
-        select(func.count(CodeRequest.id)).where(
-            CodeRequest.session_id == session_id,
-            CodeRequest.screenshot_submitted == True
-        )
-    )
-
-    g8_total = grade8_total.scalar()
-    g8_issued = grade8_issued.scalar()
-    g9_total = grade9_total.scalar()
-    g9_used = grade9_used.scalar()
-    req_total = requests_total.scalar()
-    scr_count = screenshots.scalar()
+    stats = await get_olympiad_code_stats(session, session_id)
+    by_class = {c["class_number"]: c for c in stats["classes"]}
+    grade8 = by_class.get(8, {"total": 0, "issued": 0})
+    grade9 = by_class.get(9, {"total": 0, "issued": 0})
 
     return {
         "olympiad": {
@@ -578,42 +541,49 @@ async def get_olympiad_statistics(
             "is_active": olympiad.is_active
         },
         "codes_grade8": {
-            "total": g8_total,
-            "issued": g8_issued,
-            "not_issued": g8_total - g8_issued
+            "total": grade8["total"],
+            "issued": grade8["issued"],
+            "not_issued": grade8["total"] - grade8["issued"]
         },
         "codes_grade9": {
-            "total": g9_total,
-            "used": g9_used,
-            "available": g9_total - g9_used
+            "total": grade9["total"],
+            "used": grade9["issued"],
+            "available": grade9["total"] - grade9["issued"]
         },
-        "requests": {
-            "total": req_total,
-            "with_screenshot": scr_count,
-            "without_screenshot": req_total - scr_count,
-            "completion_rate": int((scr_count / req_total) * 100) if req_total > 0 else 0
-        }
+        "codes_by_class": stats["classes"],
+        "reserve_grade8": stats["reserve"],
+        "requests": stats["requests"]
     }
 
 
 @router.get("/students/registered")
 async def get_registered_students(
+    response: Response,
+    class_number: Optional[int] = Query(None),
+    parallel: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Начало ФИО"),
+    after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=STUDENTS_PAGE_MAX, description="Размер страницы (без limit - все)"),
     session: AsyncSession = Depends(get_async_session)
 ) -> List[Dict]:
     """
     Получить список зарегистрированных учеников
     """
-    all_students = await crud.get_all_students(session)
-    students = [s for s in all_students if s.is_registered]
+    students = await students_page(
+        session, response,
+        [Student.telegram_id, Student.registered_at],
+        after=after, limit=limit,
+        registered=True, class_number=class_number, parallel=parallel, name_prefix=name
+    )
 
     return [
         {
-            "id": s.id,
-            "full_name": s.full_name,
-            "class_number": s.class_number,
-            "parallel": s.parallel,
-            "telegram_id": s.telegram_id,
-            "registered_at": s.registered_at.isoformat() if s.registered_at else None
+            "id": s["id"],
+            "full_name": s["full_name"],
+            "class_number": s["class_number"],
+            "parallel": s["parallel"],
+            "telegram_id": s["telegram_id"],
+            "registered_at": s["registered_at"].isoformat() if s["registered_at"] else None
         }
         for s in students
     ]
@@ -621,22 +591,32 @@ async def get_registered_students(
 
 @router.get("/students/unregistered")
 async def get_unregistered_students_api(
+    response: Response,
+    class_number: Optional[int] = Query(None),
+    parallel: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Начало ФИО"),
+    after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=STUDENTS_PAGE_MAX, description="Размер страницы (без limit - все)"),
     session: AsyncSession = Depends(get_async_session)
 ) -> List[Dict]:
     """
     Получить список незарегистрированных учеников
     """
-    all_students = await crud.get_all_students(session)
-    students = [s for s in all_students if not s.is_registered]
+    students = await students_page(
+        session, response,
+        [Student.registration_code, Student.created_at],
+        after=after, limit=limit,
+        registered=False, class_number=class_number, parallel=parallel, name_prefix=name
+    )
 
     return [
         {
-            "id": s.id,
-            "full_name": s.full_name,
-            "class_number": s.class_number,
-            "parallel": s.parallel,
-            "registration_code": s.registration_code,
-            "created_at": s.created_at.isoformat() if s.created_at else None
+            "id": s["id"],
+            "full_name": s["full_name"],
+            "class_number": s["class_number"],
+            "parallel": s["parallel"],
+            "registration_code": s["registration_code"],
+            "created_at": s["created_at"].isoformat() if s["created_at"] else None
         }
         for s in students
     ]
@@ -677,42 +657,7 @@ async def export_students_csv(
     """
     Экспорт списка учеников в CSV формат
     """
-    import io
-    import csv
-    from fastapi.responses import StreamingResponse
-
-    students = await crud.get_all_students(session)
-
-    # Создаем CSV в памяти
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Заголовки
-    writer.writerow([
-        "ID", "ФИО", "Регистрационный код",
-        "Зарегистрирован", "Telegram ID", "Дата создания"
-    ])
-
-    # Данные
-    for s in students:
-        writer.writerow([
-            s.id,
-            s.full_name,
-            s.registration_code,
-            "Да" if s.is_registered else "Нет",
-            s.telegram_id or "-",
-            s.created_at.strftime("%Y-%m-%d %H:%M:%S") if s.created_at else "-"
-        ])
-
-    output.seek(0)
-
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=students.csv"
-        }
-    )
+    return await _export_response(session, STUDENTS_TABLE, "csv")
 
 
 @router.get("/export/students/excel")
@@ -722,36 +667,8 @@ async def export_students_excel(
     """
     Экспорт списка учеников в Excel формат
     """
-    from fastapi.responses import StreamingResponse
-    from utils.excel_export import ExcelExporter
-
-    students = await crud.get_all_students(session)
-
-    students_data = [
-        {
-            "id": s.id,
-            "full_name": s.full_name,
-            "class_number": s.class_number,
-            "parallel": s.parallel,
-            "registration_code": s.registration_code,
-            "is_registered": s.is_registered,
-            "telegram_id": s.telegram_id,
-            "created_at": s.created_at.isoformat() if s.created_at else None,
-            "registered_at": s.registered_at.isoformat() if s.registered_at else None
-        }
-        for s in students
-    ]
-
     try:
-        excel_file = ExcelExporter.export_students(students_data)
-
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": "attachment; filename=students.xlsx"
-            }
-        )
+        return await _export_response(session, STUDENTS_TABLE, "xlsx")
     except ImportError:
         raise HTTPException(
             status_code=500,
@@ -766,35 +683,8 @@ async def export_olympiads_excel(
     """
     Экспорт списка олимпиад в Excel формат
     """
-    from fastapi.responses import StreamingResponse
-    from utils.excel_export import ExcelExporter
-
-    sessions = await crud.get_all_sessions(session)
-
-    olympiads_data = [
-        {
-            "id": s.id,
-            "subject": s.subject,
-            "class_number": s.class_number,
-            "date": s.date.isoformat(),
-            "stage": s.stage,
-            "is_active": s.is_active,
-            "uploaded_file_name": s.uploaded_file_name,
-            "upload_time": s.upload_time.isoformat() if s.upload_time else None
-        }
-        for s in sessions
-    ]
-
     try:
-        excel_file = ExcelExporter.export_olympiads(olympiads_data)
-
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": "attachment; filename=olympiads.xlsx"
-            }
-        )
+        return await _export_response(session, OLYMPIADS_TABLE, "xlsx")
     except ImportError:
         raise HTTPException(
             status_code=500,
@@ -802,6 +692,19 @@ async def export_olympiads_excel(
         )
 
 
+async def _export_response(session: AsyncSession, table: ExportTable, fmt: str) -> StreamingResponse:
+    """Выгрузка таблицы потоком из временного файла (файл удаляется после отдачи)"""
+    export = await export_table(session, table, fmt)
+    return StreamingResponse(
+        export.iter_chunks(),
+        media_type=export.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={export.filename}",
+            "Content-Length": str(os.path.getsize(export.path))
+        }
+    )
+
+
 @router.get("/export/statistics/excel")
 async def export_statistics_excel(
     session: AsyncSession = Depends(get_async_session)
@@ -809,35 +712,9 @@ async def export_statistics_excel(
     """
     Экспорт статистики в Excel формат
     """
-    from fastapi.responses import StreamingResponse
     from utils.excel_export import ExcelExporter
 
-    all_students = await crud.get_all_students(session)
-    registered = [s for s in all_students if s.is_registered]
-    all_sessions = await crud.get_all_sessions(session)
-    classes = await crud.get_all_classes(session)
-
-    # Собираем статистику по классам
-    classes_stats = []
-    for class_num in classes:
-        class_students = await crud.get_students_by_class(session, class_num)
-        class_registered = sum(1 for s in class_students if s.is_registered)
-        classes_stats.append({
-            "class_number": class_num,
-            "total": len(class_students),
-            "registered": class_registered
-        })
-
-    stats = {
-        "general": {
-            "Всего учеников": len(all_students),
-            "Зарегистрировано": len(registered),
-            "Не зарегистрировано": len(all_students) - len(registered),
-            "Всего олимпиад": len(all_sessions),
-            "Активных олимпиад": sum(1 for s in all_sessions if s.is_active)
-        },
-        "classes": classes_stats
-    }
+    stats = await get_export_statistics(session)
 
     try:
         excel_file = ExcelExporter.export_statistics(stats)
@@ -14,6 +14,7 @@ import os
 
 from database.database import SessionLocal
 from database.models import User, AuthToken, Session as DBSession, moscow_now
+from utils.auth_sessions import auth_sessions, forget_session
 
 logger = logging.getLogger(__name__)
 
@@ -67,35 +68,24 @@ def generate_token(length: int = 32) -> str:
     return secrets.token_urlsafe(length)
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> Optional[User]:
-    """Получить текущего пользователя из сессии"""
+async def get_current_user(request: Request) -> Optional[User]:
+    """Получить текущего пользователя из сессии (через кэш проверенных сессий)"""
     session_token = request.cookies.get("session_token")
 
     if not session_token:
         return None
 
-    # Найти сессию
-    db_session = db.query(DBSession).filter(
-        DBSession.session_token == session_token,
-        DBSession.expires_at > moscow_now()
-    ).first()
+    auth = await auth_sessions.validate(session_token)
 
-    if not db_session:
+    if not auth:
         return None
 
-    # Обновить последнюю активность
-    db_session.last_activity = moscow_now()
-    db.commit()
-
-    # Получить пользователя
-    user = db.query(User).filter(User.id == db_session.user_id).first()
-
-    return user if user and user.is_active else None
+    return auth.user if auth.user.is_active else None
 
 
-def require_auth(request: Request, db: Session = Depends(get_db)) -> User:
+async def require_auth(request: Request) -> User:
     """Middleware для проверки авторизации (обязательная)"""
-    user = get_current_user(request, db)
+    user = await get_current_user(request)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -270,6 +260,7 @@ async def logout(request: Request, response: Response, db: Session = Depends(get
         # Удаляем сессию из БД
         db.query(DBSession).filter(DBSession.session_token == session_token).delete()
         db.commit()
+        forget_session(db, session_token)
 
         # Удаляем cookie
         response.delete_cookie("session_token")
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
 from database.database import get_async_session
+from database import crud
+from database.cache import dashboard_snapshot
+from utils.event_bus import dashboard_feed
 from database.models import (
     Student, OlympiadSession, Grade8Code, Grade9Code,
     CodeRequest, Reminder, OlympiadCode
@@ -14,75 +18,35 @@ router = APIRouter(prefix="/api/monitoring", tags=["Monitoring"])
 async def get_dashboard_stats(
     session: AsyncSession = Depends(get_async_session)
 ):
-    """Статистика для дашборда"""
-    
-    # Ученики
-    result = await session.execute(select(func.count(Student.id)))
-    total_students = result.scalar()
-    
-    result = await session.execute(
-        select(func.count(Student.id)).where(Student.is_registered == True)
-    )
-    registered_students = result.scalar()
-    
-    # Активная сессия
-    result = await session.execute(
-        select(OlympiadSession).where(OlympiadSession.is_active == True)
+    """
+    Статистика для дашборда
+
+    Один агрегирующий запрос; результат кэшируется на несколько секунд,
+    и одновременные опросы из всех открытых панелей обслуживает один запрос.
+    """
+    return await dashboard_snapshot.get(lambda: crud.get_dashboard_stats(session))
+
+
+@router.get("/stream")
+async def stream_dashboard(request: Request):
+    """
+    Живая лента дашборда (Server-Sent Events)
+
+    Сначала - статистика и активность целиком (события dashboard и activity),
+    затем только изменения: после выдачи кодов, скриншотов и регистраций.
+    Запросы к БД выполняет один общий производитель на всех подписчиков.
+    """
+    async def messages():
+        async for message in dashboard_feed.subscribe():
+            if await request.is_disconnected():
+                break
+            yield message
+
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    active_session = result.scalar_one_or_none()
-    
-    active_session_data = None
-    if active_session:
-        # Статистика по активной сессии (используем универсальную таблицу)
-        result = await session.execute(
-            select(func.count(OlympiadCode.id)).where(
-                OlympiadCode.session_id == active_session.id
-            )
-        )
-        total_codes = result.scalar()
-
-        result = await session.execute(
-            select(func.count(OlympiadCode.id)).where(
-                and_(
-                    OlympiadCode.session_id == active_session.id,
-                    OlympiadCode.is_issued == True
-                )
-            )
-        )
-        issued_codes = result.scalar()
-        
-        result = await session.execute(
-            select(func.count(CodeRequest.id)).where(
-                and_(
-                    CodeRequest.session_id == active_session.id,
-                    CodeRequest.screenshot_submitted == True
-                )
-            )
-        )
-        screenshots = result.scalar()
-        
-        active_session_data = {
-            "id": active_session.id,
-            "subject": active_session.subject,
-            "date": active_session.date.isoformat(),
-            "total_codes": total_codes,
-            "issued_codes": issued_codes,
-            "screenshots": screenshots
-        }
-    
-    # Всего сессий
-    result = await session.execute(select(func.count(OlympiadSession.id)))
-    total_sessions = result.scalar()
-    
-    return {
-        "students": {
-            "total": total_students,
-            "registered": registered_students,
-            "not_registered": total_students - registered_students
-        },
-        "active_session": active_session_data,
-        "total_sessions": total_sessions
-    }
 
 
 @router.get("/sessions/{session_id}/details")
@@ -156,7 +120,7 @@ async def get_students_without_codes(
     
     # Все зарегистрированные ученики
     result = await session.execute(
-        select(Student).where(Student.is_registered == True)
+        select(Student).where(Student.is_registered == True, Student.is_active == True)
     )
     all_students = result.scalars().all()
     
@@ -195,29 +159,7 @@ async def get_recent_activity(
     session: AsyncSession = Depends(get_async_session)
 ):
     """Последняя активность"""
-
-    # Последние запросы кодов
-    result = await session.execute(
-        select(CodeRequest)
-        .order_by(CodeRequest.requested_at.desc())
-        .limit(limit)
-    )
-    requests = result.scalars().all()
-
-    activity = []
-    for req in requests:
-        student = await session.get(Student, req.student_id)
-        olympiad = await session.get(OlympiadSession, req.session_id)
-
-        activity.append({
-            "type": "code_request",
-            "student": student.full_name if student else "Неизвестен",
-            "subject": olympiad.subject if olympiad else "Неизвестен",
-            "timestamp": req.requested_at.isoformat() if req.requested_at else None,
-            "screenshot": req.screenshot_submitted
-        })
-
-    return {"activity": activity}
+    return {"activity": await crud.get_recent_activity(session, limit)}
 
 
 @router.get("/all-sessions")
@@ -226,64 +168,59 @@ async def get_all_sessions_stats(
 ):
     """Статистика по всем олимпиадам"""
 
-    # Получаем все сессии
-    result = await session.execute(
-        select(OlympiadSession).order_by(OlympiadSession.date.desc())
-    )
-    sessions = result.scalars().all()
-
-    sessions_data = []
-    for sess in sessions:
-        # Подсчитываем коды для этой сессии
-        result = await session.execute(
-            select(func.count(OlympiadCode.id)).where(
-                OlympiadCode.session_id == sess.id
-            )
+    # Счетчики кодов и запросов - сгруппированные подзапросы, присоединенные к сессиям
+    codes = (
+        select(
+            OlympiadCode.session_id,
+            func.count(OlympiadCode.id).label("total"),
+            func.count(OlympiadCode.id).filter(OlympiadCode.is_issued == True).label("issued")
         )
-        total_codes = result.scalar() or 0
-
-        # Подсчитываем выданные коды
-        result = await session.execute(
-            select(func.count(OlympiadCode.id)).where(
-                and_(
-                    OlympiadCode.session_id == sess.id,
-                    OlympiadCode.is_issued == True
-                )
-            )
-        )
-        issued_codes = result.scalar() or 0
-
-        # Подсчитываем запросы кодов
-        result = await session.execute(
-            select(func.count(CodeRequest.id)).where(
-                CodeRequest.session_id == sess.id
-            )
+        .group_by(OlympiadCode.session_id)
+        .subquery()
+    )
+    requests = (
+        select(
+            CodeRequest.session_id,
+            func.count(CodeRequest.id).label("total"),
+            func.count(CodeRequest.id).filter(CodeRequest.screenshot_submitted == True).label("screenshots")
         )
-        code_requests = result.scalar() or 0
+        .group_by(CodeRequest.session_id)
+        .subquery()
+    )
 
-        # Подсчитываем скриншоты
-        result = await session.execute(
-            select(func.count(CodeRequest.id)).where(
-                and_(
-                    CodeRequest.session_id == sess.id,
-                    CodeRequest.screenshot_submitted == True
-                )
-            )
+    result = await session.execute(
+        select(
+            OlympiadSession.id,
+            OlympiadSession.subject,
+            OlympiadSession.date,
+            OlympiadSession.stage,
+            OlympiadSession.class_number,
+            OlympiadSession.is_active,
+            func.coalesce(codes.c.total, 0).label("total_codes"),
+            func.coalesce(codes.c.issued, 0).label("issued_codes"),
+            func.coalesce(requests.c.total, 0).label("code_requests"),
+            func.coalesce(requests.c.screenshots, 0).label("screenshots")
         )
-        screenshots = result.scalar() or 0
+        .outerjoin(codes, codes.c.session_id == OlympiadSession.id)
+        .outerjoin(requests, requests.c.session_id == OlympiadSession.id)
+        .order_by(OlympiadSession.date.desc())
+    )
 
-        sessions_data.append({
-            "id": sess.id,
-            "subject": sess.subject,
-            "date": sess.date.isoformat(),
-            "stage": sess.stage,
-            "class_number": sess.class_number,
-            "is_active": sess.is_active,
-            "total_codes": total_codes,
-            "issued_codes": issued_codes,
-            "code_requests": code_requests,
-            "screenshots": screenshots
-        })
+    sessions_data = [
+        {
+            "id": row.id,
+            "subject": row.subject,
+            "date": row.date.isoformat(),
+            "stage": row.stage,
+            "class_number": row.class_number,
+            "is_active": row.is_active,
+            "total_codes": row.total_codes,
+            "issued_codes": row.issued_codes,
+            "code_requests": row.code_requests,
+            "screenshots": row.screenshots
+        }
+        for row in result
+    ]
 
     return {"sessions": sessions_data}
 
@@ -306,34 +243,39 @@ async def get_active_session_participants(
             "participants": []
         }
 
-    # Получаем всех учеников, которые запросили код для этой сессии
+    # Ученики, которые запросили код для этой сессии (один запрос с JOIN)
     result = await session.execute(
-        select(CodeRequest)
+        select(
+            CodeRequest.student_id,
+            CodeRequest.requested_at,
+            CodeRequest.code,
+            CodeRequest.screenshot_submitted,
+            CodeRequest.screenshot_submitted_at,
+            Student.full_name,
+            Student.class_number,
+            Student.parallel
+        )
+        .join(Student, Student.id == CodeRequest.student_id)
         .where(CodeRequest.session_id == active_session.id)
         .order_by(CodeRequest.requested_at.desc())
     )
-    requests = result.scalars().all()
 
     participants = []
     seen_students = set()
 
-    for req in requests:
-        if req.student_id in seen_students:
-            continue
-        seen_students.add(req.student_id)
-
-        student = await session.get(Student, req.student_id)
-        if not student:
+    for row in result:
+        if row.student_id in seen_students:
             continue
+        seen_students.add(row.student_id)
 
         participants.append({
-            "student_id": student.id,
-            "full_name": student.full_name,
-            "class_display": f"{student.class_number}{student.parallel or ''}" if student.class_number else "-",
-            "requested_at": req.requested_at.isoformat() if req.requested_at else None,
-            "code": req.code,
-            "screenshot_submitted": req.screenshot_submitted,
-            "screenshot_submitted_at": req.screenshot_submitted_at.isoformat() if req.screenshot_submitted_at else None
+            "student_id": row.student_id,
+            "full_name": row.full_name,
+            "class_display": f"{row.class_number}{row.parallel or ''}" if row.class_number else "-",
+            "requested_at": row.requested_at.isoformat() if row.requested_at else None,
+            "code": row.code,
+            "screenshot_submitted": row.screenshot_submitted,
+            "screenshot_submitted_at": row.screenshot_submitted_at.isoformat() if row.screenshot_submitted_at else None
         })
 
     return {
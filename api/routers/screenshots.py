@@ -4,9 +4,10 @@ API для работы со скриншотами
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
-from database.database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import select, func
+from database.database import get_async_session
 from database.models import CodeRequest, Student, OlympiadSession
 from typing import List, Optional
 from pydantic import BaseModel
@@ -18,15 +19,6 @@ router = APIRouter(prefix="/api/screenshots", tags=["screenshots"])
 SCREENSHOTS_FOLDER = os.getenv("SCREENSHOTS_FOLDER", "screenshots")
 
 
-# Dependency для получения сессии БД
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 class ScreenshotInfo(BaseModel):
     """Информация о скриншоте"""
     id: int
@@ -57,7 +49,7 @@ async def get_screenshots_list(
     session_id: Optional[int] = None,
     subject: Optional[str] = None,
     class_number: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_session)
 ):
     """
     Получить список всех скриншотов с фильтрацией
@@ -67,7 +59,7 @@ async def get_screenshots_list(
     - subject: Предмет (опционально)
     - class_number: Класс (опционально)
     """
-    query = db.query(CodeRequest).filter(
+    query = select(CodeRequest).where(
         CodeRequest.screenshot_submitted == True,
         CodeRequest.screenshot_path.isnot(None)
     ).options(
@@ -76,15 +68,16 @@ async def get_screenshots_list(
     )
 
     if session_id:
-        query = query.filter(CodeRequest.session_id == session_id)
+        query = query.where(CodeRequest.session_id == session_id)
 
     if class_number:
-        query = query.join(Student).filter(Student.class_number == class_number)
+        query = query.join(Student).where(Student.class_number == class_number)
 
     if subject:
-        query = query.join(OlympiadSession).filter(OlympiadSession.subject == subject)
+        query = query.join(OlympiadSession).where(OlympiadSession.subject == subject)
 
-    requests = query.order_by(CodeRequest.screenshot_submitted_at.desc()).all()
+    result = await db.execute(query.order_by(CodeRequest.screenshot_submitted_at.desc()))
+    requests = result.scalars().all()
 
     result = []
     for req in requests:
@@ -114,11 +107,11 @@ async def get_screenshots_list(
 
 
 @router.get("/by-subject", response_model=List[ScreenshotsBySubject])
-async def get_screenshots_by_subject(db: Session = Depends(get_db)):
+async def get_screenshots_by_subject(db: AsyncSession = Depends(get_async_session)):
     """
     Получить скриншоты, сгруппированные по предметам
     """
-    screenshots = await get_screenshots_list(db=db)
+    screenshots = await get_screenshots_list(session_id=None, subject=None, class_number=None, db=db)
 
     # Группируем по предмету
     by_subject = {}
@@ -137,14 +130,17 @@ async def get_screenshots_by_subject(db: Session = Depends(get_db)):
 
 
 @router.get("/view/{request_id}")
-async def view_screenshot(request_id: int, db: Session = Depends(get_db)):
+async def view_screenshot(request_id: int, db: AsyncSession = Depends(get_async_session)):
     """
     Просмотр скриншота по ID запроса кода
     """
-    request = db.query(CodeRequest).filter(
-        CodeRequest.id == request_id,
-        CodeRequest.screenshot_submitted == True
-    ).first()
+    result = await db.execute(
+        select(CodeRequest).where(
+            CodeRequest.id == request_id,
+            CodeRequest.screenshot_submitted == True
+        )
+    )
+    request = result.scalar_one_or_none()
 
     if not request or not request.screenshot_path:
         raise HTTPException(status_code=404, detail="Скриншот не найден")
@@ -162,36 +158,26 @@ async def view_screenshot(request_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/stats")
-async def get_screenshots_stats(db: Session = Depends(get_db)):
+async def get_screenshots_stats(db: AsyncSession = Depends(get_async_session)):
     """
     Получить статистику по скриншотам
     """
-    total_submitted = db.query(CodeRequest).filter(
-        CodeRequest.screenshot_submitted == True
-    ).count()
-
-    total_expected = db.query(CodeRequest).count()
+    result = await db.execute(
+        select(
+            func.count(CodeRequest.id),
+            func.count(CodeRequest.id).filter(CodeRequest.screenshot_submitted == True)
+        )
+    )
+    total_expected, total_submitted = result.one()
 
     # Статистика по предметам
-    by_subject = db.query(
-        OlympiadSession.subject,
-        OlympiadSession.id
-    ).join(CodeRequest).filter(
-        CodeRequest.screenshot_submitted == True
-    ).group_by(OlympiadSession.subject, OlympiadSession.id).all()
-
-    subject_stats = {}
-    for subject, session_id in by_subject:
-        count = db.query(CodeRequest).filter(
-            and_(
-                CodeRequest.session_id == session_id,
-                CodeRequest.screenshot_submitted == True
-            )
-        ).count()
-
-        if subject not in subject_stats:
-            subject_stats[subject] = 0
-        subject_stats[subject] += count
+    result = await db.execute(
+        select(OlympiadSession.subject, func.count(CodeRequest.id))
+        .join(CodeRequest)
+        .where(CodeRequest.screenshot_submitted == True)
+        .group_by(OlympiadSession.subject)
+    )
+    subject_stats = {subject: count for subject, count in result.all()}
 
     return {
         "total_submitted": total_submitted,
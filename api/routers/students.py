@@ -1,18 +1,28 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from pydantic import BaseModel
+from itertools import islice
+import asyncio
 import tempfile
 import os
 
 from database.database import get_async_session
-from database.models import Student
-from parser.excel_parser import parse_students_excel
-from utils.auth import generate_multiple_codes, generate_registration_code
+from database import crud, events
+from database.models import Student, moscow_now
+from parser.excel_parser import StudentValidation, open_student_parser
+from utils.auth import generate_registration_code
+from utils.student_import import StudentImporter
+from utils.roster_sync import MATCH_NAME, RosterSync
+from utils.statistics import get_student_statistics
 
 router = APIRouter(prefix="/api/students", tags=["Students"])
 
+UPLOAD_CHUNK_SIZE = 256 * 1024
+STUDENTS_CHUNK_SIZE = 1000
+STUDENTS_PAGE_MAX = 1000
+
 
 class StudentCreate(BaseModel):
     full_name: str
@@ -26,29 +36,65 @@ class StudentUpdate(BaseModel):
     parallel: Optional[str] = None
 
 
+async def students_page(
+    session: AsyncSession,
+    response: Response,
+    columns,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    **filters
+) -> list:
+    """
+    Страница списка учеников для эндпоинтов
+
+    Курсор следующей страницы передается в заголовке X-Next-Cursor
+    (нет заголовка - страница последняя); тело ответа - по-прежнему список.
+    """
+    try:
+        rows, next_cursor = await crud.list_students(session, columns, after=after, limit=limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
 @router.get("/", response_model=List[Dict])
 async def get_all_students(
+    response: Response,
     include_inactive: bool = Query(False, description="Включить не зарегистрированных учеников"),
+    registered: Optional[bool] = Query(None, description="Фильтр по регистрации (приоритетнее include_inactive)"),
+    include_deactivated: bool = Query(False, description="Включить выбывших учеников (деактивированных сверкой списка)"),
+    class_number: Optional[int] = Query(None),
+    parallel: Optional[str] = Query(None),
+    name: Optional[str] = Query(None, description="Начало ФИО"),
+    after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=STUDENTS_PAGE_MAX, description="Размер страницы (без limit - все)"),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Получить всех учеников"""
-    query = select(Student).order_by(Student.class_number, Student.parallel, Student.full_name)
-    if not include_inactive:
-        query = query.where(Student.is_registered == True)
-
-    result = await session.execute(query)
-    students = result.scalars().all()
+    if registered is None and not include_inactive:
+        registered = True
+
+    students = await students_page(
+        session, response,
+        [Student.registration_code, Student.is_registered, Student.telegram_id],
+        after=after, limit=limit,
+        registered=registered, class_number=class_number, parallel=parallel, name_prefix=name,
+        active=None if include_deactivated else True
+    )
 
     return [
         {
-            "id": s.id,
-            "full_name": s.full_name,
-            "registration_code": s.registration_code,
-            "is_registered": s.is_registered,
-            "telegram_id": s.telegram_id,
-            "class_number": s.class_number,
-            "parallel": s.parallel,
-            "class_display": f"{s.class_number}{s.parallel or ''}" if s.class_number else None
+            "id": s["id"],
+            "full_name": s["full_name"],
+            "registration_code": s["registration_code"],
+            "is_registered": s["is_registered"],
+            "telegram_id": s["telegram_id"],
+            "class_number": s["class_number"],
+            "parallel": s["parallel"],
+            "class_display": f"{s['class_number']}{s['parallel'] or ''}" if s["class_number"] else None
         }
         for s in students
     ]
@@ -59,60 +105,48 @@ async def upload_students_excel(
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_async_session)
 ):
-    """Загрузка учеников из Excel"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(400, "Поддерживаются только .xlsx и .xls файлы")
-    
-    # Сохраняем временный файл
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    """Загрузка учеников из Excel (или CSV)"""
+    tmp_path = await _save_upload(file)
     
     try:
-        # Парсим
-        students_data, validation = parse_students_excel(tmp_path)
+        # Парсим потоково: файл читается в потоке, ученики добавляются пачками
+        students_iter = open_student_parser(tmp_path).iter_students()
+        validation = StudentValidation()
+        importer = StudentImporter(session)
         
-        # Генерируем коды
-        reg_codes = generate_multiple_codes(len(students_data))
-        
-        created = []
-        skipped = []
-        
-        for student_data, reg_code in zip(students_data, reg_codes):
-            # Проверяем существование
-            result = await session.execute(
-                select(Student).where(Student.full_name == student_data["full_name"])
-            )
-            existing = result.scalar_one_or_none()
-
-            if existing:
-                skipped.append(student_data["full_name"])
-                continue
-
-            # Создаем
-            student = Student(
-                full_name=student_data["full_name"],
-                registration_code=reg_code,
-                is_registered=False,
-                class_number=student_data.get("class_number"),
-                parallel=student_data.get("parallel")
-            )
-            session.add(student)
-            created.append({
-                "name": student_data["full_name"],
-                "code": reg_code,
-                "class": f"{student_data.get('class_number')}{student_data.get('parallel') or ''}"
-            })
+        while True:
+            try:
+                students_data = await asyncio.to_thread(_take, students_iter, STUDENTS_CHUNK_SIZE)
+            except ValueError as e:
+                # Нет заголовка или неверный формат: ничего из файла не сохраняем
+                await session.rollback()
+                raise HTTPException(400, str(e))
+            if not students_data:
+                break
+
+            for student_data in students_data:
+                validation.add(student_data)
+
+            # Существующие ФИО - одним запросом, новые ученики - одним INSERT
+            await importer.add(students_data)
         
         await session.commit()
         
+        created = [
+            {
+                "name": student["full_name"],
+                "code": student["registration_code"],
+                "class": f"{student['class_number']}{student['parallel'] or ''}"
+            }
+            for student in importer.created
+        ]
+
         return {
             "success": True,
             "created": len(created),
-            "skipped": len(skipped),
+            "skipped": len(importer.skipped),
             "students": created,
-            "validation": validation
+            "validation": validation.result()
         }
     
     finally:
@@ -120,6 +154,82 @@ async def upload_students_excel(
             os.remove(tmp_path)
 
 
+@router.post("/roster/preview")
+async def preview_roster_sync(
+    file: UploadFile = File(...),
+    match: str = Query(MATCH_NAME, description="Сопоставление: name - по ФИО, name_class - по ФИО и классу"),
+    class_offset: int = Query(0, description="Сдвиг класса при переводе (1 - в следующий класс)"),
+    add_new: bool = Query(True, description="Добавлять новых учеников"),
+    deactivate_missing: bool = Query(True, description="Деактивировать отсутствующих в списке"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Сверка списка учеников с базой: только показать изменения"""
+    return await _sync_roster_file(
+        session, file, True, match, class_offset, add_new, deactivate_missing
+    )
+
+
+@router.post("/roster/apply")
+async def apply_roster_sync(
+    file: UploadFile = File(...),
+    match: str = Query(MATCH_NAME, description="Сопоставление: name - по ФИО, name_class - по ФИО и классу"),
+    class_offset: int = Query(0, description="Сдвиг класса при переводе (1 - в следующий класс)"),
+    add_new: bool = Query(True, description="Добавлять новых учеников"),
+    deactivate_missing: bool = Query(True, description="Деактивировать отсутствующих в списке"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Сверка списка учеников с базой: применить изменения одной транзакцией"""
+    return await _sync_roster_file(
+        session, file, False, match, class_offset, add_new, deactivate_missing
+    )
+
+
+async def _sync_roster_file(
+    session: AsyncSession,
+    file: UploadFile,
+    preview: bool,
+    match: str,
+    class_offset: int,
+    add_new: bool,
+    deactivate_missing: bool
+) -> Dict:
+    tmp_path = await _save_upload(file)
+
+    try:
+        students_data = await asyncio.to_thread(open_student_parser(tmp_path).parse)
+        sync = RosterSync(
+            session,
+            match=match,
+            class_offset=class_offset,
+            add_new=add_new,
+            deactivate_missing=deactivate_missing
+        )
+        return await sync.run(students_data, preview=preview)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+async def _save_upload(file: UploadFile) -> str:
+    """Сохраняет загруженный список учеников во временный файл (порциями)"""
+    if not file.filename.lower().endswith(('.xlsx', '.xls', '.csv')):
+        raise HTTPException(400, "Поддерживаются только .xlsx, .xls и .csv файлы")
+
+    suffix = '.csv' if file.filename.lower().endswith('.csv') else '.xlsx'
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            tmp.write(chunk)
+        return tmp.name
+
+
+def _take(iterator: Iterator[Dict], count: int) -> List[Dict]:
+    """Следующие count элементов итератора"""
+    return list(islice(iterator, count))
+
+
 @router.post("/create")
 async def create_student(
     student_data: StudentCreate,
@@ -192,8 +302,12 @@ async def update_student(
     if student_data.parallel is not None:
         student.parallel = student_data.parallel
 
+    student.updated_at = moscow_now()
+
     await session.commit()
     await session.refresh(student)
+    if student.telegram_id:
+        await events.publish(session, events.TOPIC_STUDENTS_CHANGED, student.telegram_id)
 
     return {
         "success": True,
@@ -216,32 +330,15 @@ async def get_students_stats(
     session: AsyncSession = Depends(get_async_session)
 ):
     """Статистика по ученикам"""
-    from sqlalchemy import func
-
-    # Всего
-    result = await session.execute(select(func.count(Student.id)))
-    total = result.scalar()
-
-    # Зарегистрированных
-    result = await session.execute(
-        select(func.count(Student.id)).where(Student.is_registered == True)
-    )
-    registered = result.scalar()
-
-    # Статистика по классам
-    result = await session.execute(
-        select(Student.class_number, func.count(Student.id))
-        .where(Student.class_number.isnot(None))
-        .group_by(Student.class_number)
-        .order_by(Student.class_number)
-    )
-    by_class = {row[0]: row[1] for row in result.fetchall()}
+    stats = await get_student_statistics(session)
+    overall = stats.overall
 
     return {
-        "total": total,
-        "registered": registered,
-        "not_registered": total - registered,
-        "by_class": by_class
+        "total": overall.total,
+        "registered": overall.registered,
+        "not_registered": overall.unregistered,
+        "notifications_off": overall.notifications_off,
+        "by_class": {class_num: data.total for class_num, data in stats.by_class().items()}
     }
 
 
@@ -250,27 +347,19 @@ async def get_classes_list(
     session: AsyncSession = Depends(get_async_session)
 ):
     """Получить список всех классов с параллелями"""
-    from sqlalchemy import func, distinct
-
-    # Получаем все уникальные комбинации класс-параллель
-    result = await session.execute(
-        select(Student.class_number, Student.parallel, func.count(Student.id))
-        .where(Student.class_number.isnot(None))
-        .group_by(Student.class_number, Student.parallel)
-        .order_by(Student.class_number, Student.parallel)
-    )
+    stats = await get_student_statistics(session)
 
-    classes_data = []
-    for row in result.fetchall():
-        class_num, parallel, count = row
-        classes_data.append({
-            "class_number": class_num,
-            "parallel": parallel,
-            "display": f"{class_num}{parallel or ''}",
-            "students_count": count
-        })
-
-    return {"classes": classes_data}
+    return {
+        "classes": [
+            {
+                "class_number": group.class_number,
+                "parallel": group.parallel,
+                "display": group.display,
+                "students_count": group.total
+            }
+            for group in stats.by_parallel()
+        ]
+    }
 
 
 @router.get("/{student_id}")
@@ -314,8 +403,11 @@ async def delete_student(
     if not student:
         raise HTTPException(404, "Ученик не найден")
 
+    telegram_id = student.telegram_id
     await session.delete(student)
     await session.commit()
+    if telegram_id:
+        await events.publish(session, events.TOPIC_STUDENTS_CHANGED, telegram_id)
 
     return {"success": True, "message": "Ученик удален"}
 
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.database import get_async_session
-from database import crud
+from database import crud, events
 from parser.docx_parser import parse_olympiad_file
 from datetime import datetime
 import os
@@ -178,5 +178,6 @@ async def activate_session(
         .values(is_active=True)
     )
     await session.commit()
+    await events.publish(session, events.TOPIC_ACTIVE_SESSION)
     
     return {"success": True, "session_id": session_id}
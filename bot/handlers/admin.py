@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from database.database import AsyncSessionLocal
 from database import crud
 from bot.keyboards import get_admin_main_menu
+from utils.statistics import get_olympiad_counts, get_student_statistics
 import os
 from loguru import logger
 
@@ -58,17 +59,17 @@ async def show_statistics(callback: CallbackQuery):
         return
 
     async with AsyncSessionLocal() as session:
-        # Получаем статистику одним запросом вместо загрузки всех студентов
-        student_stats = await crud.get_students_count_stats(session)
-        all_sessions = await crud.get_all_sessions(session)
+        student_stats = (await get_student_statistics(session)).overall
+        olympiads = await get_olympiad_counts(session)
         active_session = await crud.get_active_session(session)
 
         stats_text = (
             "📊 Статистика системы\n\n"
-            f"👥 Всего учеников: {student_stats['total']}\n"
-            f"✅ Зарегистрированных: {student_stats['registered']}\n"
-            f"❌ Не зарегистрированных: {student_stats['unregistered']}\n\n"
-            f"🏆 Всего олимпиад: {len(all_sessions)}\n"
+            f"👥 Всего учеников: {student_stats.total}\n"
+            f"✅ Зарегистрированных: {student_stats.registered}\n"
+            f"❌ Не зарегистрированных: {student_stats.unregistered}\n"
+            f"🔕 Отключили уведомления: {student_stats.notifications_off}\n\n"
+            f"🏆 Всего олимпиад: {olympiads['total']}\n"
             f"🟢 Активных олимпиад: {1 if active_session else 0}\n"
         )
 
@@ -89,8 +90,7 @@ async def show_students(callback: CallbackQuery):
         return
 
     async with AsyncSessionLocal() as session:
-        # Получаем статистику одним запросом вместо N+1
-        stats = await crud.get_classes_statistics(session)
+        stats = (await get_student_statistics(session)).by_class()
 
         if not stats:
             await callback.message.edit_text(
@@ -101,7 +101,7 @@ async def show_students(callback: CallbackQuery):
 
         text = "👥 Список классов:\n\n"
         for class_num, data in stats.items():
-            text += f"{class_num} класс: {data['total']} учеников ({data['registered']} зарег.)\n"
+            text += f"{class_num} класс: {data.total} учеников ({data.registered} зарег.)\n"
 
     await callback.message.edit_text(
         text + "\n💡 Используйте API для управления учениками",
@@ -195,8 +195,7 @@ async def delete_class_command(message: Message):
         return
 
     async with AsyncSessionLocal() as session:
-        # Получаем статистику одним запросом вместо N+1
-        stats = await crud.get_classes_statistics(session)
+        stats = (await get_student_statistics(session)).by_class()
 
         if not stats:
             await message.answer("📝 В базе данных нет классов")
@@ -204,7 +203,7 @@ async def delete_class_command(message: Message):
 
         text = "👥 Список классов:\n\n"
         for class_num, data in stats.items():
-            text += f"{class_num} класс: {data['total']} учеников\n"
+            text += f"{class_num} класс: {data.total} учеников\n"
 
         text += "\n💡 Для удаления класса используйте:\n"
         text += "DELETE /api/admin/classes/{class_number}"
@@ -7,6 +7,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.database import AsyncSessionLocal
 from database import crud
+from database.models import Student
 from bot.keyboards import (
     get_students_management_menu, get_classes_management_menu,
     get_olympiads_management_menu, get_export_menu, get_admin_main_menu,
@@ -16,6 +17,7 @@ from bot.keyboards import (
 from utils.admin_logger import AdminActionLogger
 from utils.admin_notifications import notify_system_event
 from utils.excel_export import ExcelExporter
+from utils.statistics import get_student_statistics
 import os
 from loguru import logger
 
@@ -107,9 +109,9 @@ async def show_all_students(callback: CallbackQuery):
         return
 
     async with AsyncSessionLocal() as session:
-        students = await crud.get_all_students(session)
+        total = (await get_student_statistics(session)).overall.total
 
-        if not students:
+        if not total:
             await callback.message.edit_text(
                 "📝 В базе данных нет учеников",
                 reply_markup=get_students_management_menu()
@@ -117,22 +119,27 @@ async def show_all_students(callback: CallbackQuery):
             return
 
         # Показываем первые 20
-        text = f"👥 <b>Всего учеников: {len(students)}</b>\n\n"
-
-        for student in students[:20]:
-            status = "✅" if student.is_registered else "❌"
-            class_info = f"{student.class_number}{student.parallel or ''}" if student.class_number else "Не указан"
-            text += f"{status} <b>{student.full_name}</b> ({class_info} кл.)\n"
-            text += f"   ID: {student.id} | Код: {student.registration_code}\n\n"
-
-        if len(students) > 20:
-            text += f"\n... и еще {len(students) - 20} учеников"
+        students, _ = await crud.list_students(
+            session,
+            columns=[Student.is_registered, Student.registration_code],
+            limit=20
+        )
+        text = f"👥 <b>Всего учеников: {total}</b>\n\n"
+
+        for student in students:
+            status = "✅" if student["is_registered"] else "❌"
+            class_info = f"{student['class_number']}{student['parallel'] or ''}" if student["class_number"] else "Не указан"
+            text += f"{status} <b>{student['full_name']}</b> ({class_info} кл.)\n"
+            text += f"   ID: {student['id']} | Код: {student['registration_code']}\n\n"
+
+        if total > 20:
+            text += f"\n... и еще {total - 20} учеников"
 
     AdminActionLogger.log_action(
         callback.from_user.id,
         callback.from_user.full_name,
         "view_students_list",
-        {"total": len(students)}
+        {"total": total}
     )
 
     await callback.message.edit_text(
@@ -311,8 +318,7 @@ async def show_classes_list(callback: CallbackQuery):
         return
 
     async with AsyncSessionLocal() as session:
-        # Получаем статистику одним запросом вместо N+1
-        stats = await crud.get_classes_statistics(session)
+        stats = (await get_student_statistics(session)).by_class()
 
         if not stats:
             await callback.message.edit_text(
@@ -324,7 +330,7 @@ async def show_classes_list(callback: CallbackQuery):
         text = "🎓 <b>Список классов:</b>\n\n"
 
         for class_num, data in stats.items():
-            text += f"<b>{class_num} класс:</b> {data['total']} уч. ({data['registered']} зарег.)\n"
+            text += f"<b>{class_num} класс:</b> {data.total} уч. ({data.registered} зарег.)\n"
 
     await callback.message.edit_text(
         text,
@@ -368,7 +374,7 @@ async def show_class_students(callback: CallbackQuery):
     class_number = int(callback.data.split("_")[2])
 
     async with AsyncSessionLocal() as session:
-        students = await crud.get_students_by_class(session, class_number)
+        students = await crud.get_students_by_class(session, class_number, active=True)
 
         if not students:
             await callback.answer(f"В {class_number} классе нет учеников", show_alert=True)
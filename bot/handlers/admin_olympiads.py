@@ -11,10 +11,9 @@ from bot.keyboards import (
 )
 from utils.admin_logger import AdminActionLogger
 from utils.admin_notifications import notify_system_event
-from utils.excel_export import ExcelExporter
+from utils.statistics import get_export_statistics, get_olympiad_code_stats
+from utils.excel_export import ExcelExporter, ExportTable, OLYMPIADS_TABLE, STUDENTS_TABLE, export_table
 import os
-import csv
-import io
 from loguru import logger
 
 router = Router()
@@ -294,74 +293,43 @@ async def show_olympiad_stats(callback: CallbackQuery):
     olympiad_id = int(callback.data.split("_")[2])
 
     async with AsyncSessionLocal() as session:
-        from sqlalchemy import select, func
-        from database.models import Grade8Code, Grade9Code, CodeRequest
-
         olympiad = await crud.get_session_by_id(session, olympiad_id)
 
         if not olympiad:
             await callback.answer("Олимпиада не найдена", show_alert=True)
             return
 
-        # Статистика по кодам 8 класса
-        grade8_total = await session.execute(
-            select(func.count(Grade8Code.id)).where(Grade8Code.session_id == olympiad_id)
-        )
-        grade8_issued = await session.execute(
-            select(func.count(Grade8Code.id)).where(
-                Grade8Code.session_id == olympiad_id,
-                Grade8Code.is_issued == True
-            )
-        )
-
-        # Статистика по кодам 9 класса
-        grade9_total = await session.execute(
-            select(func.count(Grade9Code.id)).where(Grade9Code.session_id == olympiad_id)
-        )
-        grade9_used = await session.execute(
-            select(func.count(Grade9Code.id)).where(
-                Grade9Code.session_id == olympiad_id,
-                Grade9Code.is_used == True
-            )
-        )
-
-        # Статистика по запросам
-        requests_total = await session.execute(
-            select(func.count(CodeRequest.id)).where(CodeRequest.session_id == olympiad_id)
-        )
-        screenshots = await session.execute(
-            select(func.count(CodeRequest.id)).where(
-                CodeRequest.session_id == olympiad_id,
-                CodeRequest.screenshot_submitted == True
-            )
-        )
-
-        g8_total = grade8_total.scalar()
-        g8_issued = grade8_issued.scalar()
-        g9_total = grade9_total.scalar()
-        g9_used = grade9_used.scalar()
-        req_total = requests_total.scalar()
-        scr_count = screenshots.scalar()
+        stats = await get_olympiad_code_stats(session, olympiad_id)
 
     text = (
         f"📊 <b>Статистика: {olympiad.subject}</b>\n\n"
         f"📅 Дата: {olympiad.date.strftime('%d.%m.%Y')}\n"
         f"🎓 Класс: {olympiad.class_number or 'Разные'}\n"
         f"⭐ Статус: {'🟢 Активна' if olympiad.is_active else '⚪ Неактивна'}\n\n"
-        f"<b>Коды 8 класса:</b>\n"
-        f"  Всего: {g8_total}\n"
-        f"  Выдано: {g8_issued}\n\n"
-        f"<b>Коды 9+ классов:</b>\n"
-        f"  Всего: {g9_total}\n"
-        f"  Использовано: {g9_used}\n"
-        f"  Осталось: {g9_total - g9_used}\n\n"
-        f"<b>Запросы кодов:</b> {req_total}\n"
-        f"<b>Скриншоты:</b> {scr_count}\n"
     )
 
-    if req_total > 0:
-        percentage = int((scr_count / req_total) * 100)
-        text += f"<b>Процент сдачи:</b> {percentage}%"
+    if stats["classes"]:
+        text += "<b>Коды по классам (выдано / всего):</b>\n"
+        for class_stats in stats["classes"]:
+            text += f"  {class_stats['class_number']} кл.: {class_stats['issued']} / {class_stats['total']}\n"
+        text += "\n"
+    else:
+        text += "<b>Коды не загружены</b>\n\n"
+
+    if stats["reserve"]:
+        text += "<b>Резерв 8 класса (использовано / всего):</b>\n"
+        for reserve in stats["reserve"]:
+            text += f"  {reserve['class_parallel']}: {reserve['used']} / {reserve['total']}\n"
+        text += "\n"
+
+    requests = stats["requests"]
+    text += (
+        f"<b>Запросы кодов:</b> {requests['total']}\n"
+        f"<b>Скриншоты:</b> {requests['with_screenshot']}\n"
+    )
+
+    if requests["total"] > 0:
+        text += f"<b>Процент сдачи:</b> {requests['completion_rate']}%"
 
     await callback.message.edit_text(
         text,
@@ -375,142 +343,50 @@ async def show_olympiad_stats(callback: CallbackQuery):
 @router.callback_query(F.data == "admin_export_students_csv")
 async def export_students_csv(callback: CallbackQuery):
     """Экспорт учеников в CSV"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
-        return
-
-    await callback.answer("Генерирую CSV файл...", show_alert=False)
-
-    async with AsyncSessionLocal() as session:
-        students = await crud.get_all_students(session)
-
-        # Создаем CSV в памяти
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Заголовки
-        writer.writerow([
-            "ID", "ФИО", "Класс", "Параллель", "Код регистрации",
-            "Зарегистрирован", "Telegram ID", "Дата создания"
-        ])
-
-        # Данные
-        for s in students:
-            writer.writerow([
-                s.id,
-                s.full_name,
-                s.class_number or "",
-                s.parallel or "",
-                s.registration_code,
-                "Да" if s.is_registered else "Нет",
-                s.telegram_id or "-",
-                s.created_at.strftime("%Y-%m-%d %H:%M:%S")
-            ])
-
-        output.seek(0)
-        csv_bytes = output.getvalue().encode('utf-8-sig')  # BOM для Excel
-
-    # Отправляем файл
-    file = BufferedInputFile(csv_bytes, filename="students.csv")
-    await callback.message.answer_document(file, caption=f"📄 Список учеников ({len(students)} чел.)")
-
-    AdminActionLogger.log_export(
-        callback.from_user.id,
-        callback.from_user.full_name,
-        "students_csv",
-        len(students)
-    )
+    await _send_export(callback, STUDENTS_TABLE, "csv", "📄 Список учеников ({rows} чел.)")
 
 
 @router.callback_query(F.data == "admin_export_students_excel")
 async def export_students_excel(callback: CallbackQuery):
     """Экспорт учеников в Excel"""
+    await _send_export(callback, STUDENTS_TABLE, "xlsx", "📊 Список учеников ({rows} чел.)")
+
+
+@router.callback_query(F.data == "admin_export_olympiads_csv")
+async def export_olympiads_csv(callback: CallbackQuery):
+    """Экспорт олимпиад в CSV"""
+    await _send_export(callback, OLYMPIADS_TABLE, "csv", "📄 Список олимпиад ({rows} шт.)")
+
+
+async def _send_export(callback: CallbackQuery, table: ExportTable, fmt: str, caption: str):
+    """Выгрузка таблицы во временный файл и отправка документом"""
     if not is_admin(callback.from_user.id):
         await callback.answer("У вас нет доступа", show_alert=True)
         return
 
-    await callback.answer("Генерирую Excel файл...", show_alert=False)
+    file_type = "Excel" if fmt == "xlsx" else "CSV"
+    await callback.answer(f"Генерирую {file_type} файл...", show_alert=False)
 
     try:
         async with AsyncSessionLocal() as session:
-            students = await crud.get_all_students(session)
-
-            students_data = [
-                {
-                    "id": s.id,
-                    "full_name": s.full_name,
-                    "class_number": s.class_number,
-                    "parallel": s.parallel,
-                    "registration_code": s.registration_code,
-                    "is_registered": s.is_registered,
-                    "telegram_id": s.telegram_id,
-                    "created_at": s.created_at.isoformat(),
-                    "registered_at": s.registered_at.isoformat() if s.registered_at else None
-                }
-                for s in students
-            ]
-
-        # Генерируем Excel
-        excel_file = ExcelExporter.export_students(students_data)
-
-        # Отправляем файл
-        file = BufferedInputFile(excel_file.read(), filename="students.xlsx")
-        await callback.message.answer_document(file, caption=f"📊 Список учеников ({len(students)} чел.)")
-
-        AdminActionLogger.log_export(
-            callback.from_user.id,
-            callback.from_user.full_name,
-            "students_excel",
-            len(students)
-        )
-
+            export = await export_table(session, table, fmt)
     except ImportError:
         await callback.answer(
             "❌ Модуль openpyxl не установлен. Используйте CSV экспорт.",
             show_alert=True
         )
-
-
-@router.callback_query(F.data == "admin_export_olympiads_csv")
-async def export_olympiads_csv(callback: CallbackQuery):
-    """Экспорт олимпиад в CSV"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("У вас нет доступа", show_alert=True)
         return
 
-    await callback.answer("Генерирую CSV файл...", show_alert=False)
-
-    async with AsyncSessionLocal() as session:
-        sessions = await crud.get_all_sessions(session)
-
-        # Создаем CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        writer.writerow(["ID", "Предмет", "Класс", "Дата", "Этап", "Активна", "Файл"])
-
-        for s in sessions:
-            writer.writerow([
-                s.id,
-                s.subject,
-                s.class_number or "Разные",
-                s.date.strftime("%d.%m.%Y"),
-                s.stage or "-",
-                "Да" if s.is_active else "Нет",
-                s.uploaded_file_name or "-"
-            ])
-
-        output.seek(0)
-        csv_bytes = output.getvalue().encode('utf-8-sig')
-
-    file = BufferedInputFile(csv_bytes, filename="olympiads.csv")
-    await callback.message.answer_document(file, caption=f"📄 Список олимпиад ({len(sessions)} шт.)")
+    try:
+        await callback.message.answer_document(export.input_file(), caption=caption.format(rows=export.rows))
+    finally:
+        export.remove()
 
     AdminActionLogger.log_export(
         callback.from_user.id,
         callback.from_user.full_name,
-        "olympiads_csv",
-        len(sessions)
+        f"{table.name}_{'excel' if fmt == 'xlsx' else fmt}",
+        export.rows
     )
 
 
@@ -525,32 +401,7 @@ async def export_stats_excel(callback: CallbackQuery):
 
     try:
         async with AsyncSessionLocal() as session:
-            all_students = await crud.get_all_students(session)
-            registered = [s for s in all_students if s.is_registered]
-            all_sessions = await crud.get_all_sessions(session)
-            classes = await crud.get_all_classes(session)
-
-            # Собираем статистику по классам
-            classes_stats = []
-            for class_num in classes:
-                class_students = await crud.get_students_by_class(session, class_num)
-                class_registered = sum(1 for s in class_students if s.is_registered)
-                classes_stats.append({
-                    "class_number": class_num,
-                    "total": len(class_students),
-                    "registered": class_registered
-                })
-
-            stats = {
-                "general": {
-                    "Всего учеников": len(all_students),
-                    "Зарегистрировано": len(registered),
-                    "Не зарегистрировано": len(all_students) - len(registered),
-                    "Всего олимпиад": len(all_sessions),
-                    "Активных олимпиад": sum(1 for s in all_sessions if s.is_active)
-                },
-                "classes": classes_stats
-            }
+            stats = await get_export_statistics(session)
 
         excel_file = ExcelExporter.export_statistics(stats)
 
@@ -12,7 +12,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 import os
 
-from database.database import SessionLocal
+from database.database import AsyncSessionLocal
+from database import events
 from database.models import User, AuthToken, moscow_now
 
 logger = logging.getLogger(__name__)
@@ -28,11 +29,6 @@ class AddUserForm(StatesGroup):
     waiting_for_role = State()
 
 
-def get_db():
-    """Получение сессии БД"""
-    return SessionLocal()
-
-
 def is_admin(telegram_id: str) -> bool:
     """Проверка, является ли пользователь администратором"""
     return str(telegram_id) == str(ADMIN_TELEGRAM_ID)
@@ -55,14 +51,16 @@ async def handle_auth_deeplink(message: Message):
 
     token = deep_link_arg[5:]  # Убираем префикс "auth_"
 
-    db = get_db()
-    try:
+    async with AsyncSessionLocal() as db:
         # Находим токен в БД
-        auth_token = db.query(AuthToken).filter(
-            AuthToken.token == token,
-            AuthToken.is_used == False,
-            AuthToken.expires_at > moscow_now()
-        ).first()
+        result = await db.execute(
+            select(AuthToken).where(
+                AuthToken.token == token,
+                AuthToken.is_used == False,
+                AuthToken.expires_at > moscow_now()
+            )
+        )
+        auth_token = result.scalar_one_or_none()
 
         if not auth_token:
             await message.answer(
@@ -73,7 +71,7 @@ async def handle_auth_deeplink(message: Message):
             return
 
         # Получаем пользователя
-        user = db.query(User).filter(User.id == auth_token.user_id).first()
+        user = await db.get(User, auth_token.user_id)
 
         if not user or not user.is_active:
             await message.answer(
@@ -96,7 +94,7 @@ async def handle_auth_deeplink(message: Message):
         try:
             auth_token.is_used = True
             auth_token.used_at = moscow_now()
-            db.commit()
+            await db.commit()
 
             await message.answer(
                 "✅ <b>Авторизация подтверждена!</b>\n\n"
@@ -114,9 +112,6 @@ async def handle_auth_deeplink(message: Message):
             )
             logger.error(f"Ошибка при подтверждении авторизации: {e}")
 
-    finally:
-        db.close()
-
 
 # ============================================
 # Команды администратора для управления пользователями
@@ -179,10 +174,11 @@ async def process_role(message: Message, state: FSMContext):
     data = await state.get_data()
     telegram_id = data.get("telegram_id")
 
-    db = get_db()
+    db = AsyncSessionLocal()
     try:
         # Проверяем, существует ли пользователь
-        existing_user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+        existing_user = result.scalar_one_or_none()
 
         if existing_user:
             await message.answer(
@@ -200,7 +196,7 @@ async def process_role(message: Message, state: FSMContext):
             is_active=True
         )
         db.add(new_user)
-        db.commit()
+        await db.commit()
 
         await message.answer(
             "✅ <b>Пользователь успешно добавлен!</b>\n\n"
@@ -219,7 +215,7 @@ async def process_role(message: Message, state: FSMContext):
         logger.error(f"Ошибка при добавлении пользователя: {e}")
 
     finally:
-        db.close()
+        await db.close()
         await state.clear()
 
 
@@ -232,9 +228,10 @@ async def cmd_listusers(message: Message):
         await message.answer("❌ Доступ запрещен. Эта команда доступна только администратору.")
         return
 
-    db = get_db()
+    db = AsyncSessionLocal()
     try:
-        users = db.query(User).all()
+        result = await db.execute(select(User))
+        users = result.scalars().all()
 
         if not users:
             await message.answer("📋 Список пользователей пуст.")
@@ -266,7 +263,7 @@ async def cmd_listusers(message: Message):
         logger.error(f"Ошибка при получении списка пользователей: {e}")
 
     finally:
-        db.close()
+        await db.close()
 
 
 @router.message(Command("deluser"))
@@ -294,17 +291,19 @@ async def cmd_deluser(message: Message):
         await message.answer("❌ Telegram ID должен состоять только из цифр.")
         return
 
-    db = get_db()
+    db = AsyncSessionLocal()
     try:
-        user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalar_one_or_none()
 
         if not user:
             await message.answer(f"❌ Пользователь с Telegram ID {telegram_id} не найден.")
             return
 
         # Удаляем пользователя
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
+        await events.publish(db, events.TOPIC_AUTH_CHANGED)
 
         await message.answer(
             f"✅ Пользователь удален.\n\n"
@@ -319,7 +318,7 @@ async def cmd_deluser(message: Message):
         logger.error(f"Ошибка при удалении пользователя: {e}")
 
     finally:
-        db.close()
+        await db.close()
 
 
 @router.message(Command("setactive"))
@@ -354,16 +353,18 @@ async def cmd_setactive(message: Message):
 
     is_active = is_active_str == "true"
 
-    db = get_db()
+    db = AsyncSessionLocal()
     try:
-        user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalar_one_or_none()
 
         if not user:
             await message.answer(f"❌ Пользователь с Telegram ID {telegram_id} не найден.")
             return
 
         user.is_active = is_active
-        db.commit()
+        await db.commit()
+        await events.publish(db, events.TOPIC_AUTH_CHANGED)
 
         status = "активирован" if is_active else "деактивирован"
         await message.answer(
@@ -379,4 +380,4 @@ async def cmd_setactive(message: Message):
         logger.error(f"Ошибка при изменении статуса пользователя: {e}")
 
     finally:
-        db.close()
+        await db.close()
@@ -6,9 +6,56 @@ from aiogram.fsm.state import State, StatesGroup
 from database.database import AsyncSessionLocal
 from database import crud
 from bot.keyboards import get_grade_selection_keyboard
+from utils.code_pool import code_pool
 
 router = Router()
 
+# Сколько классов пробовать, если коды разбирают одновременно с поиском
+CODE_CLAIM_ATTEMPTS = 3
+
+# Ученик выбыл по сверке списка (Student.is_active = False)
+INACTIVE_STUDENT_TEXT = (
+    "❌ Тебя нет в актуальном списке учеников.\n\n"
+    "Если это ошибка, обратись к преподавателю."
+)
+
+
+# Выдача кодов идет через пул в памяти (CODE_POOL_ENABLED) или напрямую через БД
+
+async def _get_existing_request(session, session_id: int, student_id: int):
+    """Уже выданный ученику код (в том числе еще не записанный пулом в БД)"""
+    if code_pool.enabled:
+        pending = code_pool.get_pending_claim(session_id, student_id)
+        if pending:
+            return pending
+    return await crud.get_code_request_for_student_in_session(
+        session, student_id, session_id
+    )
+
+
+async def _find_nearest_class(session, session_id: int, student_id: int, start_class: int):
+    if code_pool.enabled:
+        return await code_pool.find_nearest_available_class(session_id, student_id, start_class)
+    return await crud.find_nearest_available_class(session, session_id, start_class)
+
+
+async def _count_reserve_codes(session, session_id: int, class_parallel: str) -> int:
+    if code_pool.enabled:
+        return await code_pool.count_available_reserve_codes_for_grade8(session_id, class_parallel)
+    return await crud.count_available_reserve_codes_for_grade8(session, session_id, class_parallel)
+
+
+async def _claim_class_code(session, session_id: int, class_number: int, student_id: int):
+    if code_pool.enabled:
+        return await code_pool.claim_olympiad_code(session_id, class_number, student_id)
+    return await crud.claim_olympiad_code(session, session_id, class_number, student_id)
+
+
+async def _claim_reserve_code(session, session_id: int, class_parallel: str, student_id: int):
+    if code_pool.enabled:
+        return await code_pool.claim_reserve_code_for_grade8(session_id, class_parallel, student_id)
+    return await crud.claim_reserve_code_for_grade8(session, session_id, class_parallel, student_id)
+
 
 class OlympiadStates(StatesGroup):
     """Состояния для получения кода олимпиады"""
@@ -30,6 +77,10 @@ async def cmd_get_code(message: Message, state: FSMContext):
                 "Используй /start для регистрации."
             )
             return
+
+        if not student.is_active:
+            await message.answer(INACTIVE_STUDENT_TEXT)
+            return
         
         # Проверяем наличие активной сессии
         active_session = await crud.get_active_session(session)
@@ -42,8 +93,8 @@ async def cmd_get_code(message: Message, state: FSMContext):
             return
         
         # Проверяем, не получал ли уже ученик код для этой сессии
-        existing_request = await crud.get_code_request_for_student_in_session(
-            session, student.id, active_session.id
+        existing_request = await _get_existing_request(
+            session, active_session.id, student.id
         )
 
         if existing_request:
@@ -68,8 +119,8 @@ async def cmd_get_code(message: Message, state: FSMContext):
 
         # Ищем ближайший доступный класс (каскадный поиск)
         # Начинаем с класса ученика и ищем вверх до 11 класса
-        available_class = await crud.find_nearest_available_class(
-            session, active_session.id, student.class_number
+        available_class = await _find_nearest_class(
+            session, active_session.id, student.id, student.class_number
         )
 
         if not available_class:
@@ -86,7 +137,7 @@ async def cmd_get_code(message: Message, state: FSMContext):
 
             # Проверяем доступность резервных кодов 9 класса для 8-классников
             class_parallel = f"8{student.parallel or ''}"
-            available_reserve = await crud.count_available_reserve_codes_for_grade8(
+            available_reserve = await _count_reserve_codes(
                 session, active_session.id, class_parallel
             )
 
@@ -101,33 +152,35 @@ async def cmd_get_code(message: Message, state: FSMContext):
             # Для остальных классов выдаем код доступного класса
             # available_class уже найден выше (может быть равен или старше класса ученика)
 
-            # Сначала пробуем найти предварительно распределенный код (Вариант 1)
-            olympiad_code = await crud.get_assigned_code_for_student(
-                session, student.id, active_session.id, available_class
+            # Атомарно захватываем код: сначала предварительно распределенный
+            # ученику (Вариант 1), иначе любой свободный (Вариант 2).
+            # Захват и запись запроса кода - одна транзакция.
+            code_request = await _claim_class_code(
+                session, active_session.id, available_class, student.id
             )
 
-            # Если нет распределенного - берем любой доступный (Вариант 2)
-            if not olympiad_code:
-                olympiad_code = await crud.get_available_code_for_class(
-                    session, active_session.id, available_class
+            # Коды класса могли разобрать между поиском и захватом:
+            # класс уже помечен исчерпанным, ищем следующий
+            attempts = 1
+            while not code_request and attempts < CODE_CLAIM_ATTEMPTS:
+                attempts += 1
+                available_class = await _find_nearest_class(
+                    session, active_session.id, student.id, student.class_number
+                )
+                if not available_class:
+                    break
+                code_request = await _claim_class_code(
+                    session, active_session.id, available_class, student.id
                 )
 
-            if not olympiad_code:
+            if not code_request:
                 await message.answer(
                     f"❌ Для тебя не найден код!\n\n"
                     f"Обратись к преподавателю."
                 )
                 return
 
-            code = olympiad_code.code
-
-            # Помечаем код как выданный
-            await crud.mark_code_issued(session, olympiad_code.id, student.id)
-
-            # Создаем запись о запросе кода
-            await crud.create_code_request(
-                session, student.id, active_session.id, available_class, code
-            )
+            code = code_request.code
 
             # Формируем сообщение в зависимости от того, свой класс или старший
             if available_class == student.class_number:
@@ -175,21 +228,13 @@ async def process_grade_selection(callback: CallbackQuery, state: FSMContext):
             await state.clear()
             return
         
-        # Получаем код в зависимости от выбранного класса
+        # Атомарно захватываем код в зависимости от выбранного класса
         if selected_grade == 8:
-            # Получаем код для 8 класса
-            # Сначала пробуем предварительно распределенный (Вариант 1)
-            olympiad_code = await crud.get_assigned_code_for_student(
-                session, student.id, session_id, 8
+            code_request = await _claim_class_code(
+                session, session_id, 8, student.id
             )
 
-            # Если нет - берем любой доступный (Вариант 2)
-            if not olympiad_code:
-                olympiad_code = await crud.get_available_code_for_class(
-                    session, session_id, 8
-                )
-
-            if not olympiad_code:
+            if not code_request:
                 await callback.message.answer(
                     "❌ Для тебя не найден код 8 класса!\n\n"
                     "Обратись к преподавателю."
@@ -198,19 +243,13 @@ async def process_grade_selection(callback: CallbackQuery, state: FSMContext):
                 await state.clear()
                 return
 
-            code = olympiad_code.code
-
-            # Помечаем код как выданный
-            await crud.mark_code_issued(session, olympiad_code.id, student.id)
-
         else:  # grade 9 - резервные коды из пула 9 класса
-            # Получаем резервный код для параллели ученика
             class_parallel = f"8{student.parallel or ''}"
-            reserve_code = await crud.get_available_reserve_code_for_grade8(
-                session, session_id, class_parallel
+            code_request = await _claim_reserve_code(
+                session, session_id, class_parallel, student.id
             )
 
-            if not reserve_code:
+            if not code_request:
                 await callback.message.answer(
                     "❌ К сожалению, все резервные коды для 9 класса уже заняты!\n\n"
                     "Ты можешь взять код для 8 класса."
@@ -218,16 +257,8 @@ async def process_grade_selection(callback: CallbackQuery, state: FSMContext):
                 await callback.answer()
                 return
 
-            code = reserve_code.code
+        code = code_request.code
 
-            # Помечаем резервный код как использованный
-            await crud.mark_reserve_code_used(session, reserve_code.id, student.id)
-        
-        # Создаем запись о запросе кода
-        code_request = await crud.create_code_request(
-            session, student.id, session_id, selected_grade, code
-        )
-        
         # Первое сообщение - информация
         await callback.message.answer(
             f"✅ Твой код для олимпиады по предмету {olympiad_session.subject}:\n\n"
@@ -261,6 +292,10 @@ async def cmd_my_status(message: Message):
                 "Используй /start для регистрации."
             )
             return
+
+        if not student.is_active:
+            await message.answer(INACTIVE_STUDENT_TEXT)
+            return
         
         # Получаем активную сессию
         active_session = await crud.get_active_session(session)
@@ -274,8 +309,8 @@ async def cmd_my_status(message: Message):
             return
         
         # Получаем запрос для текущей сессии
-        code_request = await crud.get_code_request_for_student_in_session(
-            session, student.id, active_session.id
+        code_request = await _get_existing_request(
+            session, active_session.id, student.id
         )
         
         if not code_request:
@@ -314,7 +349,7 @@ async def cmd_help(message: Message):
     async with AsyncSessionLocal() as session:
         student = await crud.get_student_by_telegram_id(session, telegram_id)
         
-        if not student or not student.is_registered:
+        if not student or not student.is_registered or not student.is_active:
             await message.answer(
                 "📖 Справка\n\n"
                 "/start - Начать регистрацию\n"
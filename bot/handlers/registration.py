@@ -68,6 +68,14 @@ async def process_registration_code(message: Message, state: FSMContext):
             )
             return
         
+        # Выбывших по сверке списка не регистрируем
+        if not student.is_active:
+            await message.answer(
+                "❌ Этот код больше не действует!\n\n"
+                "Ученика нет в актуальном списке. Обратись к преподавателю."
+            )
+            return
+
         # Проверяем, не зарегистрирован ли уже этот ученик
         if student.is_registered:
             await message.answer(
@@ -5,12 +5,15 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 from loguru import logger
 
-from database.database import init_db, close_db
+from database.database import init_db, close_db, AsyncSessionLocal
+from database import events
 from bot.handlers import registration, olympiad, screenshots, admin, auth
 from bot.handlers import admin_extended, admin_olympiads
 from bot.middlewares import LoggingMiddleware, ThrottlingMiddleware
 from tasks.reminders import setup_reminder_scheduler
-from utils.scheduler import send_pending_olympiad_notifications
+from utils.scheduler import setup_olympiad_notifications, restore_olympiad_notification_jobs, setup_counter_compaction
+from utils.code_pool import code_pool
+from utils.loop_monitor import start_loop_monitor
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -26,20 +29,6 @@ logger.add(
 )
 
 
-async def olympiad_notification_scheduler(bot: Bot):
-    """Планировщик для отложенных уведомлений об олимпиадах"""
-    logger.info("⏰ Запуск планировщика уведомлений об олимпиадах...")
-
-    while True:
-        try:
-            await send_pending_olympiad_notifications(bot)
-        except Exception as e:
-            logger.error(f"❌ Ошибка в планировщике уведомлений: {e}")
-
-        # Проверяем каждую минуту
-        await asyncio.sleep(60)
-
-
 async def main():
     """Главная функция запуска бота"""
     
@@ -48,6 +37,9 @@ async def main():
     if not bot_token:
         logger.error("❌ BOT_TOKEN не найден в .env файле!")
         return
+
+    # Детектор блокировок event loop (только при DEBUG_LOOP_BLOCKING_MS)
+    loop_monitor = start_loop_monitor()
     
     # Создаем бота и диспетчер
     bot = Bot(token=bot_token)
@@ -70,24 +62,42 @@ async def main():
     # Инициализируем базу данных
     logger.info("🔄 Инициализация базы данных...")
     await init_db()
-    
+
     # Настраиваем планировщик напоминаний
     logger.info("🔄 Настройка планировщика напоминаний...")
     scheduler = setup_reminder_scheduler(bot)
+
+    # Отложенные уведомления об олимпиадах: date-задачи по событиям из API
+    setup_olympiad_notifications(scheduler, bot)
+
+    # Свертка изменений счетчиков кодов
+    setup_counter_compaction(scheduler)
+
+    # Подписка на события БД (сброс кэшей при изменениях из API)
+    events.start_listener()
+
+    # Пул кодов в памяти: восстанавливаем журнал до приема запросов
+    if code_pool.enabled:
+        logger.info("🔄 Запуск пула кодов...")
+        await code_pool.start(AsyncSessionLocal)
+
     scheduler.start()
+    restored = await restore_olympiad_notification_jobs(scheduler, bot)
+    logger.info(f"⏰ Восстановлено отложенных уведомлений: {restored}")
     
-    # Запускаем бота и планировщик уведомлений параллельно
+    # Запускаем бота
     logger.info("🚀 Бот запущен и готов к работе!")
 
     try:
-        await asyncio.gather(
-            dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types()),
-            olympiad_notification_scheduler(bot)
-        )
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
         # Закрытие соединений при остановке
         logger.info("🔄 Остановка бота...")
         scheduler.shutdown()
+        await code_pool.stop()
+        await events.stop_listener()
+        if loop_monitor:
+            await loop_monitor.stop()
         await close_db()
         await bot.session.close()
         logger.info("✅ Бот остановлен")
@@ -0,0 +1,304 @@
+"""
+Внутрипроцессные кэши для горячих путей бота
+
+Кэши живут в памяти одного процесса и не заменяют БД: любое значение
+может устареть, поэтому вызывающий код всегда готов перепроверить его
+запросом (например, когда захват кода не удался).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from database import events
+
+# Диапазон классов, для которых существуют коды олимпиад
+MIN_CLASS = 5
+MAX_CLASS = 11
+
+# Маркер "в кэше нет ответа, нужен запрос к БД"
+UNKNOWN = object()
+
+
+def _snapshot(obj) -> dict:
+    """Значения колонок ORM-объекта (без связей и состояния сессии)"""
+    return {
+        attr.key: getattr(obj, attr.key)
+        for attr in inspect(type(obj)).column_attrs
+    }
+
+
+async def _attach(session, model, values: dict):
+    """Привязывает снимок к сессии БД как загруженный объект, без SELECT"""
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return await session.merge(obj, load=False)
+
+
+def _class_bit(class_number: int) -> int:
+    return 1 << class_number
+
+
+def _range_mask(start_class: int, end_class: int = MAX_CLASS) -> int:
+    """Битовая маска классов start_class..end_class включительно"""
+    mask = 0
+    for class_number in range(max(start_class, MIN_CLASS), end_class + 1):
+        mask |= _class_bit(class_number)
+    return mask
+
+
+class CodeAvailabilityCache:
+    """
+    Битовые карты доступности кодов по классам для каждой сессии олимпиады
+
+    Для сессии хранятся две маски:
+    - available: классы, в которых по последним данным есть свободные коды
+    - exhausted: классы, в которых свободных кодов точно не осталось
+
+    Бит "available" может устареть (коды разобрал другой процесс) - тогда
+    захват кода не удастся, класс помечается исчерпанным и поиск повторяется.
+    Бит "exhausted" устаревает только при загрузке новых кодов, поэтому
+    загрузка сбрасывает кэш сессии. TTL ограничивает расхождение между
+    процессами (бот и API работают в разных контейнерах).
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+        # session_id -> (available, exhausted, момент создания записи)
+        self._sessions: Dict[int, Tuple[int, int, float]] = {}
+
+    def _get(self, session_id: int) -> Tuple[int, int]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return 0, 0
+
+        available, exhausted, created_at = entry
+        if time.monotonic() - created_at > self.ttl_seconds:
+            del self._sessions[session_id]
+            return 0, 0
+
+        return available, exhausted
+
+    def _set(self, session_id: int, available: int, exhausted: int):
+        entry = self._sessions.get(session_id)
+        created_at = entry[2] if entry else time.monotonic()
+        self._sessions[session_id] = (available, exhausted, created_at)
+
+    def find_nearest(self, session_id: int, start_class: int):
+        """
+        Ищет ближайший класс с кодами, не обращаясь к БД
+
+        Returns:
+            Номер класса, None (во всех классах от start_class кодов нет)
+            или UNKNOWN, если кэш не может ответить
+        """
+        available, exhausted = self._get(session_id)
+
+        for class_number in range(max(start_class, MIN_CLASS), MAX_CLASS + 1):
+            bit = _class_bit(class_number)
+            if available & bit:
+                return class_number
+            if not exhausted & bit:
+                return UNKNOWN
+
+        return None
+
+    def record_lookup(self, session_id: int, start_class: int, found_class: Optional[int]):
+        """Запоминает результат поиска в БД: классы до найденного исчерпаны"""
+        available, exhausted = self._get(session_id)
+
+        if found_class is None:
+            exhausted |= _range_mask(start_class)
+        else:
+            exhausted |= _range_mask(start_class, found_class - 1)
+            exhausted &= ~_class_bit(found_class)
+            available |= _class_bit(found_class)
+
+        self._set(session_id, available, exhausted)
+
+    def mark_exhausted(self, session_id: int, class_number: int):
+        """Помечает класс исчерпанным (захват кода не нашел свободной строки)"""
+        available, exhausted = self._get(session_id)
+        bit = _class_bit(class_number)
+        self._set(session_id, available & ~bit, exhausted | bit)
+
+    def invalidate(self, session_id: Optional[int] = None):
+        """Сбрасывает кэш сессии (или всех сессий) после загрузки/перераспределения кодов"""
+        if session_id is None:
+            self._sessions.clear()
+        else:
+            self._sessions.pop(session_id, None)
+
+
+class ActiveSessionCache:
+    """
+    Кэш активной сессии олимпиады
+
+    Активная сессия меняется пару раз в день, а запрашивается на каждый
+    /get_code, /my_status, скриншот и тик напоминаний. Хранится снимок
+    колонок (не ORM-объект чужой сессии БД); отсутствие активной сессии
+    тоже кэшируется. Сброс - по событию TOPIC_ACTIVE_SESSION из любого
+    процесса, TTL - страховка на случай потерянного события.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._values: Optional[dict] = None
+        self._model = None
+        self._loaded_at: Optional[float] = None
+
+    def get(self):
+        """Снимок колонок активной сессии, None (активной нет) или UNKNOWN"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            return UNKNOWN
+        return self._values
+
+    def set(self, obj, version: int):
+        """Запоминает результат запроса, если кэш не сбросили во время запроса"""
+        if version != self.version:
+            return
+
+        if obj is None:
+            self._values = None
+        else:
+            self._model = type(obj)
+            self._values = _snapshot(obj)
+        self._loaded_at = time.monotonic()
+
+    async def attach(self, session, values: dict):
+        """Привязывает снимок к сессии БД без SELECT"""
+        return await _attach(session, self._model, values)
+
+    def invalidate(self, payload: str = ""):
+        self.version += 1
+        self._values = None
+        self._loaded_at = None
+
+
+class StudentCache:
+    """
+    LRU-кэш учеников по telegram_id с TTL
+
+    Каждое обновление бота ищет ученика по telegram_id (middleware и
+    обработчики), поэтому кэш общий для всего процесса. Неизвестные
+    пользователи тоже кэшируются (negative caching), но на меньший срок.
+    Сброс - по событию TOPIC_STUDENTS_CHANGED (payload: telegram_id
+    или пусто для сброса всего кэша).
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl_seconds: float = 300.0, negative_ttl_seconds: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.version = 0
+        self._model = None
+        # telegram_id -> (снимок колонок или None, момент устаревания)
+        self._entries: "OrderedDict[str, Tuple[Optional[dict], float]]" = OrderedDict()
+
+    def get(self, telegram_id: str):
+        """Снимок ученика, None (ученика нет) или UNKNOWN"""
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return UNKNOWN
+
+        values, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._entries[telegram_id]
+            return UNKNOWN
+
+        self._entries.move_to_end(telegram_id)
+        return values
+
+    def set(self, telegram_id: str, obj, version: int):
+        """Запоминает результат запроса, если кэш не сбросили во время запроса"""
+        if version != self.version:
+            return
+
+        if obj is None:
+            values = None
+            expires_at = time.monotonic() + self.negative_ttl_seconds
+        else:
+            self._model = type(obj)
+            values = _snapshot(obj)
+            expires_at = time.monotonic() + self.ttl_seconds
+
+        self._entries[telegram_id] = (values, expires_at)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def attach(self, session, values: dict):
+        """Привязывает снимок к сессии БД без SELECT"""
+        return await _attach(session, self._model, values)
+
+    def invalidate(self, telegram_id: str = ""):
+        self.version += 1
+        if telegram_id:
+            self._entries.pop(telegram_id, None)
+        else:
+            self._entries.clear()
+
+
+class SnapshotCache:
+    """
+    Снимок результата тяжелого запроса с коротким TTL
+
+    Панель администратора опрашивает статистику по таймеру из каждой
+    открытой вкладки. Пока снимок свежий, он отдается без запроса к БД;
+    когда устарел - запрос выполняет только первый вызов, остальные
+    одновременные вызовы ждут его результата (singleflight) под общей
+    блокировкой. Сброс - по событиям, меняющим статистику.
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl_seconds
+
+    async def get(self, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Свежий снимок или результат loader() (один на всех ожидающих)"""
+        if self._fresh():
+            return self._value
+
+        async with self._lock:
+            if self._fresh():
+                return self._value
+
+            version = self.version
+            value = await loader()
+            if version == self.version:
+                self._value = value
+                self._loaded_at = time.monotonic()
+            return value
+
+    def invalidate(self, payload: str = ""):
+        self.version += 1
+        self._value = None
+        self._loaded_at = None
+
+
+code_availability = CodeAvailabilityCache()
+active_session_cache = ActiveSessionCache()
+student_cache = StudentCache()
+dashboard_snapshot = SnapshotCache()
+
+
+def _on_codes_changed(payload: str):
+    code_availability.invalidate(int(payload) if payload else None)
+
+
+events.subscribe(events.TOPIC_ACTIVE_SESSION, active_session_cache.invalidate)
+events.subscribe(events.TOPIC_CODES_CHANGED, _on_codes_changed)
+events.subscribe(events.TOPIC_STUDENTS_CHANGED, student_cache.invalidate)
+events.subscribe(events.TOPIC_ACTIVE_SESSION, dashboard_snapshot.invalidate)
+events.subscribe(events.TOPIC_CODES_CHANGED, dashboard_snapshot.invalidate)
+events.subscribe(events.TOPIC_STUDENTS_CHANGED, dashboard_snapshot.invalidate)
@@ -0,0 +1,306 @@
+"""
+Счетчики кодов сессии по классам (таблица session_class_counters)
+
+Статистика кодов читается из счетчиков вместо COUNT по olympiad_codes
+и grade8_reserve_codes. Счетчики поддерживают триггеры PostgreSQL
+уровня оператора (с таблицами переходов): любая запись в таблицы кодов -
+загрузка, распределение, выдача, резерв, удаление, скрипты и каскадное
+удаление сессии - в той же транзакции добавляет изменения счетчиков,
+одну строку на (сессия, класс) на оператор.
+
+Триггеры только ДОБАВЛЯЮТ строки в session_class_counter_deltas и не
+обновляют общую строку счетчика: иначе одновременные выдачи кодов одного
+класса ждали бы друг друга на ее блокировке до коммита. Текущее значение -
+сумма строки счетчика и ее изменений; периодическая свертка (бот, раз в
+COUNTER_COMPACT_SECONDS) переносит изменения в session_class_counters.
+
+Триггеры ставятся при создании таблицы (init_db) и миграцией. На других
+СУБД (SQLite в тестах) триггеров нет - чтение счетчиков там считает коды
+группирующим запросом по таблицам кодов (counters_select).
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import String, case, delete, event, func, insert, literal, or_, select, text, union_all
+
+from database.models import Base, Grade8ReserveCode, OlympiadCode, SessionClassCounter, SessionClassCounterDelta
+
+COUNTER_COLUMNS = ["session_id", "class_number", "parallel", "total", "assigned", "issued", "reserve_total", "reserve_used"]
+
+# Изменения с нулевой суммой (например, смена issued_at) не записываются
+_NONZERO = "WHERE d_total <> 0 OR d_assigned <> 0 OR d_issued <> 0 OR d_reserve_total <> 0 OR d_reserve_used <> 0"
+
+_INSERT_DELTAS = """
+        INSERT INTO session_class_counter_deltas
+            (session_id, class_number, parallel, total, assigned, issued, reserve_total, reserve_used)
+        SELECT session_id, class_number, parallel, d_total, d_assigned, d_issued, d_reserve_total, d_reserve_used
+        FROM ("""
+
+_CODES_FUNCTION = """
+CREATE OR REPLACE FUNCTION session_class_counters_codes() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN{insert}
+            SELECT session_id, class_number, ''::varchar AS parallel, count(*)::int AS d_total,
+                   count(*) FILTER (WHERE is_assigned)::int AS d_assigned,
+                   count(*) FILTER (WHERE is_issued)::int AS d_issued,
+                   0 AS d_reserve_total, 0 AS d_reserve_used
+            FROM new_rows
+            GROUP BY session_id, class_number
+        ) d;
+    ELSIF TG_OP = 'DELETE' THEN{insert}
+            SELECT session_id, class_number, ''::varchar AS parallel, -count(*)::int AS d_total,
+                   -count(*) FILTER (WHERE is_assigned)::int AS d_assigned,
+                   -count(*) FILTER (WHERE is_issued)::int AS d_issued,
+                   0 AS d_reserve_total, 0 AS d_reserve_used
+            FROM old_rows
+            GROUP BY session_id, class_number
+        ) d;
+    ELSE{insert}
+            WITH changed AS (
+                SELECT o.session_id AS old_session_id, o.class_number AS old_class_number,
+                       (o.is_assigned IS TRUE)::int AS old_assigned, (o.is_issued IS TRUE)::int AS old_issued,
+                       n.session_id, n.class_number,
+                       (n.is_assigned IS TRUE)::int AS assigned, (n.is_issued IS TRUE)::int AS issued
+                FROM new_rows n
+                JOIN old_rows o ON o.id = n.id
+                WHERE (n.session_id, n.class_number, n.is_assigned IS TRUE, n.is_issued IS TRUE)
+                      IS DISTINCT FROM (o.session_id, o.class_number, o.is_assigned IS TRUE, o.is_issued IS TRUE)
+            ), delta AS (
+                SELECT session_id, class_number, 1 AS total, assigned, issued FROM changed
+                UNION ALL
+                SELECT old_session_id, old_class_number, -1, -old_assigned, -old_issued FROM changed
+            )
+            SELECT session_id, class_number, ''::varchar AS parallel, sum(total)::int AS d_total,
+                   sum(assigned)::int AS d_assigned, sum(issued)::int AS d_issued,
+                   0 AS d_reserve_total, 0 AS d_reserve_used
+            FROM delta
+            GROUP BY session_id, class_number
+        ) d
+        {nonzero};
+    END IF;
+    RETURN NULL;
+END $$
+""".format(insert=_INSERT_DELTAS, nonzero=_NONZERO)
+
+# "8А" -> (8, "А")
+_RESERVE_PARALLEL = "CASE WHEN left({0}.class_parallel, 1) = '8' THEN substr({0}.class_parallel, 2) ELSE {0}.class_parallel END"
+
+_RESERVE_FUNCTION = """
+CREATE OR REPLACE FUNCTION session_class_counters_reserve() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN{insert}
+            SELECT session_id, 8 AS class_number, {rows} AS parallel, 0 AS d_total, 0 AS d_assigned, 0 AS d_issued,
+                   count(*)::int AS d_reserve_total, count(*) FILTER (WHERE is_used)::int AS d_reserve_used
+            FROM new_rows r
+            GROUP BY 1, 3
+        ) d;
+    ELSIF TG_OP = 'DELETE' THEN{insert}
+            SELECT session_id, 8 AS class_number, {rows} AS parallel, 0 AS d_total, 0 AS d_assigned, 0 AS d_issued,
+                   -count(*)::int AS d_reserve_total, -count(*) FILTER (WHERE is_used)::int AS d_reserve_used
+            FROM old_rows r
+            GROUP BY 1, 3
+        ) d;
+    ELSE{insert}
+            WITH changed AS (
+                SELECT o.session_id AS old_session_id, {old_o} AS old_parallel, (o.is_used IS TRUE)::int AS old_used,
+                       n.session_id, {new_n} AS parallel, (n.is_used IS TRUE)::int AS used
+                FROM new_rows n
+                JOIN old_rows o ON o.id = n.id
+                WHERE (n.session_id, n.class_parallel, n.is_used IS TRUE)
+                      IS DISTINCT FROM (o.session_id, o.class_parallel, o.is_used IS TRUE)
+            ), delta AS (
+                SELECT session_id, parallel, 1 AS total, used FROM changed
+                UNION ALL
+                SELECT old_session_id, old_parallel, -1, -old_used FROM changed
+            )
+            SELECT session_id, 8 AS class_number, parallel, 0 AS d_total, 0 AS d_assigned, 0 AS d_issued,
+                   sum(total)::int AS d_reserve_total, sum(used)::int AS d_reserve_used
+            FROM delta
+            GROUP BY session_id, parallel
+        ) d
+        {nonzero};
+    END IF;
+    RETURN NULL;
+END $$
+""".format(
+    insert=_INSERT_DELTAS,
+    nonzero=_NONZERO,
+    rows=_RESERVE_PARALLEL.format("r"),
+    old_o=_RESERVE_PARALLEL.format("o"),
+    new_n=_RESERVE_PARALLEL.format("n")
+)
+
+# Свертка: изменения удаляются и прибавляются к счетчикам одним оператором.
+# Изменения незавершенных транзакций не видны и остаются до следующей свертки;
+# строки выдачи кодов свертка не блокирует.
+_COMPACT = """
+WITH moved AS (
+    DELETE FROM session_class_counter_deltas
+    RETURNING session_id, class_number, parallel, total, assigned, issued, reserve_total, reserve_used
+)
+INSERT INTO session_class_counters AS c
+    (session_id, class_number, parallel, total, assigned, issued, reserve_total, reserve_used)
+SELECT session_id, class_number, parallel, sum(total), sum(assigned), sum(issued), sum(reserve_total), sum(reserve_used)
+FROM moved
+GROUP BY session_id, class_number, parallel
+ORDER BY session_id, class_number, parallel
+ON CONFLICT (session_id, class_number, parallel) DO UPDATE SET
+    total = c.total + EXCLUDED.total,
+    assigned = c.assigned + EXCLUDED.assigned,
+    issued = c.issued + EXCLUDED.issued,
+    reserve_total = c.reserve_total + EXCLUDED.reserve_total,
+    reserve_used = c.reserve_used + EXCLUDED.reserve_used
+"""
+
+# Ключи, коды которых удалены полностью
+_DROP_EMPTY = "DELETE FROM session_class_counters WHERE total <= 0 AND reserve_total <= 0"
+
+
+def _triggers(table: str, function: str) -> List[str]:
+    statements = []
+    for operation, referencing in (
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("DELETE", "OLD TABLE AS old_rows"),
+    ):
+        name = f"{function}_{operation.lower()}"
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {name} AFTER {operation} ON {table} "
+            f"REFERENCING {referencing} FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+        )
+    return statements
+
+
+# DDL триггеров PostgreSQL (идемпотентно)
+COUNTER_TRIGGERS_SQL: List[str] = [
+    "DROP FUNCTION IF EXISTS session_class_counters_add(integer, integer, varchar, integer, integer, integer, integer, integer)",
+    _CODES_FUNCTION,
+    _RESERVE_FUNCTION,
+    *_triggers("olympiad_codes", "session_class_counters_codes"),
+    *_triggers("grade8_reserve_codes", "session_class_counters_reserve"),
+]
+
+# Свертка изменений в счетчики (PostgreSQL)
+COMPACT_SQL: List[str] = [_COMPACT, _DROP_EMPTY]
+
+
+def _summed(*sources):
+    """Сумма счетчиков из нескольких источников по ключу (сессия, класс, параллель)"""
+    rows = union_all(*sources).subquery()
+    return select(
+        rows.c.session_id, rows.c.class_number, rows.c.parallel,
+        *[func.sum(rows.c[name]).label(name) for name in COUNTER_COLUMNS[3:]]
+    ).group_by(rows.c.session_id, rows.c.class_number, rows.c.parallel)
+
+
+def recount_select(session_id: Optional[int] = None):
+    """Счетчики, посчитанные группирующим запросом по таблицам кодов"""
+    codes = select(
+        OlympiadCode.session_id,
+        OlympiadCode.class_number,
+        literal("", String).label("parallel"),
+        func.count().label("total"),
+        func.count().filter(OlympiadCode.is_assigned == True).label("assigned"),
+        func.count().filter(OlympiadCode.is_issued == True).label("issued"),
+        literal(0).label("reserve_total"),
+        literal(0).label("reserve_used")
+    ).group_by(OlympiadCode.session_id, OlympiadCode.class_number)
+
+    class_parallel = Grade8ReserveCode.class_parallel
+    parallel = case(
+        (func.substr(class_parallel, 1, 1) == "8", func.substr(class_parallel, 2)),
+        else_=class_parallel
+    )
+    reserve = select(
+        Grade8ReserveCode.session_id,
+        literal(8).label("class_number"),
+        parallel.label("parallel"),
+        literal(0).label("total"),
+        literal(0).label("assigned"),
+        literal(0).label("issued"),
+        func.count().label("reserve_total"),
+        func.count().filter(Grade8ReserveCode.is_used == True).label("reserve_used")
+    ).group_by(Grade8ReserveCode.session_id, parallel)
+
+    if session_id is not None:
+        codes = codes.where(OlympiadCode.session_id == session_id)
+        reserve = reserve.where(Grade8ReserveCode.session_id == session_id)
+
+    # Строки кодов и резерва с одним ключом (резерв "8" без параллели) складываются
+    return _summed(codes, reserve)
+
+
+def counters_select(dialect_name: str, session_id: Optional[int] = None):
+    """
+    Текущие счетчики кодов, упорядоченные по ключу
+
+    PostgreSQL: строки счетчиков плюс несвернутые изменения (без записи,
+    свертка не нужна для точности). Без триггеров (SQLite) - пересчет
+    группирующим запросом по таблицам кодов.
+    """
+    if dialect_name != "postgresql":
+        query = recount_select(session_id)
+    else:
+        sources = [
+            select(*[getattr(model, name) for name in COUNTER_COLUMNS])
+            for model in (SessionClassCounter, SessionClassCounterDelta)
+        ]
+        if session_id is not None:
+            sources = [
+                source.where(model.session_id == session_id)
+                for source, model in zip(sources, (SessionClassCounter, SessionClassCounterDelta))
+            ]
+        query = _summed(*sources)
+
+    columns = query.selected_columns
+    return (
+        query
+        .having(or_(columns.total > 0, columns.reserve_total > 0))
+        .order_by(columns.session_id, columns.class_number, columns.parallel)
+    )
+
+
+def rebuild_statements(dialect_name: str, session_id: Optional[int] = None) -> list:
+    """
+    Пересчет счетчиков с нуля по таблицам кодов (выполнять в одной транзакции)
+
+    На PostgreSQL сначала блокируется таблица изменений (EXCLUSIVE):
+    выдачи, начатые до блокировки, успевают закоммитить свои изменения
+    и попадают в пересчет, а новые ждут коммита пересчета и добавляют
+    изменения уже поверх него. Без блокировки выдача, закоммиченная между
+    удалением изменений и пересчетом, учитывалась бы дважды.
+
+    Returns:
+        [LOCK TABLE (PostgreSQL), DELETE изменений, DELETE счетчиков,
+        INSERT ... SELECT] для всех сессий или одной
+    """
+    clear_deltas = delete(SessionClassCounterDelta)
+    clear = delete(SessionClassCounter)
+    if session_id is not None:
+        clear_deltas = clear_deltas.where(SessionClassCounterDelta.session_id == session_id)
+        clear = clear.where(SessionClassCounter.session_id == session_id)
+
+    fill = insert(SessionClassCounter).from_select(COUNTER_COLUMNS, recount_select(session_id))
+    statements = [clear_deltas, clear, fill]
+    if dialect_name == "postgresql":
+        statements.insert(0, text("LOCK TABLE session_class_counter_deltas IN EXCLUSIVE MODE"))
+    return statements
+
+
+def install_counter_triggers(connection):
+    """Создает функции и триггеры счетчиков (синхронное соединение PostgreSQL)"""
+    for statement in COUNTER_TRIGGERS_SQL:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_on_create(target, connection, tables=(), **kw):
+    """init_db: при создании таблиц счетчиков ставит триггеры и заполняет счетчики"""
+    created = {SessionClassCounter.__table__, SessionClassCounterDelta.__table__} & set(tables)
+    if connection.dialect.name != "postgresql" or not created:
+        return
+
+    install_counter_triggers(connection)
+    for statement in rebuild_statements(connection.dialect.name):
+        connection.execute(statement)
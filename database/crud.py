@@ -1,12 +1,21 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, case
+from sqlalchemy import select, insert, update, and_, or_, func, case, true, tuple_, text, literal_column
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 from database.models import (
     Student, OlympiadSession, Grade8Code, Grade9Code,
-    CodeRequest, Reminder, OlympiadCode, Grade8ReserveCode, moscow_now
+    CodeRequest, Reminder, OlympiadCode, Grade8ReserveCode, SessionClassCounter, NO_CLASS_ORDER, moscow_now
 )
-from typing import Optional, List
+from database.counters import COMPACT_SQL, counters_select, rebuild_statements
+from database.cache import code_availability, active_session_cache, student_cache, UNKNOWN
+from database import events
+from typing import Optional, List, Tuple
 from datetime import datetime
+import base64
+import json
+
+# Сколько раз повторять попытку захвата кода в режиме без RETURNING (SQLite)
+CLAIM_RETRY_ATTEMPTS = 5
 
 
 # ==================== STUDENTS ====================
@@ -31,11 +40,20 @@ async def get_student_by_telegram_id(
     session: AsyncSession,
     telegram_id: str
 ) -> Optional[Student]:
-    """Получает ученика по Telegram ID"""
+    """Получает ученика по Telegram ID (через кэш процесса)"""
+    cached = student_cache.get(telegram_id)
+    if cached is None:
+        return None
+    if cached is not UNKNOWN:
+        return await student_cache.attach(session, cached)
+
+    version = student_cache.version
     result = await session.execute(
         select(Student).where(Student.telegram_id == telegram_id)
     )
-    return result.scalar_one_or_none()
+    student = result.scalar_one_or_none()
+    student_cache.set(telegram_id, student, version)
+    return student
 
 
 async def get_student_by_registration_code(
@@ -66,6 +84,7 @@ async def register_student(
         student.registered_at = moscow_now()
         await session.commit()
         await session.refresh(student)
+        await events.publish(session, events.TOPIC_STUDENTS_CHANGED, telegram_id)
     
     return student
 
@@ -77,17 +96,17 @@ async def get_all_students(session: AsyncSession) -> List[Student]:
 
 
 async def get_registered_students(session: AsyncSession) -> List[Student]:
-    """Получает только зарегистрированных учеников"""
+    """Получает только зарегистрированных учеников (без выбывших)"""
     result = await session.execute(
-        select(Student).where(Student.is_registered == True)
+        select(Student).where(Student.is_registered == True, Student.is_active == True)
     )
     return result.scalars().all()
 
 
 async def get_unregistered_students(session: AsyncSession) -> List[Student]:
-    """Получает только незарегистрированных учеников"""
+    """Получает только незарегистрированных учеников (без выбывших)"""
     result = await session.execute(
-        select(Student).where(Student.is_registered == False)
+        select(Student).where(Student.is_registered == False, Student.is_active == True)
     )
     return result.scalars().all()
 
@@ -120,20 +139,135 @@ async def delete_student_by_id(
         delete(Student).where(Student.id == student_id)
     )
     await session.commit()
+    await events.publish(session, events.TOPIC_STUDENTS_CHANGED)
     return result.rowcount > 0
 
 
 async def get_students_by_class(
     session: AsyncSession,
-    class_number: int
+    class_number: int,
+    active: Optional[bool] = None
 ) -> List[Student]:
-    """Получает всех учеников определенного класса"""
-    result = await session.execute(
-        select(Student).where(Student.class_number == class_number)
-    )
+    """
+    Получает учеников определенного класса
+
+    Args:
+        active: True - только действующие, False - только выбывшие, None - все
+    """
+    query = select(Student).where(Student.class_number == class_number)
+    if active is not None:
+        query = query.where(Student.is_active == active)
+    result = await session.execute(query)
     return result.scalars().all()
 
 
+# Порядок списков учеников и ключ курсора: класс, параллель, ФИО, id
+# (NULL заменяются, чтобы сравнение кортежей работало и для учеников без класса;
+# ученики без класса - в конце). Совпадает с индексом ix_students_list_order
+_STUDENT_LIST_KEY = (
+    func.coalesce(Student.class_number, literal_column(str(NO_CLASS_ORDER))),
+    func.coalesce(Student.parallel, literal_column("''")),
+    Student.full_name,
+    Student.id
+)
+
+
+def encode_student_cursor(row) -> str:
+    """Курсор "после этой строки" (строка должна содержать колонки ключа)"""
+    class_number = row["class_number"] if row["class_number"] is not None else NO_CLASS_ORDER
+    key = [class_number, row["parallel"] or "", row["full_name"], row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode()).decode()
+
+
+def decode_student_cursor(cursor: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        class_number, parallel, full_name, student_id = key
+        return [int(class_number), str(parallel), str(full_name), int(student_id)]
+    except (ValueError, TypeError):
+        raise ValueError("Некорректный курсор")
+
+
+def _student_list_query(
+    columns,
+    registered: Optional[bool] = None,
+    class_number: Optional[int] = None,
+    parallel: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    active: Optional[bool] = True
+):
+    """Запрос страницы списка учеников (параметры - как у list_students)"""
+    key_columns = [Student.id, Student.full_name, Student.class_number, Student.parallel]
+    key_names = {c.key for c in key_columns}
+    query = select(*key_columns, *[c for c in columns if c.key not in key_names])
+
+    if active is not None:
+        query = query.where(Student.is_active == active)
+    if registered is not None:
+        query = query.where(Student.is_registered == registered)
+    if class_number is not None:
+        query = query.where(Student.class_number == class_number)
+    if parallel:
+        query = query.where(Student.parallel == parallel)
+    if name_prefix:
+        query = query.where(Student.full_name.istartswith(name_prefix, autoescape=True))
+    if after:
+        query = query.where(tuple_(*_STUDENT_LIST_KEY) > tuple_(*decode_student_cursor(after)))
+
+    query = query.order_by(*_STUDENT_LIST_KEY)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+
+async def list_students(
+    session: AsyncSession,
+    columns,
+    registered: Optional[bool] = None,
+    class_number: Optional[int] = None,
+    parallel: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    active: Optional[bool] = True
+) -> Tuple[list, Optional[str]]:
+    """
+    Страница списка учеников (только нужные колонки, без ORM-объектов)
+
+    Постраничный вывод по ключу (класс, параллель, ФИО, id): следующая
+    страница начинается строго после курсора, без OFFSET.
+
+    Args:
+        columns: Колонки Student для ответа (колонки ключа добавляются всегда)
+        registered, class_number, parallel: Фильтры (None - без фильтра)
+        name_prefix: Начало ФИО (без учета регистра)
+        after: Курсор из предыдущей страницы
+        limit: Размер страницы (None - все строки)
+        active: True - только действующие ученики, False - только выбывшие
+            (деактивированные сверкой списка), None - все
+
+    Returns:
+        (строки-словари, курсор следующей страницы или None)
+
+    Raises:
+        ValueError: Некорректный курсор
+    """
+    query = _student_list_query(
+        columns, registered, class_number, parallel, name_prefix, after, limit, active
+    )
+    result = await session.execute(query)
+    rows = result.mappings().all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_student_cursor(rows[-1])
+
+    return rows, next_cursor
+
+
 async def delete_students_by_class(
     session: AsyncSession,
     class_number: int
@@ -188,6 +322,7 @@ async def delete_students_by_class(
         delete(Student).where(Student.class_number == class_number)
     )
     await session.commit()
+    await events.publish(session, events.TOPIC_STUDENTS_CHANGED)
     return result.rowcount
 
 
@@ -197,6 +332,7 @@ async def clear_all_students(session: AsyncSession) -> int:
 
     result = await session.execute(delete(Student))
     await session.commit()
+    await events.publish(session, events.TOPIC_STUDENTS_CHANGED)
     return result.rowcount
 
 
@@ -211,60 +347,6 @@ async def get_all_classes(session: AsyncSession) -> List[int]:
     return result.scalars().all()
 
 
-async def get_classes_statistics(session: AsyncSession) -> dict:
-    """
-    Получает статистику по всем классам за один запрос
-
-    Returns:
-        dict: {class_number: {"total": int, "registered": int}}
-    """
-    # Получаем статистику одним запросом с использованием GROUP BY
-    result = await session.execute(
-        select(
-            Student.class_number,
-            func.count(Student.id).label('total'),
-            func.sum(case((Student.is_registered == True, 1), else_=0)).label('registered')
-        )
-        .where(Student.class_number.isnot(None))
-        .group_by(Student.class_number)
-        .order_by(Student.class_number)
-    )
-
-    stats = {}
-    for row in result:
-        stats[row.class_number] = {
-            "total": row.total,
-            "registered": row.registered or 0
-        }
-
-    return stats
-
-
-async def get_students_count_stats(session: AsyncSession) -> dict:
-    """
-    Получает общую статистику по ученикам за один запрос
-
-    Returns:
-        dict: {"total": int, "registered": int, "unregistered": int}
-    """
-    result = await session.execute(
-        select(
-            func.count(Student.id).label('total'),
-            func.sum(case((Student.is_registered == True, 1), else_=0)).label('registered')
-        )
-    )
-    row = result.first()
-
-    total = row.total or 0
-    registered = row.registered or 0
-
-    return {
-        "total": total,
-        "registered": registered,
-        "unregistered": total - registered
-    }
-
-
 # ==================== OLYMPIAD SESSIONS ====================
 
 async def create_olympiad_session(
@@ -286,13 +368,22 @@ async def create_olympiad_session(
 
 
 async def get_active_session(session: AsyncSession) -> Optional[OlympiadSession]:
-    """Получает активную сессию олимпиады"""
+    """Получает активную сессию олимпиады (через кэш процесса)"""
+    cached = active_session_cache.get()
+    if cached is None:
+        return None
+    if cached is not UNKNOWN:
+        return await active_session_cache.attach(session, cached)
+
+    version = active_session_cache.version
     result = await session.execute(
         select(OlympiadSession)
         .where(OlympiadSession.is_active == True)
         .order_by(OlympiadSession.date.desc())
     )
-    return result.scalar_one_or_none()
+    olympiad_session = result.scalar_one_or_none()
+    active_session_cache.set(olympiad_session, version)
+    return olympiad_session
 
 
 async def deactivate_all_sessions(session: AsyncSession):
@@ -304,6 +395,7 @@ async def deactivate_all_sessions(session: AsyncSession):
         sess.is_active = False
     
     await session.commit()
+    await events.publish(session, events.TOPIC_ACTIVE_SESSION)
 
 
 async def get_session_by_id(
@@ -336,6 +428,7 @@ async def delete_session_by_id(
         delete(OlympiadSession).where(OlympiadSession.id == session_id)
     )
     await session.commit()
+    await events.publish(session, events.TOPIC_ACTIVE_SESSION)
     return result.rowcount > 0
 
 
@@ -361,6 +454,7 @@ async def delete_all_sessions(session: AsyncSession) -> int:
     # (OlympiadCode и Grade8ReserveCode удалятся автоматически через CASCADE)
     result = await session.execute(delete(OlympiadSession))
     await session.commit()
+    await events.publish(session, events.TOPIC_ACTIVE_SESSION)
     return result.rowcount
 
 
@@ -382,6 +476,7 @@ async def activate_session(
         olympiad_session.is_active = True
         await session.commit()
         await session.refresh(olympiad_session)
+        await events.publish(session, events.TOPIC_ACTIVE_SESSION)
 
     return olympiad_session
 
@@ -565,6 +660,7 @@ async def mark_screenshot_submitted(
         request.screenshot_path = screenshot_path
         request.screenshot_submitted_at = moscow_now()
         await session.commit()
+        events.publish_coalesced(session, events.TOPIC_ACTIVITY, request.session_id)
 
 
 async def get_requests_without_screenshot(
@@ -585,6 +681,45 @@ async def get_requests_without_screenshot(
     return result.scalars().all()
 
 
+async def get_reminder_candidates(
+    session: AsyncSession,
+    session_id: int,
+    reminded_since: datetime,
+    after_request_id: int = 0,
+    limit: int = 500
+) -> List:
+    """
+    Порция получателей напоминаний о скриншоте (keyset-пагинация по ID запроса)
+
+    Возвращает строки (request_id, student_id, telegram_id) запросов без
+    скриншота, по которым не было напоминаний начиная с reminded_since.
+    Следующая порция запрашивается с after_request_id = последний request_id.
+    """
+    already_reminded = (
+        select(Reminder.id)
+        .where(
+            Reminder.request_id == CodeRequest.id,
+            Reminder.sent_at >= reminded_since
+        )
+        .exists()
+    )
+    result = await session.execute(
+        select(CodeRequest.id, Student.id, Student.telegram_id)
+        .join(Student, Student.id == CodeRequest.student_id)
+        .where(
+            CodeRequest.session_id == session_id,
+            CodeRequest.screenshot_submitted == False,
+            CodeRequest.id > after_request_id,
+            Student.telegram_id.isnot(None),
+            Student.is_active == True,
+            ~already_reminded
+        )
+        .order_by(CodeRequest.id)
+        .limit(limit)
+    )
+    return result.all()
+
+
 async def get_all_requests_for_session(
     session: AsyncSession,
     session_id: int
@@ -616,6 +751,26 @@ async def create_reminder(
     return reminder
 
 
+async def create_reminders_bulk(
+    session: AsyncSession,
+    request_ids: List[int],
+    reminder_type: str = "screenshot"
+) -> int:
+    """Создает записи о напоминаниях одним многострочным INSERT"""
+    if not request_ids:
+        return 0
+
+    sent_at = moscow_now()
+    await session.execute(
+        insert(Reminder).values([
+            {"request_id": request_id, "reminder_type": reminder_type, "sent_at": sent_at}
+            for request_id in request_ids
+        ])
+    )
+    await session.commit()
+    return len(request_ids)
+
+
 async def get_reminders_for_request(
     session: AsyncSession,
     request_id: int
@@ -668,7 +823,8 @@ async def get_available_code_for_class(
             and_(
                 OlympiadCode.session_id == session_id,
                 OlympiadCode.class_number == class_number,
-                OlympiadCode.is_issued == False
+                OlympiadCode.is_issued == False,
+                OlympiadCode.is_reserve == False
             )
         ).limit(1)
     )
@@ -723,24 +879,28 @@ async def find_nearest_available_class(
         Ученик 5 класса, коды есть для 7, 8, 9 -> вернет 7
         Ученик 10 класса, коды есть для 11 -> вернет 11
     """
-    # Перебираем классы от start_class до 11
-    for class_number in range(start_class, 12):  # 12 не включается, т.е. до 11
-        # Проверяем, есть ли доступные (невыданные) коды для этого класса
-        result = await session.execute(
-            select(OlympiadCode).where(
-                and_(
-                    OlympiadCode.session_id == session_id,
-                    OlympiadCode.class_number == class_number,
-                    OlympiadCode.is_issued == False
-                )
-            ).limit(1)
-        )
+    # Сначала спрашиваем битовую карту доступности - обычно запрос не нужен
+    cached = code_availability.find_nearest(session_id, start_class)
+    if cached is not UNKNOWN:
+        return cached
 
-        if result.scalar_one_or_none() is not None:
-            return class_number
+    # Один запрос вместо перебора классов (частичный индекс
+    # ix_olympiad_codes_available по невыданным кодам)
+    result = await session.execute(
+        select(func.min(OlympiadCode.class_number)).where(
+            and_(
+                OlympiadCode.session_id == session_id,
+                OlympiadCode.class_number >= start_class,
+                OlympiadCode.class_number <= 11,
+                OlympiadCode.is_issued == False,
+                OlympiadCode.is_reserve == False
+            )
+        )
+    )
+    found_class = result.scalar()
 
-    # Не найдено ни одного класса с доступными кодами
-    return None
+    code_availability.record_lookup(session_id, start_class, found_class)
+    return found_class
 
 
 async def mark_code_issued(
@@ -773,7 +933,8 @@ async def count_available_codes_for_class(
             and_(
                 OlympiadCode.session_id == session_id,
                 OlympiadCode.class_number == class_number,
-                OlympiadCode.is_issued == False
+                OlympiadCode.is_issued == False,
+                OlympiadCode.is_reserve == False
             )
         )
     )
@@ -837,3 +998,381 @@ async def count_available_reserve_codes_for_grade8(
         )
     )
     return result.scalar() or 0
+
+
+# ==================== СЧЕТЧИКИ КОДОВ ====================
+
+async def get_session_class_counters(
+    session: AsyncSession,
+    session_id: Optional[int] = None
+) -> list:
+    """
+    Счетчики кодов по классам
+
+    Строки с полями session_id, class_number, parallel, total, assigned,
+    issued, reserve_total, reserve_used. На PostgreSQL - счетчики плюс
+    несвернутые изменения, на СУБД без триггеров - подсчет по таблицам кодов.
+
+    Args:
+        session_id: ID сессии (None - все сессии)
+    """
+    result = await session.execute(counters_select(session.get_bind().dialect.name, session_id))
+    return result.all()
+
+
+async def compact_session_class_counters(session: AsyncSession) -> int:
+    """
+    Сворачивает накопленные изменения в строки счетчиков (PostgreSQL)
+
+    Returns:
+        Число обновленных строк счетчиков
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return 0
+
+    result = await session.execute(text(COMPACT_SQL[0]))
+    for statement in COMPACT_SQL[1:]:
+        await session.execute(text(statement))
+    await session.commit()
+    return result.rowcount
+
+
+async def rebuild_session_class_counters(session: AsyncSession, session_id: Optional[int] = None) -> int:
+    """
+    Пересчитывает счетчики кодов по таблицам кодов (исправление расхождений)
+
+    Args:
+        session_id: ID сессии (None - все сессии)
+
+    Returns:
+        Число строк счетчиков после пересчета
+    """
+    for statement in rebuild_statements(session.get_bind().dialect.name, session_id):
+        await session.execute(statement)
+    await session.commit()
+
+    query = select(func.count()).select_from(SessionClassCounter)
+    if session_id is not None:
+        query = query.where(SessionClassCounter.session_id == session_id)
+    return (await session.execute(query)).scalar()
+
+
+
+# ==================== АТОМАРНАЯ ВЫДАЧА КОДОВ ====================
+
+def _supports_update_returning(session: AsyncSession) -> bool:
+    """Поддерживает ли диалект UPDATE ... RETURNING"""
+    return session.get_bind().dialect.update_returning
+
+
+def _claim_statement(model, candidates, values: dict):
+    """UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING id, code"""
+    target_id = (
+        candidates
+        .with_only_columns(model.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(model)
+        .where(model.id == target_id)
+        .values(**values)
+        .returning(model.id, model.code)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _olympiad_code_candidates(session_id: int, class_number: int, student_id: int):
+    """Невыданные коды класса: сначала распределенный ученику, затем по id"""
+    return (
+        select(OlympiadCode)
+        .where(
+            and_(
+                OlympiadCode.session_id == session_id,
+                OlympiadCode.class_number == class_number,
+                OlympiadCode.is_issued == False,
+                OlympiadCode.is_reserve == False
+            )
+        )
+        .order_by(
+            case((OlympiadCode.student_id == student_id, 0), else_=1),
+            OlympiadCode.id
+        )
+    )
+
+
+def _reserve_code_candidates(session_id: int, class_parallel: str):
+    """Неиспользованные резервные коды параллели по id"""
+    return (
+        select(Grade8ReserveCode)
+        .where(
+            and_(
+                Grade8ReserveCode.session_id == session_id,
+                Grade8ReserveCode.class_parallel == class_parallel,
+                Grade8ReserveCode.is_used == False
+            )
+        )
+        .order_by(Grade8ReserveCode.id)
+    )
+
+
+async def _claim_row(session: AsyncSession, model, candidates, values: dict):
+    """
+    Атомарно захватывает одну строку из кандидатов
+
+    PostgreSQL: один запрос UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED)
+    RETURNING. Конкурирующие запросы не ждут друг друга, а берут следующую
+    свободную строку.
+
+    Без RETURNING (старый SQLite): SELECT + условный UPDATE (compare-and-set)
+    с повтором, если строку успели забрать.
+
+    Returns:
+        (id, code) захваченной строки или None
+    """
+    if _supports_update_returning(session):
+        result = await session.execute(_claim_statement(model, candidates, values))
+        return result.first()
+
+    for _ in range(CLAIM_RETRY_ATTEMPTS):
+        result = await session.execute(
+            candidates.with_only_columns(model.id, model.code).limit(1)
+        )
+        row = result.first()
+        if row is None:
+            return None
+
+        free_flag = model.is_issued if model is OlympiadCode else model.is_used
+        result = await session.execute(
+            update(model)
+            .where(and_(model.id == row.id, free_flag == False))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return row
+
+    return None
+
+
+async def claim_olympiad_code(
+    session: AsyncSession,
+    session_id: int,
+    class_number: int,
+    student_id: int
+) -> Optional[CodeRequest]:
+    """
+    Атомарно выдает код класса ученику и создает запись о запросе кода
+
+    Предварительно распределенный ученику код (Вариант 1) берется в первую
+    очередь, иначе - любой невыданный код класса (Вариант 2).
+    Захват кода и запись CodeRequest выполняются в одной транзакции.
+
+    Returns:
+        CodeRequest с выданным кодом или None, если свободных кодов нет
+    """
+    claimed = await _claim_row(
+        session,
+        OlympiadCode,
+        _olympiad_code_candidates(session_id, class_number, student_id),
+        {
+            "is_issued": True,
+            "issued_at": moscow_now(),
+            "student_id": func.coalesce(OlympiadCode.student_id, student_id)
+        }
+    )
+
+    if claimed is None:
+        await session.rollback()
+        code_availability.mark_exhausted(session_id, class_number)
+        return None
+
+    request = CodeRequest(
+        student_id=student_id,
+        session_id=session_id,
+        grade=class_number,
+        code=claimed.code
+    )
+    session.add(request)
+    return await _commit_claim(session, request, student_id, session_id)
+
+
+async def claim_reserve_code_for_grade8(
+    session: AsyncSession,
+    session_id: int,
+    class_parallel: str,
+    student_id: int
+) -> Optional[CodeRequest]:
+    """
+    Атомарно выдает резервный код 9 класса восьмикласснику
+
+    Захват кода и запись CodeRequest (grade=9) выполняются в одной транзакции.
+
+    Args:
+        class_parallel: например "8А", "8Б", "8В"
+
+    Returns:
+        CodeRequest с выданным кодом или None, если резерв параллели исчерпан
+    """
+    claimed = await _claim_row(
+        session,
+        Grade8ReserveCode,
+        _reserve_code_candidates(session_id, class_parallel),
+        {
+            "is_used": True,
+            "used_by_student_id": student_id,
+            "used_at": moscow_now()
+        }
+    )
+
+    if claimed is None:
+        await session.rollback()
+        return None
+
+    request = CodeRequest(
+        student_id=student_id,
+        session_id=session_id,
+        grade=9,
+        code=claimed.code
+    )
+    session.add(request)
+    return await _commit_claim(session, request, student_id, session_id)
+
+
+async def _commit_claim(
+    session: AsyncSession,
+    request: CodeRequest,
+    student_id: int,
+    session_id: int
+) -> Optional[CodeRequest]:
+    """
+    Фиксирует захват кода вместе с CodeRequest
+
+    Если параллельный запрос того же ученика успел создать свой
+    CodeRequest (уникальный индекс student_id + session_id), транзакция
+    откатывается - захваченный код остается свободным - и возвращается
+    запрос, созданный первым. Успешная выдача отмечается событием
+    TOPIC_ACTIVITY (живая лента дашборда) - без запроса к БД, события
+    выдач объединяются и публикуются раз в секунду.
+    """
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return await get_code_request_for_student_in_session(session, student_id, session_id)
+
+    events.publish_coalesced(session, events.TOPIC_ACTIVITY, session_id)
+    return request
+
+
+# ==================== СТАТИСТИКА ДАШБОРДА ====================
+
+async def get_dashboard_stats(session: AsyncSession) -> dict:
+    """
+    Статистика для дашборда одним запросом
+
+    Счетчики учеников, сессий, кодов и скриншотов активной сессии
+    считаются агрегатами с FILTER в подзапросах, каждый из которых дает
+    ровно одну строку; активная сессия - CTE, к которому они присоединяются.
+    """
+    active = (
+        select(OlympiadSession.id, OlympiadSession.subject, OlympiadSession.date)
+        .where(OlympiadSession.is_active == True)
+        .order_by(OlympiadSession.date.desc())
+        .limit(1)
+        .cte("active")
+    )
+    active_id = select(active.c.id)
+
+    students = select(
+        func.count(Student.id).label("total"),
+        func.count(Student.id).filter(Student.is_registered == True).label("registered")
+    ).where(Student.is_active == True).subquery("students_stats")
+
+    sessions = select(func.count(OlympiadSession.id).label("total")).subquery("sessions_stats")
+
+    codes = select(
+        func.count(OlympiadCode.id).label("total"),
+        func.count(OlympiadCode.id).filter(OlympiadCode.is_issued == True).label("issued")
+    ).where(OlympiadCode.session_id.in_(active_id)).subquery("codes_stats")
+
+    screenshots = select(
+        func.count(CodeRequest.id).label("total")
+    ).where(
+        CodeRequest.session_id.in_(active_id),
+        CodeRequest.screenshot_submitted == True
+    ).subquery("screenshots_stats")
+
+    result = await session.execute(
+        select(
+            students.c.total.label("students_total"),
+            students.c.registered.label("students_registered"),
+            sessions.c.total.label("total_sessions"),
+            active.c.id, active.c.subject, active.c.date,
+            codes.c.total.label("total_codes"),
+            codes.c.issued.label("issued_codes"),
+            screenshots.c.total.label("screenshots")
+        )
+        .select_from(students)
+        .join(sessions, true())
+        .join(codes, true())
+        .join(screenshots, true())
+        .outerjoin(active, true())
+    )
+    row = result.one()
+
+    active_session_data = None
+    if row.id is not None:
+        active_session_data = {
+            "id": row.id,
+            "subject": row.subject,
+            "date": row.date.isoformat(),
+            "total_codes": row.total_codes,
+            "issued_codes": row.issued_codes,
+            "screenshots": row.screenshots
+        }
+
+    return {
+        "students": {
+            "total": row.students_total,
+            "registered": row.students_registered,
+            "not_registered": row.students_total - row.students_registered
+        },
+        "active_session": active_session_data,
+        "total_sessions": row.total_sessions
+    }
+
+
+async def get_recent_activity(session: AsyncSession, limit: int = 20) -> List[dict]:
+    """
+    Последние запросы кодов вместе с учеником и олимпиадой (один запрос)
+
+    Returns:
+        [{"id", "type", "student", "subject", "timestamp", "screenshot"}], новые первыми
+    """
+    result = await session.execute(
+        select(
+            CodeRequest.id,
+            CodeRequest.requested_at,
+            CodeRequest.screenshot_submitted,
+            Student.full_name,
+            OlympiadSession.subject
+        )
+        .outerjoin(Student, Student.id == CodeRequest.student_id)
+        .outerjoin(OlympiadSession, OlympiadSession.id == CodeRequest.session_id)
+        .order_by(CodeRequest.requested_at.desc(), CodeRequest.id.desc())
+        .limit(limit)
+    )
+
+    return [
+        {
+            "id": row.id,
+            "type": "code_request",
+            "student": row.full_name or "Неизвестен",
+            "subject": row.subject or "Неизвестен",
+            "timestamp": row.requested_at.isoformat() if row.requested_at else None,
+            "screenshot": row.screenshot_submitted
+        }
+        for row in result
+    ]
@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from database.models import Base
+from database import counters  # noqa: F401 - триггеры счетчиков кодов при init_db
 import os
 from dotenv import load_dotenv
 
@@ -0,0 +1,197 @@
+"""
+Межпроцессные события через PostgreSQL LISTEN/NOTIFY
+
+Бот и API работают в разных контейнерах, а кэши у каждого процесса свои.
+Изменения, после которых кэши нужно сбросить (активация сессии, загрузка
+кодов и т.п.), публикуются в канал PostgreSQL; каждый процесс слушает
+канал и вызывает локальные обработчики темы.
+
+Формат сообщения: "<тема>:<payload>".
+
+Модуль не импортирует database.database, чтобы его можно было
+использовать без настроенного подключения (тесты, SQLite): без
+PostgreSQL события просто доставляются внутри процесса.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import select, func
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "olympus_events"
+
+# Темы событий
+TOPIC_ACTIVE_SESSION = "active_session"  # активная сессия изменилась
+TOPIC_CODES_CHANGED = "codes_changed"  # коды сессии загружены/перераспределены (payload: session_id)
+TOPIC_STUDENTS_CHANGED = "students_changed"  # ученики изменены (payload: telegram_id или пусто)
+TOPIC_NOTIFICATION_SCHEDULED = "notification_scheduled"  # отложено уведомление об олимпиаде (payload: session_id)
+TOPIC_AUTH_CHANGED = "auth_changed"  # сессии/пользователи веб-панели изменены (payload: sha256 токена или пусто)
+TOPIC_ACTIVITY = "activity"  # выданы коды или прислан скриншот (payload: session_id)
+
+# Интервал объединения частых событий (publish_coalesced), секунды
+COALESCE_INTERVAL = float(os.getenv("EVENTS_COALESCE_SECONDS", "1"))
+
+_handlers: Dict[str, List[Callable[[str], None]]] = {}
+_listener_task: Optional[asyncio.Task] = None
+_listening = False
+_coalesced: Dict[str, Set[str]] = {}
+_coalesce_tasks: Set[asyncio.Task] = set()
+
+
+def subscribe(topic: str, handler: Callable[[str], None]):
+    """Регистрирует обработчик темы (синхронный или корутинная функция)"""
+    _handlers.setdefault(topic, []).append(handler)
+
+
+def dispatch(topic: str, payload: str = ""):
+    """Вызывает обработчики темы в текущем процессе"""
+    for handler in _handlers.get(topic, []):
+        try:
+            result = handler(payload)
+            if asyncio.iscoroutine(result):
+                asyncio.get_running_loop().create_task(result)
+        except Exception as e:
+            logger.error("Ошибка обработчика события %s: %s", topic, e)
+
+
+def _dispatch_all():
+    """После переподключения события могли потеряться - сбрасываем все кэши"""
+    for topic in list(_handlers):
+        dispatch(topic, "")
+
+
+def _message(topic: str, payload) -> str:
+    return f"{topic}:{'' if payload is None else payload}"
+
+
+async def publish(session, topic: str, payload=""):
+    """
+    Публикует событие для всех процессов
+
+    Вызывается ПОСЛЕ коммита изменений: уведомление отправляется своей
+    короткой транзакцией. Если процесс сам не слушает канал (или БД не
+    PostgreSQL), обработчики вызываются локально.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(select(func.pg_notify(CHANNEL, _message(topic, payload))))
+        await session.commit()
+
+    if not _listening:
+        dispatch(topic, "" if payload is None else str(payload))
+
+
+def publish_coalesced(session, topic: str, payload=""):
+    """
+    Публикует частое событие не чаще раза в COALESCE_INTERVAL на тему
+
+    Для горячего пути (выдача кодов, скриншоты): вызывающий не делает
+    запросов к БД, а события темы за интервал уходят одной короткой
+    транзакцией - по одному NOTIFY на каждый различный payload.
+    Вызывается ПОСЛЕ коммита изменений.
+    """
+    payload = "" if payload is None else str(payload)
+    pending = _coalesced.get(topic)
+    if pending is not None:
+        pending.add(payload)
+        return
+
+    _coalesced[topic] = {payload}
+    task = asyncio.get_running_loop().create_task(_publish_coalesced(session.bind, topic))
+    _coalesce_tasks.add(task)
+    task.add_done_callback(_coalesce_tasks.discard)
+
+
+async def _publish_coalesced(engine, topic: str):
+    await asyncio.sleep(COALESCE_INTERVAL)
+    payloads = sorted(_coalesced.pop(topic, ()))
+
+    try:
+        if engine.dialect.name == "postgresql":
+            async with engine.begin() as connection:
+                for payload in payloads:
+                    await connection.execute(select(func.pg_notify(CHANNEL, _message(topic, payload))))
+    except Exception as e:
+        logger.error("Ошибка публикации события %s: %s", topic, e)
+
+    if not _listening:
+        for payload in payloads:
+            dispatch(topic, payload)
+
+
+def publish_sync(db, topic: str, payload=""):
+    """То же, что publish, для синхронной сессии (SessionLocal)"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_notify(CHANNEL, _message(topic, payload))))
+        db.commit()
+
+    if not _listening:
+        dispatch(topic, "" if payload is None else str(payload))
+
+
+def _on_notification(connection, pid, channel, message: str):
+    topic, _, payload = message.partition(":")
+    dispatch(topic, payload)
+
+
+def _listener_dsn() -> Optional[str]:
+    url = os.getenv("DATABASE_URL", "")
+    if not url.startswith("postgresql"):
+        return None
+    return url.replace("+asyncpg", "", 1)
+
+
+async def _listen_forever(dsn: str):
+    global _listening
+    import asyncpg
+
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(CHANNEL, _on_notification)
+
+            _listening = True
+            # Пока не слушали, события могли быть пропущены
+            _dispatch_all()
+            logger.info("Подписка на события БД активна (канал %s)", CHANNEL)
+
+            await lost.wait()
+            logger.warning("Соединение подписки на события БД потеряно")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка подписки на события БД: %s", e)
+        finally:
+            _listening = False
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+
+        await asyncio.sleep(5)
+
+
+def start_listener():
+    """Запускает фоновую подписку на канал событий (если БД - PostgreSQL)"""
+    global _listener_task
+    dsn = _listener_dsn()
+    if dsn is None or _listener_task is not None:
+        return
+    _listener_task = asyncio.get_running_loop().create_task(_listen_forever(dsn))
+
+
+async def stop_listener():
+    """Останавливает подписку на события"""
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except asyncio.CancelledError:
+        pass
+    _listener_task = None
@@ -1,5 +1,5 @@
 from datetime import datetime, timezone, timedelta
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Text, Index, UniqueConstraint, text, func, literal_column
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -7,6 +7,9 @@ Base = declarative_base()
 # Московский часовой пояс (UTC+3)
 MOSCOW_TZ = timezone(timedelta(hours=3))
 
+# Класс учеников без класса в порядке списков (после 4-11, как NULLS LAST)
+NO_CLASS_ORDER = 99
+
 def moscow_now():
     """Возвращает текущее время в московском часовом поясе (naive datetime для совместимости с БД)"""
     # Возвращаем naive datetime в московском времени
@@ -25,7 +28,9 @@ class Student(Base):
     class_number = Column(Integer, nullable=True, index=True)  # Номер класса (4-11)
     parallel = Column(String(10), nullable=True)  # Параллель (А, Б, Т1, Т2, и т.д.)
     notifications_enabled = Column(Boolean, default=True)  # Включены ли уведомления для ученика
+    is_active = Column(Boolean, default=True, server_default=text("true"), nullable=False)  # False - выбыл (нет в актуальном списке)
     created_at = Column(DateTime, default=moscow_now)
+    updated_at = Column(DateTime, nullable=True)  # Последнее изменение сверкой списка
     registered_at = Column(DateTime, nullable=True)
 
     # Relationships
@@ -36,10 +41,37 @@ class Student(Base):
     assigned_codes = relationship("OlympiadCode", back_populates="student")
     used_reserve_codes = relationship("Grade8ReserveCode", back_populates="used_by")
 
+    __table_args__ = (
+        # Порядок и курсор списков учеников (crud.list_students): выражения
+        # должны совпадать с crud._STUDENT_LIST_KEY, иначе индекс не используется
+        Index(
+            "ix_students_list_order",
+            func.coalesce(class_number, literal_column(str(NO_CLASS_ORDER))),
+            func.coalesce(parallel, literal_column("''")),
+            full_name,
+            id,
+        ),
+    )
+
     def __repr__(self):
         return f"<Student(id={self.id}, name='{self.full_name}', class={self.class_number}{self.parallel or ''}, registered={self.is_registered})>"
 
 
+class StudentHistory(Base):
+    """История изменений ученика (создание, перевод, выбытие)"""
+    __tablename__ = "student_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False, index=True)
+    action = Column(String(50), nullable=False)  # created, updated, class_changed, deactivated, reactivated
+    old_data = Column(Text, nullable=True)  # JSON
+    new_data = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, default=moscow_now)
+
+    def __repr__(self):
+        return f"<StudentHistory(student_id={self.student_id}, action='{self.action}')>"
+
+
 class OlympiadSession(Base):
     """Модель сессии олимпиады для конкретного класса"""
     __tablename__ = "olympiad_sessions"
@@ -124,6 +156,11 @@ class CodeRequest(Base):
     session = relationship("OlympiadSession", back_populates="code_requests")
     reminders = relationship("Reminder", back_populates="request", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Один запрос кода на ученика в сессии (заодно индекс для поиска запроса)
+        Index("uq_code_requests_student_session", "student_id", "session_id", unique=True),
+    )
+
     def __repr__(self):
         return f"<CodeRequest(id={self.id}, grade={self.grade}, screenshot={self.screenshot_submitted})>"
 
@@ -140,6 +177,11 @@ class Reminder(Base):
     # Relationships
     request = relationship("CodeRequest", back_populates="reminders")
 
+    __table_args__ = (
+        # Проверка "уже напоминали в этом интервале" (NOT EXISTS в рассылке)
+        Index("ix_reminders_request_sent_at", "request_id", "sent_at"),
+    )
+
     def __repr__(self):
         return f"<Reminder(id={self.id}, sent_at={self.sent_at})>"
 
@@ -173,12 +215,27 @@ class OlympiadCode(Base):
     is_issued = Column(Boolean, default=False)  # Выдан ученику через бота
     issued_at = Column(DateTime, nullable=True)
 
+    # Код 9 класса отдан в резерв 8 класса (Grade8ReserveCode) - не выдается
+    is_reserve = Column(Boolean, default=False, server_default=text("false"), nullable=False)
+
     created_at = Column(DateTime, default=moscow_now)
 
     # Relationships
     session = relationship("OlympiadSession", back_populates="universal_codes")
     student = relationship("Student", back_populates="assigned_codes")
 
+    __table_args__ = (
+        # Поиск и захват свободных кодов класса: только невыданные строки
+        Index(
+            "ix_olympiad_codes_available",
+            "session_id", "class_number",
+            postgresql_where=text("NOT is_issued"),
+            sqlite_where=text("NOT is_issued"),
+        ),
+        # Код не может повторяться внутри сессии (повторная загрузка CSV)
+        Index("uq_olympiad_codes_session_code", "session_id", "code", unique=True),
+    )
+
     def __repr__(self):
         return f"<OlympiadCode(id={self.id}, class={self.class_number}, code='{self.code}', assigned={self.is_assigned}, issued={self.is_issued})>"
 
@@ -210,10 +267,95 @@ class Grade8ReserveCode(Base):
     session = relationship("OlympiadSession", back_populates="grade8_reserve_codes")
     used_by = relationship("Student", back_populates="used_reserve_codes")
 
+    __table_args__ = (
+        # Поиск и захват свободных резервных кодов параллели (id - порядок выдачи)
+        Index(
+            "ix_grade8_reserve_codes_available",
+            "session_id", "class_parallel", "id",
+            postgresql_where=text("NOT is_used"),
+            sqlite_where=text("NOT is_used"),
+        ),
+    )
+
     def __repr__(self):
         return f"<Grade8ReserveCode(id={self.id}, class={self.class_parallel}, code='{self.code}', used={self.is_used})>"
 
 
+class SessionClassCounter(Base):
+    """
+    Счетчики кодов сессии по классам (поддерживаются триггерами БД)
+
+    Строки кодов olympiad_codes: (сессия, класс, parallel="") - total, assigned, issued.
+    Строки резерва grade8_reserve_codes: (сессия, 8, параллель) - reserve_total, reserve_used.
+    Текущее значение - сумма строки и еще не свернутых изменений из
+    session_class_counter_deltas. Триггеры, свертка и пересчет - database/counters.py.
+    """
+    __tablename__ = "session_class_counters"
+
+    # Без внешнего ключа: при каскадном удалении сессии триггеры кодов
+    # еще обновляют счетчики уже удаленной сессии
+    session_id = Column(Integer, primary_key=True)
+    class_number = Column(Integer, primary_key=True)
+    parallel = Column(String(10), primary_key=True, default="", server_default="")
+
+    total = Column(Integer, nullable=False, default=0, server_default="0")
+    assigned = Column(Integer, nullable=False, default=0, server_default="0")
+    issued = Column(Integer, nullable=False, default=0, server_default="0")
+    reserve_total = Column(Integer, nullable=False, default=0, server_default="0")
+    reserve_used = Column(Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<SessionClassCounter(session_id={self.session_id}, class={self.class_number}{self.parallel}, total={self.total}, issued={self.issued})>"
+
+
+class SessionClassCounterDelta(Base):
+    """
+    Изменения счетчиков кодов, еще не свернутые в session_class_counters
+
+    Триггеры таблиц кодов только добавляют строки (без блокировки общих
+    строк счетчиков - выдачи кодов не ждут друг друга), периодическая
+    свертка переносит их в session_class_counters.
+    """
+    __tablename__ = "session_class_counter_deltas"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, nullable=False)
+    class_number = Column(Integer, nullable=False)
+    parallel = Column(String(10), nullable=False, default="", server_default="")
+
+    total = Column(Integer, nullable=False, default=0, server_default="0")
+    assigned = Column(Integer, nullable=False, default=0, server_default="0")
+    issued = Column(Integer, nullable=False, default=0, server_default="0")
+    reserve_total = Column(Integer, nullable=False, default=0, server_default="0")
+    reserve_used = Column(Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<SessionClassCounterDelta(session_id={self.session_id}, class={self.class_number}{self.parallel}, total={self.total}, issued={self.issued})>"
+
+
+class NotificationDelivery(Base):
+    """
+    Доставленные сообщения массовых рассылок
+
+    Позволяет продолжить рассылку после перезапуска, не отправляя
+    сообщение повторно тем, кто его уже получил.
+    """
+    __tablename__ = "notification_deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    campaign = Column(String(100), nullable=False)  # "olympiad_activated:5", "screenshot_reminder:5:2025-10-17T10:30"
+    session_id = Column(Integer, ForeignKey("olympiad_sessions.id", ondelete="CASCADE"), nullable=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    sent_at = Column(DateTime, default=moscow_now)
+
+    __table_args__ = (
+        UniqueConstraint("campaign", "student_id", name="uq_notification_delivery"),
+    )
+
+    def __repr__(self):
+        return f"<NotificationDelivery(campaign='{self.campaign}', student_id={self.student_id})>"
+
+
 class NotificationSettings(Base):
     """Глобальные настройки уведомлений системы"""
     __tablename__ = "notification_settings"
@@ -1,6 +1,7 @@
 import csv
 import re
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
 from datetime import datetime
 import logging
 
@@ -33,96 +34,38 @@ class CodesCSVParser:
             }
         """
         logger.info(f"Начинаем парсинг файла: {self.file_path}")
-        
-        # Извлекаем класс из имени файла
-        class_number = None
-        filename_match = re.search(r'_(\d{1,2})\.csv', self.file_path)
-        if filename_match:
-            class_number = int(filename_match.group(1))
-            logger.info(f"Класс из имени файла: {class_number}")
-        
-        # Читаем CSV
-        results = []
-        
-        with open(self.file_path, 'r', encoding=self.encoding) as f:
-            reader = csv.reader(f, delimiter=';')  # Используем ; как разделитель
-            rows = list(reader)
-        
-        if len(rows) < 3:
+
+        codes_by_column: Dict[int, List[str]] = {}
+
+        with open(self.file_path, 'r', encoding=self.encoding, newline='') as f:
+            stream = CodesCSVStream(self.file_path)
+            for parsed_code in stream.feed(csv.reader(f, delimiter=';')):
+                codes_by_column.setdefault(parsed_code.column, []).append(parsed_code.code)
+            for parsed_code in stream.finish():
+                codes_by_column.setdefault(parsed_code.column, []).append(parsed_code.code)
+
+        if stream.rows_read < 3:
             logger.warning("Файл содержит менее 3 строк, невозможно распарсить")
-            return results
-        
-        # Строка 1: заголовки (предметы начинаются с колонки E, индекс 4)
-        header_row = rows[0]
-        
-        # Строка 2: даты
-        dates_row = rows[1]
-        
-        # Если класс не извлечен из имени, пробуем взять из A1
-        if not class_number and len(header_row) > 0:
-            match = re.search(r'(\d+)', header_row[0])
-            if match:
-                class_number = int(match.group(1))
-                logger.info(f"Класс из A1: {class_number}")
-        
-        # Обрабатываем каждый столбец начиная с E (индекс 4)
-        for col_idx in range(4, len(header_row)):
-            subject = header_row[col_idx].strip()
-            
-            # Пропускаем пустые столбцы
-            if not subject:
-                continue
-            
-            logger.info(f"Обработка предмета: {subject} (колонка {col_idx})")
-            
-            # Дата для этого предмета
-            date_str = dates_row[col_idx].strip() if col_idx < len(dates_row) else ""
+            return []
+
+        results = []
+        for column in stream.columns:
+            codes = codes_by_column.get(column.index, [])
+            logger.info(f"  Найдено кодов для {column.subject}: {len(codes)}")
 
-            # Парсим дату
-            parsed_date = None
-            if date_str:
-                parsed_date = self._parse_date(date_str)
-            
-            # Собираем коды из всех строк начиная с 3-й (индекс 2)
-            codes = []
-            detected_class = None  # Класс, определенный из кодов
-
-            for row_idx in range(2, len(rows)):
-                row = rows[row_idx]
-
-                # Проверяем, что в этой строке есть данные для текущего столбца
-                if col_idx < len(row):
-                    code = row[col_idx].strip()
-
-                    # Проверяем, что это валидный код
-                    if code and self._is_valid_code(code):
-                        codes.append(code)
-
-                        # Извлекаем класс из кода (более надежный способ)
-                        if not detected_class:
-                            detected_class = self._extract_class_from_code(code)
-                            if detected_class:
-                                logger.info(f"  Класс определен из кода: {detected_class}")
-
-            # Используем класс из кода, если он был определен
-            if detected_class:
-                class_number = detected_class
-            
-            logger.info(f"  Найдено кодов для {subject}: {len(codes)}")
-            
             # Добавляем результат только если есть коды
             if codes:
                 results.append({
-                    "subject": subject,
-                    "date": parsed_date,
-                    "date_str": date_str,
-                    "class_number": class_number,
+                    "subject": column.subject,
+                    "date": column.date,
+                    "date_str": column.date_str,
+                    "class_number": column.class_number,
                     "codes": codes
                 })
-        
+
         logger.info(f"Всего предметов с кодами: {len(results)}")
         return results
-    
+
     def _is_valid_code(self, code: str) -> bool:
         """Проверяет, является ли строка валидным кодом"""
         # Код должен содержать слэши и начинаться с sb
@@ -209,6 +152,118 @@ class CodesCSVParser:
         return None
 
 
+class ParsedCode(NamedTuple):
+    """Код из CSV вместе с предметом и классом"""
+    column: int
+    subject: str
+    date: Optional[datetime]
+    class_number: Optional[int]
+    code: str
+
+
+@dataclass
+class CSVColumn:
+    """Состояние столбца предмета при потоковом разборе"""
+    index: int
+    subject: str
+    date: Optional[datetime] = None
+    date_str: str = ""
+    class_number: Optional[int] = None
+    class_detected: bool = False
+    codes_count: int = 0
+    pending: List[str] = field(default_factory=list)
+
+
+class CodesCSVStream:
+    """
+    Потоковый разбор CSV с кодами (тот же формат, что у CodesCSVParser)
+
+    Строки подаются по мере чтения файла, коды возвращаются сразу -
+    файл целиком в памяти не держится. Класс столбца определяется по
+    первому коду с классом; коды, прочитанные до этого, придерживаются
+    в столбце (обычно это ноль или один код).
+    """
+
+    def __init__(self, filename: str = ""):
+        self._helpers = CodesCSVParser(filename)
+        self.file_class: Optional[int] = None
+        self.columns: List[CSVColumn] = []
+        self.rows_read = 0
+
+        # Класс из имени файла
+        filename_match = re.search(r'_(\d{1,2})\.csv', filename)
+        if filename_match:
+            self.file_class = int(filename_match.group(1))
+            logger.info(f"Класс из имени файла: {self.file_class}")
+
+    def feed(self, rows: Iterable[List[str]]) -> Iterator[ParsedCode]:
+        """Обрабатывает очередные строки CSV и возвращает найденные коды"""
+        for row in rows:
+            self.rows_read += 1
+
+            if self.rows_read == 1:
+                self._read_header(row)
+            elif self.rows_read == 2:
+                self._read_dates(row)
+            else:
+                for column in self.columns:
+                    if column.index < len(row):
+                        yield from self._add_code(column, row[column.index].strip())
+
+    def finish(self) -> Iterator[ParsedCode]:
+        """Возвращает коды столбцов, класс которых так и не определился по кодам"""
+        for column in self.columns:
+            if not column.class_detected:
+                column.class_number = self.file_class
+                yield from self._release(column)
+
+    def _read_header(self, header_row: List[str]):
+        # Строка 1: заголовки (предметы начинаются с колонки E, индекс 4)
+        if not self.file_class and len(header_row) > 0:
+            match = re.search(r'(\d+)', header_row[0])
+            if match:
+                self.file_class = int(match.group(1))
+                logger.info(f"Класс из A1: {self.file_class}")
+
+        for col_idx in range(4, len(header_row)):
+            subject = header_row[col_idx].strip()
+            if subject:
+                logger.info(f"Обработка предмета: {subject} (колонка {col_idx})")
+                self.columns.append(CSVColumn(index=col_idx, subject=subject))
+
+    def _read_dates(self, dates_row: List[str]):
+        # Строка 2: даты проведения для каждого предмета
+        for column in self.columns:
+            date_str = dates_row[column.index].strip() if column.index < len(dates_row) else ""
+            column.date_str = date_str
+            column.date = self._helpers._parse_date(date_str) if date_str else None
+
+    def _add_code(self, column: CSVColumn, code: str) -> Iterator[ParsedCode]:
+        if not code or not self._helpers._is_valid_code(code):
+            return
+
+        column.codes_count += 1
+
+        if column.class_detected:
+            yield ParsedCode(column.index, column.subject, column.date, column.class_number, code)
+            return
+
+        column.pending.append(code)
+
+        # Извлекаем класс из кода (более надежный способ)
+        detected_class = self._helpers._extract_class_from_code(code)
+        if detected_class:
+            logger.info(f"  Класс определен из кода: {detected_class}")
+            column.class_number = detected_class
+            column.class_detected = True
+            yield from self._release(column)
+
+    def _release(self, column: CSVColumn) -> Iterator[ParsedCode]:
+        pending, column.pending = column.pending, []
+        for code in pending:
+            yield ParsedCode(column.index, column.subject, column.date, column.class_number, code)
+
+
 def parse_codes_csv(file_path: str, encoding: str = 'utf-8') -> List[Dict]:
     """
     Удобная функция для парсинга CSV файла с кодами
@@ -1,73 +1,107 @@
+import csv
 import openpyxl
-from typing import List, Dict
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Sequence
 import logging
 import re  # Добавьте этот импорт!
 
 logger = logging.getLogger(__name__)
 
+# Заголовки ищем в первых строках файла
+HEADER_SEARCH_ROWS = 15
+
+# Расширенные варианты названий колонок
+FIO_VARIANTS = ['фио', 'имя', 'ф.и.о', 'ф.и.о.', 'фамилия', 'студент', 'ученик']
+CLASS_VARIANTS = ['класс', 'группа', 'grade', 'class']
+
 
 class StudentExcelParser:
-    """Парсер Excel файлов со списком учеников"""
+    """
+    Парсер Excel файлов со списком учеников
+
+    По умолчанию книга открывается в режиме read_only: строки читаются
+    потоково (iter_rows(values_only=True)), без объектов ячеек в памяти,
+    и ученики отдаются лениво через iter_students().
+    """
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, read_only: bool = True):
         self.file_path = file_path
-        self.workbook = openpyxl.load_workbook(file_path, data_only=True)
-        
-    def parse(self) -> List[Dict]:
+        self.read_only = read_only
+
+    def iter_rows(self) -> Iterator[Sequence[Any]]:
+        """Значения строк активного листа"""
+        workbook = openpyxl.load_workbook(self.file_path, read_only=self.read_only, data_only=True)
+        try:
+            sheet = workbook.active
+            if self.read_only:
+                # Размеры листа в файле бывают неверными - читаем все строки
+                sheet.reset_dimensions()
+            yield from sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def find_columns(rows: List[Sequence[Any]]) -> Optional[tuple]:
         """
-        Парсит Excel файл и возвращает список учеников
-        
+        Ищет колонки ФИО и Класс в первых строках
+
         Returns:
-            List[Dict] с ключами: full_name, class_number
+            (строка заголовка, столбец ФИО, столбец Класс) - нумерация с 1,
+            или None, если колонки не найдены
         """
-        logger.info(f"Начинаем парсинг файла: {self.file_path}")
-        
-        students = []
-        sheet = self.workbook.active
-        
-        # Ищем заголовки - УЛУЧШЕННАЯ ВЕРСИЯ
         header_row = None
         fio_col = None
         class_col = None
-        
-        # Расширенные варианты названий колонок
-        fio_variants = ['фио', 'имя', 'ф.и.о', 'ф.и.о.', 'фамилия', 'студент', 'ученик']
-        class_variants = ['класс', 'группа', 'grade', 'class']
-        
-        for row_idx, row in enumerate(sheet.iter_rows(max_row=15), start=1):  # Увеличили до 15 строк
-            for col_idx, cell in enumerate(row, start=1):
-                if not cell.value:
+
+        for row_idx, row in enumerate(rows, start=1):
+            for col_idx, value in enumerate(row, start=1):
+                if not value:
                     continue
                     
-                cell_text = str(cell.value).lower().strip()
+                cell_text = str(value).lower().strip()
                 
                 # Проверяем варианты для ФИО
                 if not fio_col:
-                    for variant in fio_variants:
+                    for variant in FIO_VARIANTS:
                         if variant in cell_text:
                             fio_col = col_idx
                             header_row = row_idx
-                            logger.info(f"Найдена колонка ФИО: '{cell.value}' в столбце {col_idx}")
+                            logger.info(f"Найдена колонка ФИО: '{value}' в столбце {col_idx}")
                             break
                 
                 # Проверяем варианты для Класса
                 if not class_col:
-                    for variant in class_variants:
+                    for variant in CLASS_VARIANTS:
                         if variant in cell_text:
                             class_col = col_idx
                             header_row = row_idx
-                            logger.info(f"Найдена колонка Класс: '{cell.value}' в столбце {col_idx}")
+                            logger.info(f"Найдена колонка Класс: '{value}' в столбце {col_idx}")
                             break
             
             if fio_col and class_col:
-                break
+                return header_row, fio_col, class_col
+
+        return None
+
+    def iter_students(self) -> Iterator[Dict]:
+        """
+        Лениво отдает учеников из файла
+
+        Yields:
+            Dict с ключами: full_name, class_number, parallel, row_number
+        """
+        logger.info(f"Начинаем парсинг файла: {self.file_path}")
+
+        rows = iter(self.iter_rows())
+        head = list(islice(rows, HEADER_SEARCH_ROWS))
+        columns = self.find_columns(head)
         
-        if not fio_col or not class_col:
+        if not columns:
             # Выводим первые 5 строк для отладки
             logger.error("Не найдены колонки ФИО и Класс!")
             logger.error("Первые 5 строк файла:")
-            for i, row in enumerate(sheet.iter_rows(max_row=5), 1):
-                row_data = [str(cell.value) if cell.value else '' for cell in row[:10]]
+            for i, row in enumerate(head[:5], 1):
+                row_data = [str(value) if value else '' for value in row[:10]]
                 logger.error(f"Строка {i}: {row_data}")
             
             raise ValueError(
@@ -75,111 +109,172 @@ class StudentExcelParser:
                 "Проверьте, что в первых 15 строках есть заголовки с названиями колонок. "
                 "Допустимые варианты: ФИО/Имя/Фамилия для имен, Класс/Группа для класса."
             )
-        
+
+        header_row, fio_col, class_col = columns
         logger.info(f"Найдены колонки: ФИО - столбец {fio_col}, Класс - столбец {class_col}")
         logger.info(f"Строка заголовка: {header_row}")
         
-        # Остальной код без изменений...
-        # Читаем данные
-        for row_idx, row in enumerate(sheet.iter_rows(min_row=header_row + 1), start=header_row + 1):
-            fio_cell = row[fio_col - 1]
-            class_cell = row[class_col - 1]
+        # Читаем данные: остаток первых строк, затем остальной файл
+        count = 0
+        data_rows = chain(head[header_row:], rows)
+        for row_idx, row in enumerate(data_rows, start=header_row + 1):
+            student = self._parse_row(row, row_idx, fio_col, class_col)
+            if student:
+                count += 1
+                yield student
+
+        logger.info(f"Успешно распарсено {count} учеников")
+
+    @staticmethod
+    def _parse_row(row: Sequence[Any], row_idx: int, fio_col: int, class_col: int) -> Optional[Dict]:
+        """Ученик из строки или None, если строку нужно пропустить"""
+        fio_value = row[fio_col - 1] if len(row) >= fio_col else None
+        class_cell_value = row[class_col - 1] if len(row) >= class_col else None
+
+        if not fio_value:
+            return None
+        
+        full_name = str(fio_value).strip()
+        if not full_name:
+            return None
+        
+        # Парсим номер класса
+        class_value = str(class_cell_value).strip() if class_cell_value else ""
+        
+        try:
+            # Извлекаем ПЕРВОЕ число из строки (для 8-Т2, 7-Т1 и т.д.)
+            match = re.search(r'(\d+)', class_value)
+            if not match:
+                logger.warning(f"Пропуск строки {row_idx}: не найдена цифра в '{class_value}'")
+                return None
             
-            if not fio_cell.value:
-                continue
+            class_number = int(match.group(1))
             
-            full_name = str(fio_cell.value).strip()
+            if not (4 <= class_number <= 11):
+                logger.warning(f"Пропуск строки {row_idx}: некорректный класс {class_value} (число {class_number})")
+                return None
             
-            # Парсим номер класса
-            class_value = str(class_cell.value).strip() if class_cell.value else ""
+            # Извлекаем параллель (все после первой цифры)
+            parallel = class_value[match.end():].strip() if match.end() < len(class_value) else None
+            if parallel and parallel.startswith('-'):
+                parallel = parallel[1:].strip()
+
+            return {
+                "full_name": full_name,
+                "class_number": class_number,
+                "parallel": parallel if parallel else None,
+                "row_number": row_idx
+            }
             
-            try:
-                # Извлекаем ПЕРВОЕ число из строки (для 8-Т2, 7-Т1 и т.д.)
-                match = re.search(r'(\d+)', class_value)
-                if not match:
-                    logger.warning(f"Пропуск строки {row_idx}: не найдена цифра в '{class_value}'")
-                    continue
-                
-                class_number = int(match.group(1))
-                
-                if not (4 <= class_number <= 11):
-                    logger.warning(f"Пропуск строки {row_idx}: некорректный класс {class_value} (число {class_number})")
-                    continue
-                
-                # Извлекаем параллель (все после первой цифры)
-                parallel = class_value[match.end():].strip() if match.end() < len(class_value) else None
-                if parallel and parallel.startswith('-'):
-                    parallel = parallel[1:].strip()
-
-                students.append({
-                    "full_name": full_name,
-                    "class_number": class_number,
-                    "parallel": parallel if parallel else None,
-                    "row_number": row_idx
-                })
-                
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Пропуск строки {row_idx}: ошибка парсинга класса '{class_value}' - {e}")
-                continue
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Пропуск строки {row_idx}: ошибка парсинга класса '{class_value}' - {e}")
+            return None
         
-        logger.info(f"Успешно распарсено {len(students)} учеников")
+    def parse(self) -> List[Dict]:
+        """
+        Парсит файл и возвращает список учеников
         
-        return students
+        Returns:
+            List[Dict] с ключами: full_name, class_number, parallel, row_number
+        """
+        return list(self.iter_students())
     
-    def validate(self, students: List[Dict]) -> Dict:
+    def validate(self, students: Iterable[Dict]) -> Dict:
         """
         Валидация распарсенных данных
         
         Returns:
             Dict с результатами валидации
         """
-        issues = {
+        validation = StudentValidation()
+        for student in students:
+            validation.add(student)
+        return validation.result()
+
+
+class StudentCSVParser(StudentExcelParser):
+    """Парсер CSV со списком учеников (те же правила поиска колонок)"""
+
+    def iter_rows(self) -> Iterator[Sequence[Any]]:
+        with open(self.file_path, "rb") as f:
+            head = f.read(64 * 1024)
+
+        # Выгрузки из Excel бывают в windows-1251
+        try:
+            head.decode("utf-8")
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError as e:
+            encoding = "utf-8-sig" if e.start > len(head) - 4 else "windows-1251"
+
+        # Разделитель: ";" (Excel в русской локали), "," или табуляция
+        sample = head.decode(encoding, errors="ignore")
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=";,\t").delimiter
+        except csv.Error:
+            delimiter = ";"
+
+        with open(self.file_path, encoding=encoding, newline="") as f:
+            yield from csv.reader(f, delimiter=delimiter)
+
+
+class StudentValidation:
+    """Накопительная валидация: ученики добавляются по одному"""
+
+    def __init__(self):
+        self.issues = {
             "duplicates": [],
             "invalid_names": [],
             "class_distribution": {}
         }
-        
+        self._seen_names = {}
+
+    def add(self, student: Dict):
+        name = student["full_name"]
+
         # Проверка дубликатов
-        seen_names = {}
-        for student in students:
-            name = student["full_name"]
-            if name in seen_names:
-                issues["duplicates"].append({
-                    "name": name,
-                    "rows": [seen_names[name], student["row_number"]]
-                })
-            else:
-                seen_names[name] = student["row_number"]
+        if name in self._seen_names:
+            self.issues["duplicates"].append({
+                "name": name,
+                "rows": [self._seen_names[name], student["row_number"]]
+            })
+        else:
+            self._seen_names[name] = student["row_number"]
         
         # Проверка корректности имен
-        for student in students:
-            name = student["full_name"]
-            # Минимальная проверка: имя должно содержать хотя бы 2 слова
-            if len(name.split()) < 2:
-                issues["invalid_names"].append({
-                    "name": name,
-                    "row": student["row_number"]
-                })
+        # Минимальная проверка: имя должно содержать хотя бы 2 слова
+        if len(name.split()) < 2:
+            self.issues["invalid_names"].append({
+                "name": name,
+                "row": student["row_number"]
+            })
         
         # Распределение по классам
-        for student in students:
-            class_num = student["class_number"]
-            issues["class_distribution"][class_num] = issues["class_distribution"].get(class_num, 0) + 1
-        
-        return issues
+        class_num = student["class_number"]
+        distribution = self.issues["class_distribution"]
+        distribution[class_num] = distribution.get(class_num, 0) + 1
+
+    def result(self) -> Dict:
+        return self.issues
+
+
+def open_student_parser(file_path: str) -> StudentExcelParser:
+    """Парсер по расширению файла: .csv или Excel"""
+    if file_path.lower().endswith(".csv"):
+        return StudentCSVParser(file_path)
+    return StudentExcelParser(file_path)
 
 
 def parse_students_excel(file_path: str) -> tuple[List[Dict], Dict]:
     """
-    Удобная функция для парсинга Excel файла
+    Удобная функция для парсинга Excel (или CSV) файла
     
     Args:
-        file_path: путь к Excel файлу
+        file_path: путь к Excel или CSV файлу
         
     Returns:
         tuple: (список учеников, результаты валидации)
     """
-    parser = StudentExcelParser(file_path)
+    parser = open_student_parser(file_path)
     students = parser.parse()
     validation = parser.validate(students)
     
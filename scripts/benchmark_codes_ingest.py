@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк загрузки кодов из CSV
+
+Генерирует синтетические CSV (7 классов x 20 предметов, ~100 тыс. кодов)
+и сравнивает пути загрузки в БД из DATABASE_URL:
+- legacy: parse_codes_csv (файл целиком в памяти) + session.add на каждый код;
+- insert: потоковый разбор + многострочный INSERT пачками;
+- copy:   потоковый разбор + asyncpg COPY (только PostgreSQL).
+
+Для каждого пути выводятся время и пиковая память Python (tracemalloc).
+Данные бенчмарка пишутся в сессии с префиксом "__bench__" и удаляются.
+
+Использование:
+    python scripts/benchmark_codes_ingest.py [--codes 100000] [--methods legacy,insert,copy]
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, delete
+
+from database.database import AsyncSessionLocal
+from database.models import OlympiadSession, OlympiadCode, moscow_now
+from parser.csv_parser import parse_codes_csv, CodesCSVStream
+from utils.code_import import CodeImporter, iter_csv_rows
+
+BENCH_PREFIX = "__bench__"
+CLASSES = range(5, 12)
+SUBJECTS = 20
+
+
+def generate_files(directory: Path, total_codes: int) -> list:
+    """Создает CSV в формате выгрузки: заголовки, даты, строки кодов"""
+    per_column = total_codes // (len(CLASSES) * SUBJECTS) + 1
+    files = []
+
+    for class_number in CLASSES:
+        path = directory / f"bench_{class_number}.csv"
+        subjects = [f"{BENCH_PREFIX}{i:02d}" for i in range(SUBJECTS)]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(";".join([f"{class_number} класс", "", "", ""] + subjects) + "\n")
+            f.write(";".join(["", "", "", ""] + ["23.10.2024"] * SUBJECTS) + "\n")
+            for row in range(per_column):
+                codes = [
+                    f"sbbench{i:02d}/sch{row:06d}/{class_number}/x{i:02d}{row:06d}"
+                    for i in range(SUBJECTS)
+                ]
+                f.write(";".join(["", "", "", ""] + codes) + "\n")
+        files.append(path)
+
+    return files
+
+
+async def get_or_create_session(session, cache: dict, subject: str) -> int:
+    if subject not in cache:
+        result = await session.execute(select(OlympiadSession).where(OlympiadSession.subject == subject))
+        olympiad = result.scalar_one_or_none()
+        if not olympiad:
+            olympiad = OlympiadSession(subject=subject, date=moscow_now(), is_active=False)
+            session.add(olympiad)
+            await session.flush()
+        cache[subject] = olympiad.id
+    return cache[subject]
+
+
+async def run_legacy(files: list) -> int:
+    """Старый путь: файл целиком в память, ORM-объект на каждый код"""
+    count = 0
+    async with AsyncSessionLocal() as session:
+        sessions = {}
+        for path in files:
+            for subject_data in parse_codes_csv(str(path)):
+                session_id = await get_or_create_session(session, sessions, subject_data["subject"])
+                for code in subject_data["codes"]:
+                    session.add(OlympiadCode(
+                        session_id=session_id,
+                        class_number=subject_data["class_number"],
+                        code=code,
+                        is_assigned=False,
+                        is_issued=False
+                    ))
+                    count += 1
+        await session.commit()
+    return count
+
+
+async def run_streaming(files: list, method: str) -> int:
+    """Новый путь: потоковый разбор + пакетная вставка"""
+    async with AsyncSessionLocal() as session:
+        importer = CodeImporter(session, method=method)
+        sessions = {}
+        for path in files:
+            stream = CodesCSVStream(path.name)
+            with open(path, "rb") as f:
+                async def read(size: int) -> bytes:
+                    return f.read(size)
+
+                async for rows in iter_csv_rows(read):
+                    for parsed in stream.feed(rows):
+                        session_id = await get_or_create_session(session, sessions, parsed.subject)
+                        await importer.add(session_id, parsed.class_number, parsed.code)
+            for parsed in stream.finish():
+                session_id = await get_or_create_session(session, sessions, parsed.subject)
+                await importer.add(session_id, parsed.class_number, parsed.code)
+        await importer.flush()
+        await session.commit()
+    return importer.inserted
+
+
+async def cleanup():
+    async with AsyncSessionLocal() as session:
+        ids = select(OlympiadSession.id).where(OlympiadSession.subject.like(f"{BENCH_PREFIX}%"))
+        await session.execute(delete(OlympiadCode).where(OlympiadCode.session_id.in_(ids)))
+        await session.execute(delete(OlympiadSession).where(OlympiadSession.subject.like(f"{BENCH_PREFIX}%")))
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки кодов из CSV")
+    parser.add_argument("--codes", type=int, default=100_000, help="Сколько кодов сгенерировать")
+    parser.add_argument("--methods", default="legacy,insert,copy", help="Пути через запятую")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        bind = session.get_bind()
+        copy_available = bind.dialect.name == "postgresql" and bind.dialect.driver == "asyncpg"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = generate_files(Path(tmp), args.codes)
+        size_mb = sum(path.stat().st_size for path in files) / 1024 / 1024
+        print(f"📄 Сгенерировано {len(files)} файлов, {size_mb:.1f} МБ")
+
+        await cleanup()
+        for method in args.methods.split(","):
+            method = method.strip()
+            if method == "copy" and not copy_available:
+                print("⏭️  copy: нужен PostgreSQL + asyncpg, пропущено")
+                continue
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            if method == "legacy":
+                count = await run_legacy(files)
+            else:
+                count = await run_streaming(files, method)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                f"⏱️  {method:>6}: {count} кодов за {elapsed:.2f} с "
+                f"({count / elapsed:,.0f} кодов/с), пик памяти {peak / 1024 / 1024:.1f} МБ"
+            )
+            await cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
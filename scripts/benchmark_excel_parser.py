@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора списка учеников (Excel/CSV)
+
+Генерирует синтетический список (по умолчанию 30 тыс. учеников) в .xlsx
+и .csv и сравнивает режимы разбора:
+- full:   load_workbook в полном режиме + список учеников целиком (как раньше);
+- stream: read_only + iter_rows(values_only=True), ученики отдаются лениво;
+- csv:    CSV с теми же правилами поиска колонок.
+
+Каждый режим запускается в отдельном процессе, чтобы пиковая память (RSS)
+не смешивалась. Выводятся время и пиковый RSS процесса.
+
+Использование:
+    python scripts/benchmark_excel_parser.py [--students 30000] [--modes full,stream,csv]
+"""
+
+import argparse
+import csv
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import openpyxl
+
+from parser.excel_parser import StudentExcelParser, StudentCSVParser
+
+PARALLELS = ["А", "Б", "В", "Г", "Д"]
+
+
+def generate_rows(students: int):
+    """Строки списка: заголовок над таблицей, шапка, ученики"""
+    yield ["Районная олимпиада", None, None, None]
+    yield [None, None, None, None]
+    yield ["№", "ФИО", "Класс", "Школа"]
+    for i in range(1, students + 1):
+        class_number = 5 + i % 7
+        parallel = PARALLELS[i % len(PARALLELS)]
+        yield [i, f"Фамилия{i} Имя{i} Отчество{i}", f"{class_number}{parallel}", f"Школа №{i % 40 + 1}"]
+
+
+def generate_files(directory: Path, students: int) -> dict:
+    xlsx_path = directory / "students.xlsx"
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in generate_rows(students):
+        sheet.append(row)
+    workbook.save(xlsx_path)
+
+    csv_path = directory / "students.csv"
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        for row in generate_rows(students):
+            writer.writerow(["" if value is None else value for value in row])
+
+    return {"xlsx": xlsx_path, "csv": csv_path}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux - в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, path: str) -> dict:
+    """Разбор в текущем процессе (вызывается в дочернем процессе)"""
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+
+    if mode == "full":
+        students = StudentExcelParser(path, read_only=False).parse()
+        count = len(students)
+    elif mode == "stream":
+        count = sum(1 for _ in StudentExcelParser(path).iter_students())
+    else:
+        count = sum(1 for _ in StudentCSVParser(path).iter_students())
+
+    return {
+        "mode": mode,
+        "students": count,
+        "seconds": time.perf_counter() - started,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора списка учеников")
+    parser.add_argument("--students", type=int, default=30000)
+    parser.add_argument("--modes", default="full,stream,csv")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_mode(*args.worker)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Генерация списка: {args.students} учеников...")
+        files = generate_files(Path(tmp), args.students)
+
+        print(f"\n{'режим':<8} {'учеников':>9} {'время, с':>9} {'RSS до, МБ':>11} {'пик RSS, МБ':>12}")
+        for mode in args.modes.split(","):
+            path = files["csv"] if mode == "csv" else files["xlsx"]
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, str(path)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{result['mode']:<8} {result['students']:>9} {result['seconds']:>9.2f} "
+                f"{result['baseline_rss_mb']:>11.1f} {result['peak_rss_mb']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
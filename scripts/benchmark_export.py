@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк выгрузки списка учеников
+
+Заполняет временную SQLite базу синтетическими учениками и сравнивает:
+- list:   все ученики ORM объектами + список словарей + книга в памяти (как раньше);
+- stream: export_table - курсор на сервере, write_only, временный файл;
+- csv:    export_table в CSV.
+
+Каждый режим запускается в отдельном процессе; выводятся время и пиковый RSS.
+При stream/csv пиковая память не должна расти с числом учеников.
+
+Использование:
+    python scripts/benchmark_export.py [--students 30000,100000] [--modes list,stream,csv]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import Base, Student, moscow_now
+from utils.excel_export import STUDENTS_TABLE, ExcelExporter, export_table
+
+PARALLELS = ["А", "Б", "В", "Г", "Д"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux - в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def fill_database(url: str, students: int):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        now = moscow_now()
+        for start in range(0, students, 5000):
+            await conn.execute(insert(Student), [
+                {
+                    "full_name": f"Фамилия{i} Имя{i} Отчество{i}",
+                    "registration_code": f"CODE{i:08d}",
+                    "class_number": 5 + i % 7,
+                    "parallel": PARALLELS[i % len(PARALLELS)],
+                    "is_registered": i % 3 == 0,
+                    "created_at": now
+                }
+                for i in range(start, min(start + 5000, students))
+            ])
+    await engine.dispose()
+
+
+async def run_mode(mode: str, url: str) -> dict:
+    """Выгрузка в текущем процессе (вызывается в дочернем процессе)"""
+    engine = create_async_engine(url)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+
+    async with session_maker() as session:
+        if mode == "list":
+            students = (await session.execute(select(Student))).scalars().all()
+            data = [
+                {
+                    "id": s.id,
+                    "full_name": s.full_name,
+                    "class_number": s.class_number,
+                    "parallel": s.parallel,
+                    "registration_code": s.registration_code,
+                    "is_registered": s.is_registered,
+                    "telegram_id": s.telegram_id,
+                    "created_at": s.created_at.isoformat(),
+                    "registered_at": s.registered_at.isoformat() if s.registered_at else None
+                }
+                for s in students
+            ]
+            size = len(ExcelExporter.export_students(data).getvalue())
+            rows = len(data)
+        else:
+            export = await export_table(session, STUDENTS_TABLE, "csv" if mode == "csv" else "xlsx")
+            size = os.path.getsize(export.path)
+            rows = export.rows
+            export.remove()
+
+    await engine.dispose()
+    return {
+        "mode": mode,
+        "rows": rows,
+        "size_kb": size / 1024,
+        "seconds": time.perf_counter() - started,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк выгрузки учеников")
+    parser.add_argument("--students", default="30000,100000")
+    parser.add_argument("--modes", default="list,stream,csv")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "URL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_mode(*args.worker))))
+        return
+
+    print(f"{'учеников':>9} {'режим':<8} {'файл, КБ':>9} {'время, с':>9} {'RSS до, МБ':>11} {'пик RSS, МБ':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in map(int, args.students.split(",")):
+            url = f"sqlite+aiosqlite:///{tmp}/students_{count}.db"
+            asyncio.run(fill_database(url, count))
+
+            for mode in args.modes.split(","):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker", mode, url],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(
+                    f"{result['rows']:>9} {result['mode']:<8} {result['size_kb']:>9.0f} {result['seconds']:>9.2f} "
+                    f"{result['baseline_rss_mb']:>11.1f} {result['peak_rss_mb']:>12.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Пересчет счетчиков кодов (session_class_counters)
+
+Счетчики поддерживают триггеры PostgreSQL; скрипт пересчитывает их по
+таблицам кодов (olympiad_codes, grade8_reserve_codes) и показывает
+расхождения. Нужен после ручных правок с отключенными триггерами или
+восстановления из бэкапа. На СУБД без триггеров счетчики всегда
+считаются по таблицам кодов, пересчет там не нужен.
+
+Использование:
+    python scripts/rebuild_code_counters.py [--session-id ID]
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import crud
+from database.database import AsyncSessionLocal
+
+COUNTER_FIELDS = ("total", "assigned", "issued", "reserve_total", "reserve_used")
+
+
+def _snapshot(counters) -> dict:
+    return {
+        (c.session_id, c.class_number, c.parallel): tuple(getattr(c, name) for name in COUNTER_FIELDS)
+        for c in counters
+    }
+
+
+async def rebuild(session_id=None):
+    async with AsyncSessionLocal() as session:
+        before = _snapshot(await crud.get_session_class_counters(session, session_id))
+        rows = await crud.rebuild_session_class_counters(session, session_id)
+        after = _snapshot(await crud.get_session_class_counters(session, session_id))
+
+    drift = sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+
+    scope = f"сессии {session_id}" if session_id is not None else "всех сессий"
+    print(f"✅ Счетчики {scope} пересчитаны: {rows} строк")
+
+    if not drift:
+        print("   Расхождений нет")
+        return
+
+    print(f"⚠️  Исправлено расхождений: {len(drift)}")
+    print(f"   {'сессия':>6} {'класс':>6}  " + " ".join(f"{name:>14}" for name in COUNTER_FIELDS))
+    for key in drift:
+        old = before.get(key, (0,) * len(COUNTER_FIELDS))
+        new = after.get(key, (0,) * len(COUNTER_FIELDS))
+        session_num, class_num, parallel = key
+        values = " ".join(f"{f'{o} -> {n}' if o != n else str(n):>14}" for o, n in zip(old, new))
+        print(f"   {session_num:>6} {f'{class_num}{parallel}':>6}  {values}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчет счетчиков кодов")
+    parser.add_argument("--session-id", type=int, default=None, help="Только одна сессия")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild(args.session_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 Скрипт для обновления классов существующих учеников из Excel файла
 """
+import argparse
 import asyncio
 import sys
 from pathlib import Path
@@ -9,13 +10,20 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from database.database import AsyncSessionLocal
-from database.models import Student
 from parser.excel_parser import parse_students_excel
-from sqlalchemy import select
+from utils.roster_sync import MATCH_NAME, MATCH_NAME_CLASS, RosterSync
 
 
-async def update_student_classes(excel_path: str):
-    """Обновить классы учеников из Excel файла"""
+async def update_student_classes(excel_path: str, preview: bool = False, class_offset: int = 0):
+    """
+    Обновить классы учеников из Excel файла
+
+    Args:
+        excel_path: путь к файлу со списком
+        preview: только показать изменения, ничего не меняя
+        class_offset: перевод в следующий класс - сопоставлять ученика
+            N класса в базе с N+class_offset классом в списке
+    """
 
     # Парсим Excel
     print(f"📖 Парсинг файла: {excel_path}")
@@ -27,42 +35,46 @@ async def update_student_classes(excel_path: str):
         count = validation["class_distribution"][class_num]
         print(f"   {class_num} класс: {count} учеников")
 
-    # Обновляем в БД
+    # Сверяем с БД: только обновление классов, без добавления и выбытия
     async with AsyncSessionLocal() as session:
-        updated = 0
-        not_found = 0
-
-        for student_data in students_data:
-            # Ищем ученика по ФИО
-            result = await session.execute(
-                select(Student).where(Student.full_name == student_data["full_name"])
-            )
-            student = result.scalar_one_or_none()
-
-            if student:
-                # Обновляем класс и параллель
-                student.class_number = student_data.get("class_number")
-                student.parallel = student_data.get("parallel")
-                updated += 1
-            else:
-                not_found += 1
-                print(f"⚠️  Ученик не найден в БД: {student_data['full_name']}")
-
-        await session.commit()
-
-        print(f"\n✅ Обновлено: {updated} учеников")
-        print(f"❌ Не найдено в БД: {not_found} учеников")
+        sync = RosterSync(
+            session,
+            match=MATCH_NAME_CLASS if class_offset else MATCH_NAME,
+            class_offset=class_offset,
+            add_new=False,
+            deactivate_missing=False
+        )
+        result = await sync.run(students_data, preview=preview)
+
+    for item in result["not_found"]:
+        print(f"⚠️  Ученик не найден в БД: {item['name']}")
+
+    for item in result["updated"]:
+        old_class = f"{item['old_class']}{item['old_parallel'] or ''}"
+        new_class = f"{item['new_class']}{item['new_parallel'] or ''}"
+        print(f"   {item['name']}: {old_class} → {new_class}")
+
+    summary = result["summary"]
+    if preview:
+        print(f"\n👀 Будет обновлено: {summary['updated']} учеников (запустите без --preview, чтобы применить)")
+    else:
+        print(f"\n✅ Обновлено: {summary['updated']} учеников")
+    print(f"➖ Без изменений: {summary['unchanged']} учеников")
+    print(f"❌ Не найдено в БД: {summary['not_found']} учеников")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Использование: python scripts/update_student_classes.py <файл.xlsx>")
-        sys.exit(1)
-
-    excel_path = sys.argv[1]
-
-    if not Path(excel_path).exists():
-        print(f"❌ Файл не найден: {excel_path}")
+    parser = argparse.ArgumentParser(description="Обновление классов учеников из Excel/CSV")
+    parser.add_argument("file", help="Файл со списком учеников (.xlsx или .csv)")
+    parser.add_argument("--preview", action="store_true", help="Только показать изменения")
+    parser.add_argument(
+        "--promote", action="store_true",
+        help="Перевод в следующий класс: ученик N класса в базе ищется в списке в N+1 классе"
+    )
+    args = parser.parse_args()
+
+    if not Path(args.file).exists():
+        print(f"❌ Файл не найден: {args.file}")
         sys.exit(1)
 
-    asyncio.run(update_student_classes(excel_path))
+    asyncio.run(update_student_classes(args.file, preview=args.preview, class_offset=1 if args.promote else 0))
@@ -1,8 +1,11 @@
+import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, time
 import pytz
 from database.database import AsyncSessionLocal
 from database import crud
+from database.models import MOSCOW_TZ
+from utils.broadcast import BroadcastEngine, BroadcastRecipient
 from aiogram import Bot
 import os
 from dotenv import load_dotenv
@@ -12,6 +15,7 @@ load_dotenv()
 TIMEZONE = pytz.timezone(os.getenv("TIMEZONE", "Europe/Moscow"))
 REMINDER_END_TIME = os.getenv("REMINDER_END_TIME", "21:30")
 REMINDER_INTERVAL_MINUTES = int(os.getenv("REMINDER_INTERVAL_MINUTES", "30"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
 
 
 async def send_screenshot_reminders(bot: Bot):
@@ -31,50 +35,74 @@ async def send_screenshot_reminders(bot: Bot):
         # Получаем активную сессию
         active_session = await crud.get_active_session(session)
         
-        if not active_session:
-            print("ℹ️ Нет активной сессии, напоминания не отправляются")
-            return
-        
-        # Получаем запросы без скриншотов
-        requests_without_screenshot = await crud.get_requests_without_screenshot(
-            session, active_session.id
-        )
-        
-        if not requests_without_screenshot:
-            print("✅ Все ученики прислали скриншоты")
-            return
-        
-        print(f"📤 Отправка напоминаний {len(requests_without_screenshot)} ученикам...")
-        
-        for request in requests_without_screenshot:
-            student = request.student
-            
-            if not student.telegram_id:
-                continue
-            
-            try:
-                # Отправляем напоминание
-                await bot.send_message(
-                    chat_id=student.telegram_id,
-                    text=(
-                        f"⏰ Напоминание!\n\n"
-                        f"Ты получил код для олимпиады по предмету {active_session.subject}, "
-                        f"но еще не прислал скриншот завершенной работы.\n\n"
-                        f"📸 Пожалуйста, отправь фото или скриншот последней страницы "
-                        f"в этот чат до {REMINDER_END_TIME}.\n\n"
-                        f"Это важно для подтверждения выполнения работы!"
-                    )
+    if not active_session:
+        print("ℹ️ Нет активной сессии, напоминания не отправляются")
+        return
+
+    text = (
+        f"⏰ Напоминание!\n\n"
+        f"Ты получил код для олимпиады по предмету {active_session.subject}, "
+        f"но еще не прислал скриншот завершенной работы.\n\n"
+        f"📸 Пожалуйста, отправь фото или скриншот последней страницы "
+        f"в этот чат до {REMINDER_END_TIME}.\n\n"
+        f"Это важно для подтверждения выполнения работы!"
+    )
+
+    # Ключ кампании включает слот интервала: перезапуск бота внутри
+    # одного слота не отправит напоминание повторно
+    slot_minute = current_time.minute - current_time.minute % REMINDER_INTERVAL_MINUTES
+    slot = current_time.replace(minute=slot_minute, second=0, microsecond=0)
+    campaign = f"screenshot_reminder:{active_session.id}:{slot.strftime('%Y-%m-%dT%H:%M')}"
+    # Тем, кому уже напоминали в текущем слоте, повторно не пишем
+    # (reminders.sent_at хранится в naive московском времени)
+    reminded_since = slot.astimezone(MOSCOW_TZ).replace(tzinfo=None)
+
+    engine = BroadcastEngine(bot, session_factory=AsyncSessionLocal)
+    sent = failed = skipped = 0
+
+    # Конвейер: пока отправляется текущая порция, следующая уже читается из БД
+    batch = await _fetch_reminder_batch(active_session.id, reminded_since, 0)
+    if not batch:
+        print("✅ Некому напоминать: все прислали скриншоты или уже получили напоминание в этом интервале")
+        return
+
+    print(f"📤 Отправка напоминаний порциями по {REMINDER_BATCH_SIZE}...")
+
+    while batch:
+        next_batch = None
+        if len(batch) == REMINDER_BATCH_SIZE:
+            next_batch = asyncio.create_task(
+                _fetch_reminder_batch(active_session.id, reminded_since, batch[-1].id)
+            )
+
+        recipients = [
+            BroadcastRecipient(student_id=student_id, chat_id=telegram_id, ref=request_id)
+            for request_id, student_id, telegram_id in batch
+        ]
+        stats = await engine.run(campaign, recipients, text=text, session_id=active_session.id)
+
+        # Записываем отправленные напоминания порции одним INSERT
+        if stats.delivered:
+            async with AsyncSessionLocal() as session:
+                await crud.create_reminders_bulk(
+                    session, [recipient.ref for recipient in stats.delivered]
                 )
-                
-                # Записываем напоминание в БД
-                await crud.create_reminder(session, request.id, "screenshot")
-                
-                print(f"✅ Напоминание отправлено: {student.full_name}")
-                
-            except Exception as e:
-                print(f"❌ Ошибка отправки напоминания {student.full_name}: {e}")
-        
-        print(f"✅ Напоминания отправлены")
+
+        sent += stats.sent
+        failed += stats.failed
+        skipped += stats.skipped
+        batch = await next_batch if next_batch else []
+
+    print(f"✅ Напоминания отправлены: {sent}, ошибок: {failed}, пропущено: {skipped}")
+
+
+async def _fetch_reminder_batch(session_id: int, reminded_since: datetime, after_request_id: int):
+    """Читает очередную порцию получателей напоминаний"""
+    async with AsyncSessionLocal() as session:
+        return await crud.get_reminder_candidates(
+            session, session_id, reminded_since,
+            after_request_id=after_request_id, limit=REMINDER_BATCH_SIZE
+        )
 
 
 def setup_reminder_scheduler(bot: Bot) -> AsyncIOScheduler:
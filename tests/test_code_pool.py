@@ -0,0 +1,135 @@
+"""
+Тесты записи выдач пула кодов (utils/code_pool.py)
+
+Выдача, которую нельзя записать в БД (ученик удален, код уже выдан в
+обход пула), не должна блокировать остальные выдачи и журнал: она
+откладывается в файл отклоненных. Используется временная SQLite база
+(aiosqlite) с включенными внешними ключами.
+"""
+
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("aiosqlite")
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("DATABASE_URL_SYNC", "sqlite://")
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import Base, CodeRequest, OlympiadCode, OlympiadSession, Student
+from utils.code_pool import CodePoolService
+
+STUDENTS = ["Иванов Иван", "Петров Петр", "Сидоров Сидор", "Козлов Козел"]
+
+
+def _run(tmp_path, scenario):
+    """Готовит сессию с кодами 7 класса и выполняет scenario(pool, session_maker)"""
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db")
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with session_maker() as session:
+            olympiad = OlympiadSession(subject="Математика", date=datetime(2026, 10, 20), is_active=True)
+            session.add(olympiad)
+            session.add_all(
+                Student(full_name=name, registration_code=f"reg{i}", class_number=7, parallel="А")
+                for i, name in enumerate(STUDENTS)
+            )
+            await session.flush()
+            session.add_all(
+                OlympiadCode(session_id=olympiad.id, class_number=7, code=f"code{i}")
+                for i in range(len(STUDENTS))
+            )
+            await session.commit()
+            session_id = olympiad.id
+            student_ids = list((await session.execute(select(Student.id).order_by(Student.id))).scalars())
+
+        pool = CodePoolService(journal_path=str(tmp_path / "journal.jsonl"))
+        pool._session_factory = session_maker
+        try:
+            return await scenario(pool, session_maker, session_id, student_ids)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+async def _requests(session_maker):
+    async with session_maker() as session:
+        result = await session.execute(select(CodeRequest.student_id, CodeRequest.code).order_by(CodeRequest.student_id))
+        return [tuple(row) for row in result]
+
+
+def _rejected(pool):
+    with open(pool.rejected_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_bad_claims_do_not_block_flush(tmp_path):
+    """Удаленный ученик и перехваченный код отклоняются, остальные выдачи пишутся"""
+
+    async def scenario(pool, session_maker, session_id, student_ids):
+        claims = [await pool.claim_olympiad_code(session_id, 7, student_id) for student_id in student_ids[:3]]
+
+        async with session_maker() as session:
+            # Ученик удален до записи пачки (нарушение внешнего ключа)
+            await session.execute(Student.__table__.delete().where(Student.id == student_ids[1]))
+            # Код выдан в обход пула другому ученику
+            await session.execute(
+                update(OlympiadCode)
+                .where(OlympiadCode.id == claims[2].code_id)
+                .values(is_issued=True, issued_at=datetime(2026, 10, 20, 9), student_id=student_ids[3])
+            )
+            await session.commit()
+
+        await pool.flush()
+        return claims, await _requests(session_maker), pool._read_journal(), _rejected(pool), pool._pending
+
+    claims, requests, journal, rejected, pending = _run(tmp_path, scenario)
+
+    assert requests == [(claims[0].student_id, claims[0].code)]
+    assert pending == [] and journal == []
+    assert [entry["student_id"] for entry in rejected] == [claims[1].student_id, claims[2].student_id]
+    assert rejected[1]["reason"] == "код уже выдан другому ученику"
+
+
+def test_journal_replay_is_idempotent_and_isolated(tmp_path):
+    """Проигрывание журнала: записанные выдачи не дублируются, плохие откладываются"""
+
+    async def scenario(pool, session_maker, session_id, student_ids):
+        claims = [await pool.claim_olympiad_code(session_id, 7, student_id) for student_id in student_ids[:3]]
+        # Первая выдача уже записана до аварийной остановки
+        async with session_maker() as session:
+            await pool._write_claims(session, claims[:1])
+            await session.commit()
+        async with session_maker() as session:
+            await session.execute(Student.__table__.delete().where(Student.id == student_ids[1]))
+            await session.commit()
+
+        restarted = CodePoolService(journal_path=pool.journal_path)
+        restarted._session_factory = session_maker
+        await restarted.reconcile()
+        return claims, await _requests(session_maker), restarted._read_journal(), _rejected(restarted)
+
+    claims, requests, journal, rejected = _run(tmp_path, scenario)
+
+    assert requests == [(claims[0].student_id, claims[0].code), (claims[2].student_id, claims[2].code)]
+    assert journal == []
+    assert [entry["student_id"] for entry in rejected] == [claims[1].student_id]
@@ -0,0 +1,156 @@
+"""
+Тесты числа запросов эндпоинтов мониторинга
+
+Каждый эндпоинт должен выполнять постоянное число SQL-запросов
+независимо от числа сессий, учеников и запросов кодов (без N+1).
+Используется временная SQLite база (aiosqlite), запросы считаются
+событием before_cursor_execute.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("fastapi")
+pytest.importorskip("aiosqlite")
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("DATABASE_URL_SYNC", "sqlite://")
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.routers import monitoring
+from database.cache import dashboard_snapshot
+from database.models import Base, CodeRequest, OlympiadCode, OlympiadSession, Student
+
+
+async def _seed(session_maker, sessions: int, students: int):
+    """Сессии с кодами и запросами кодов; последняя сессия активна"""
+    async with session_maker() as session:
+        session.add_all(
+            Student(
+                full_name=f"Ученик {i}",
+                registration_code=f"reg{i}",
+                class_number=5 + i % 7,
+                parallel="А",
+                is_registered=i % 2 == 0
+            )
+            for i in range(students)
+        )
+
+        started = datetime(2026, 9, 1)
+        olympiads = [
+            OlympiadSession(
+                subject=f"Предмет {s}",
+                date=started + timedelta(days=s),
+                is_active=s == sessions - 1,
+                uploaded_file_name=f"codes_{s}.docx"
+            )
+            for s in range(sessions)
+        ]
+        session.add_all(olympiads)
+        await session.flush()
+
+        for olympiad in olympiads:
+            for i in range(students):
+                session.add(OlympiadCode(
+                    session_id=olympiad.id,
+                    class_number=5 + i % 7,
+                    code=f"code{olympiad.id}-{i}",
+                    student_id=i + 1,
+                    is_assigned=True,
+                    is_issued=i % 3 == 0
+                ))
+                if i % 3 == 0:
+                    session.add(CodeRequest(
+                        student_id=i + 1,
+                        session_id=olympiad.id,
+                        grade=5 + i % 7,
+                        code=f"code{olympiad.id}-{i}",
+                        requested_at=olympiad.date + timedelta(minutes=i),
+                        screenshot_submitted=i % 2 == 0
+                    ))
+        await session.commit()
+
+
+def _count_queries(tmp_path, sessions: int, students: int, endpoint) -> tuple:
+    """Выполняет эндпоинт на заполненной базе; возвращает (ответ, число запросов)"""
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/monitoring_{sessions}.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        await _seed(session_maker, sessions, students)
+
+        queries = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        dashboard_snapshot.invalidate()
+        try:
+            async with session_maker() as session:
+                response = await endpoint(session)
+        finally:
+            await engine.dispose()
+        return response, len(queries)
+
+    return asyncio.run(run())
+
+
+ENDPOINTS = {
+    "dashboard": lambda session: monitoring.get_dashboard_stats(session=session),
+    "all-sessions": lambda session: monitoring.get_all_sessions_stats(session=session),
+    "recent-activity": lambda session: monitoring.get_recent_activity(limit=20, session=session),
+    "participants": lambda session: monitoring.get_active_session_participants(session=session)
+}
+
+
+@pytest.mark.parametrize("name", list(ENDPOINTS))
+def test_query_count_does_not_grow(tmp_path, name):
+    """Число запросов одинаково для маленькой и большой базы"""
+    _, small_queries = _count_queries(tmp_path, sessions=2, students=6, endpoint=ENDPOINTS[name])
+    _, large_queries = _count_queries(tmp_path, sessions=12, students=30, endpoint=ENDPOINTS[name])
+
+    assert small_queries == large_queries
+    assert large_queries <= 2
+
+
+def test_all_sessions_counters(tmp_path):
+    """Счетчики all-sessions совпадают с данными"""
+    response, _ = _count_queries(tmp_path, sessions=3, students=9, endpoint=ENDPOINTS["all-sessions"])
+
+    sessions = response["sessions"]
+    assert [s["subject"] for s in sessions] == ["Предмет 2", "Предмет 1", "Предмет 0"]
+    for s in sessions:
+        assert s["total_codes"] == 9
+        assert s["issued_codes"] == 3
+        assert s["code_requests"] == 3
+        assert s["screenshots"] == 2
+    assert [s["is_active"] for s in sessions] == [True, False, False]
+
+
+def test_participants_and_activity(tmp_path):
+    """Участники активной сессии и последняя активность берутся из JOIN"""
+    response, _ = _count_queries(tmp_path, sessions=2, students=6, endpoint=ENDPOINTS["participants"])
+
+    assert response["session"]["subject"] == "Предмет 1"
+    assert [p["full_name"] for p in response["participants"]] == ["Ученик 3", "Ученик 0"]
+    assert response["participants"][1]["class_display"] == "5А"
+
+    response, _ = _count_queries(tmp_path, sessions=2, students=6, endpoint=ENDPOINTS["recent-activity"])
+    activity = response["activity"]
+    assert len(activity) == 4
+    assert activity[0] == {
+        "id": 4,
+        "type": "code_request",
+        "student": "Ученик 3",
+        "subject": "Предмет 1",
+        "timestamp": "2026-09-02T00:03:00",
+        "screenshot": False
+    }
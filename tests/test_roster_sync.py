@@ -0,0 +1,140 @@
+"""
+Тесты сверки списка учеников (utils/roster_sync.py)
+
+Однофамильцы должны сопоставляться взаимно однозначно: повторная сверка
+того же списка ничего не добавляет и не деактивирует. Используется
+временная SQLite база (aiosqlite).
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("aiosqlite")
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("DATABASE_URL_SYNC", "sqlite://")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import Base, Student
+from utils.roster_sync import MATCH_NAME, MATCH_NAME_CLASS, sync_roster
+
+NAMESAKES = [
+    ("Иванов Иван", 5, "А"),
+    ("Иванов Иван", 5, "Б"),
+    ("Иванов Иван", 7, "А"),
+    ("Петров Петр", 6, "А"),
+]
+
+
+def _sync(tmp_path, roster, **kwargs) -> dict:
+    """Сверяет список с базой из NAMESAKES; возвращает summary"""
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/roster.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with session_maker() as session:
+            session.add_all(
+                Student(full_name=name, registration_code=f"reg{i}", class_number=class_number, parallel=parallel)
+                for i, (name, class_number, parallel) in enumerate(NAMESAKES)
+            )
+            await session.commit()
+
+        try:
+            async with session_maker() as session:
+                return await sync_roster(session, roster, preview=True, **kwargs)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def _roster(rows):
+    return [
+        {"full_name": name, "class_number": class_number, "parallel": parallel}
+        for name, class_number, parallel in rows
+    ]
+
+
+@pytest.mark.parametrize("match", [MATCH_NAME, MATCH_NAME_CLASS])
+def test_same_roster_is_unchanged(tmp_path, match):
+    """Однофамильцы из разных параллелей и классов остаются при своих учениках"""
+    diff = _sync(tmp_path, _roster(reversed(NAMESAKES)), match=match)
+
+    assert diff["summary"]["unchanged"] == len(NAMESAKES)
+    assert diff["summary"]["added"] == 0
+    assert diff["summary"]["updated"] == 0
+    assert diff["summary"]["deactivated"] == 0
+
+
+def test_namesake_moves_to_other_parallel(tmp_path):
+    """Один из однофамильцев перешел из 5Б в 5В: обновляется именно он"""
+    roster = _roster([("Иванов Иван", 5, "А"), ("Иванов Иван", 5, "В"), ("Иванов Иван", 7, "А"), ("Петров Петр", 6, "А")])
+    diff = _sync(tmp_path, roster)
+
+    assert diff["summary"] == {
+        "added": 0, "updated": 1, "deactivated": 0, "unchanged": 3, "not_found": 0, "duplicates": 0
+    }
+    assert diff["updated"][0]["old_parallel"] == "Б"
+    assert diff["updated"][0]["new_parallel"] == "В"
+
+
+def test_promotion_with_namesakes(tmp_path):
+    """Перевод в следующий класс: каждый однофамилец сопоставлен со своей строкой"""
+    roster = _roster((name, class_number + 1, parallel) for name, class_number, parallel in NAMESAKES)
+    diff = _sync(tmp_path, roster, match=MATCH_NAME_CLASS, class_offset=1)
+
+    assert diff["summary"]["updated"] == len(NAMESAKES)
+    assert diff["summary"]["added"] == 0
+    assert diff["summary"]["deactivated"] == 0
+    assert {(u["old_class"], u["old_parallel"], u["new_class"]) for u in diff["updated"]} == {
+        (5, "А", 6), (5, "Б", 6), (7, "А", 8), (6, "А", 7)
+    }
+
+
+def test_deactivated_students_are_hidden(tmp_path):
+    """Выбывшие по сверке ученики не попадают в списки и статистику"""
+    from database import crud
+    from utils import statistics
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/roster_active.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with session_maker() as session:
+            session.add_all(
+                Student(full_name=name, registration_code=f"reg{i}", class_number=class_number, parallel=parallel)
+                for i, (name, class_number, parallel) in enumerate(NAMESAKES)
+            )
+            await session.commit()
+
+        try:
+            async with session_maker() as session:
+                diff = await sync_roster(session, _roster(NAMESAKES[:3]))
+            async with session_maker() as session:
+                rows, _ = await crud.list_students(session, [Student.is_active])
+                all_rows, _ = await crud.list_students(session, [Student.is_active], active=None)
+                stats = await statistics.get_student_statistics(session)
+                by_class = await crud.get_students_by_class(session, 6, active=True)
+            return diff, rows, all_rows, stats, by_class
+        finally:
+            await engine.dispose()
+
+    diff, rows, all_rows, stats, by_class = asyncio.run(run())
+
+    assert [d["name"] for d in diff["deactivated"]] == ["Петров Петр"]
+    assert len(rows) == 3 and all(row["is_active"] for row in rows)
+    assert len(all_rows) == 4
+    assert stats.overall.total == 3
+    assert by_class == []
@@ -0,0 +1,191 @@
+"""
+Кэш проверенных сессий веб-панели
+
+AuthMiddleware и get_current_user проверяют cookie session_token на каждом
+запросе. Проверенная сессия вместе с пользователем кэшируется в процессе
+по sha256 токена (сам токен в памяти не хранится):
+- запись живет не дольше AUTH_CACHE_TTL секунд и не дольше expires_at сессии;
+- выход (/api/auth/logout) сбрасывает запись сразу, в остальных процессах
+  API - по событию TOPIC_AUTH_CHANGED;
+- изменение или удаление пользователя в боте сбрасывает кэш целиком.
+
+last_activity не пишется на каждый запрос: отметки копятся в памяти (одна,
+последняя, на сессию) и раз в ACTIVITY_FLUSH_INTERVAL секунд сохраняются
+одним пакетным UPDATE. В установившемся режиме авторизованный запрос
+не обращается к БД.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from database import events
+from database.database import AsyncSessionLocal
+from database.models import Session as DBSession, User, moscow_now
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("AUTH_ACTIVITY_FLUSH_SECONDS", "30"))
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class AuthSession:
+    """Проверенная сессия"""
+    session_id: int
+    user_id: int
+    expires_at: datetime
+    user: User  # Отсоединенный объект (только для чтения)
+
+
+class AuthSessionCache:
+    """Проверенные сессии по хэшу токена и отложенная запись last_activity"""
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL, flush_interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self.version = 0
+        # хэш токена -> (сессия, момент устаревания записи по time.monotonic)
+        self._entries: Dict[str, Tuple[AuthSession, float]] = {}
+        # id сессии -> последняя активность, еще не записанная в БД
+        self._activity: Dict[int, datetime] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def validate(self, token: str) -> Optional[AuthSession]:
+        """
+        Проверяет токен сессии и отмечает активность
+
+        Returns:
+            AuthSession или None, если сессии нет или она истекла.
+            Активность пользователя (user.is_active) проверяет вызывающий код.
+        """
+        key = token_hash(token)
+        now = moscow_now()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            auth, stale_at = entry
+            if time.monotonic() < stale_at and now < auth.expires_at:
+                self.touch(auth.session_id, now)
+                return auth
+            del self._entries[key]
+
+        version = self.version
+        auth = await self._load(token, now)
+        if auth is None:
+            return None
+
+        # Кэш сбросили во время запроса - результат мог устареть
+        if version == self.version:
+            self._entries[key] = (auth, time.monotonic() + self.ttl_seconds)
+        self.touch(auth.session_id, now)
+        return auth
+
+    async def _load(self, token: str, now: datetime) -> Optional[AuthSession]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(DBSession.id, DBSession.user_id, DBSession.expires_at, User)
+                .join(User, User.id == DBSession.user_id)
+                .where(
+                    DBSession.session_token == token,
+                    DBSession.expires_at > now
+                )
+            )
+            row = result.first()
+
+        if row is None:
+            return None
+        return AuthSession(session_id=row.id, user_id=row.user_id, expires_at=row.expires_at, user=row.User)
+
+    def touch(self, session_id: int, at: Optional[datetime] = None):
+        """Запоминает активность сессии до следующей записи в БД"""
+        self._activity[session_id] = at or moscow_now()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_forever())
+
+    async def flush(self) -> int:
+        """Записывает накопленные last_activity одним пакетным UPDATE"""
+        if not self._activity:
+            return 0
+
+        pending, self._activity = self._activity, {}
+        table = DBSession.__table__
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("session_id"))
+                    .values(last_activity=bindparam("activity")),
+                    [{"session_id": session_id, "activity": at} for session_id, at in pending.items()]
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Не удалось сохранить активность сессий: {e}")
+            # Вернем отметки, не затирая более новые
+            for session_id, at in pending.items():
+                self._activity.setdefault(session_id, at)
+            return 0
+
+        return len(pending)
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._drop_stale()
+
+    def _drop_stale(self):
+        """Удаляет устаревшие записи (к ним больше не обращались)"""
+        moment = time.monotonic()
+        now = moscow_now()
+        for key, (auth, stale_at) in list(self._entries.items()):
+            if moment >= stale_at or now >= auth.expires_at:
+                self._entries.pop(key, None)
+
+    async def stop(self):
+        """Останавливает фоновую запись и сохраняет оставшиеся отметки"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    def invalidate(self, payload: str = ""):
+        """Сбрасывает сессию по хэшу токена (или весь кэш)"""
+        self.version += 1
+        if payload:
+            self._entries.pop(payload, None)
+        else:
+            self._entries.clear()
+
+
+auth_sessions = AuthSessionCache()
+
+events.subscribe(events.TOPIC_AUTH_CHANGED, auth_sessions.invalidate)
+
+
+def forget_session(db, token: str):
+    """
+    Сбрасывает кэш сессии при выходе (после удаления сессии из БД)
+
+    Args:
+        db: Синхронная сессия БД (для уведомления других процессов)
+        token: Токен сессии
+    """
+    key = token_hash(token)
+    auth_sessions.invalidate(key)
+    events.publish_sync(db, events.TOPIC_AUTH_CHANGED, key)
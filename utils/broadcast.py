@@ -0,0 +1,356 @@
+"""
+Массовые рассылки через Telegram с ограничением скорости
+
+Лимиты Telegram: около 30 сообщений в секунду на бота и не больше
+1 сообщения в секунду в один чат. Движок:
+- ограничивает скорость token bucket'ом (общий на процесс) и паузой
+  между сообщениями в один чат;
+- отправляет параллельно ограниченным числом воркеров;
+- при 429 ждет retry_after и приостанавливает всю рассылку;
+- сохраняет прогресс (кампания, ученик) в notification_deliveries,
+  поэтому повторный запуск той же кампании не отправляет сообщение
+  тем, кто его уже получил. Доставки записывает отдельная задача сразу
+  после отправки, воркеры ее не ждут: при падении процесса повторно
+  получат сообщение только те, чья запись еще не закоммичена (сообщения,
+  отправленные за время одной записи в БД, обычно 1-2). Если прогресс
+  не сохраняется и после повторов, рассылка останавливается с
+  BroadcastPersistenceError: продолжать ее - значит разослать эти
+  сообщения повторно при следующем запуске;
+- возвращает метрики (отправлено, ошибки, повторы, скорость).
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+from sqlalchemy import select, insert
+
+from database.models import NotificationDelivery, moscow_now
+
+logger = logging.getLogger(__name__)
+
+# Повторы сохранения прогресса (пауза 1, 2, 4... секунды)
+SAVE_RETRIES = 3
+
+
+class BroadcastPersistenceError(Exception):
+    """Прогресс рассылки не сохранен - рассылка остановлена"""
+
+    def __init__(self, stats: "BroadcastStats", error: Exception):
+        super().__init__(f"Рассылка {stats.campaign} остановлена: прогресс не сохранен ({error})")
+        self.stats = stats
+
+
+@dataclass
+class BroadcastRecipient:
+    """Получатель рассылки"""
+    student_id: int
+    chat_id: str
+    text: Optional[str] = None  # Свой текст для получателя (иначе общий текст рассылки)
+    ref: Any = None  # Произвольная ссылка для вызывающего кода (например, ID запроса кода)
+
+
+@dataclass
+class BroadcastStats:
+    """Метрики рассылки"""
+    campaign: str
+    total: int = 0
+    skipped: int = 0  # Уже получили сообщение в прошлых запусках
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0  # Пользователь заблокировал бота
+    retries: int = 0  # Повторные попытки (429, сетевые ошибки)
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    delivered: List[BroadcastRecipient] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Отправлено сообщений в секунду"""
+        return self.sent / self.duration if self.duration > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "campaign": self.campaign,
+            "total": self.total,
+            "skipped": self.skipped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "retries": self.retries,
+            "duration_seconds": round(self.duration, 2),
+            "messages_per_second": round(self.rate, 2)
+        }
+
+
+class RateLimiter:
+    """
+    Token bucket на весь процесс + минимальный интервал между сообщениями в чат
+
+    Один экземпляр на процесс: одновременные рассылки делят общий лимит бота.
+    """
+
+    def __init__(self, global_rate: float = 30.0, per_chat_interval: float = 1.0):
+        self.global_rate = global_rate
+        self.capacity = global_rate
+        self.per_chat_interval = per_chat_interval
+        self._tokens = global_rate
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_last_sent: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Приостанавливает все отправки (ответ 429 от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id: str):
+        """Ждет, пока отправка в chat_id не нарушит ни один из лимитов"""
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+
+                if wait <= 0:
+                    chat_ready_at = self._chat_last_sent.get(chat_id, 0.0) + self.per_chat_interval
+                    wait = chat_ready_at - now
+
+                if wait <= 0:
+                    self._tokens = min(
+                        self.capacity,
+                        self._tokens + (now - self._updated_at) * self.global_rate
+                    )
+                    self._updated_at = now
+
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._chat_last_sent[chat_id] = now
+                        self._cleanup(now)
+                        return
+
+                    wait = (1 - self._tokens) / self.global_rate
+
+            await asyncio.sleep(wait)
+
+    def _cleanup(self, now: float):
+        if len(self._chat_last_sent) > 10000:
+            expired = now - self.per_chat_interval
+            self._chat_last_sent = {
+                chat_id: sent_at
+                for chat_id, sent_at in self._chat_last_sent.items()
+                if sent_at > expired
+            }
+
+
+# Общий лимитер процесса
+default_limiter = RateLimiter()
+
+
+class BroadcastEngine:
+    """Рассылка одного текста (или персональных текстов) списку учеников"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        session_factory=None,
+        limiter: RateLimiter = None,
+        concurrency: int = 10,
+        max_retries: int = 3
+    ):
+        """
+        Args:
+            bot: Экземпляр бота
+            session_factory: Фабрика AsyncSession для сохранения прогресса
+                (None - прогресс не сохраняется)
+            limiter: Ограничитель скорости (по умолчанию общий для процесса)
+            concurrency: Число одновременных отправок
+            max_retries: Повторы при 429 и сетевых ошибках
+        """
+        self.bot = bot
+        self.session_factory = session_factory
+        self.limiter = limiter or default_limiter
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def run(
+        self,
+        campaign: str,
+        recipients: List[BroadcastRecipient],
+        text: Optional[str] = None,
+        session_id: Optional[int] = None,
+        **send_kwargs
+    ) -> BroadcastStats:
+        """
+        Выполняет рассылку
+
+        Args:
+            campaign: Ключ кампании; повторный запуск с тем же ключом
+                пропускает уже доставленные сообщения
+            recipients: Получатели
+            text: Общий текст (если у получателя нет своего)
+            session_id: ID сессии олимпиады для записей прогресса
+            **send_kwargs: Параметры bot.send_message (parse_mode и т.п.)
+        """
+        stats = BroadcastStats(campaign=campaign, total=len(recipients))
+
+        already_sent = await self._load_delivered(campaign)
+        queue: asyncio.Queue = asyncio.Queue()
+        seen: Set[int] = set()
+        for recipient in recipients:
+            if recipient.student_id in already_sent or recipient.student_id in seen:
+                stats.skipped += 1
+                continue
+            seen.add(recipient.student_id)
+            queue.put_nowait(recipient)
+
+        pending_rows: List[Dict] = []
+        has_rows = asyncio.Event()
+        saving = asyncio.Event()  # Сброшено, пока запись прогресса повторяется после ошибки
+        saving.set()
+        sending_done = False
+
+        async def persister():
+            # Каждая запись забирает все, что доставлено за время предыдущей
+            while True:
+                await has_rows.wait()
+                has_rows.clear()
+                rows = pending_rows[:]
+                del pending_rows[:len(rows)]
+                attempt = 0
+                while True:
+                    try:
+                        await self._save_delivered(rows)
+                        break
+                    except Exception as e:
+                        attempt += 1
+                        if attempt > SAVE_RETRIES:
+                            logger.error("Рассылка %s: прогресс не сохранен (%s записей): %s", campaign, len(rows), e)
+                            saving.set()
+                            raise BroadcastPersistenceError(stats, e) from e
+                        # Пока прогресс не сохраняется, новые сообщения не отправляем
+                        saving.clear()
+                        logger.warning("Рассылка %s: ошибка сохранения прогресса, повтор %s: %s", campaign, attempt, e)
+                        await asyncio.sleep(2 ** (attempt - 1))
+                saving.set()
+                if sending_done and not pending_rows:
+                    return
+
+        async def worker():
+            while True:
+                await saving.wait()
+                if persist_task.done():
+                    # Прогресс не сохраняется - рассылка остановлена
+                    return
+                try:
+                    recipient = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                if await self._send(recipient, recipient.text or text, stats, send_kwargs):
+                    stats.sent += 1
+                    stats.delivered.append(recipient)
+                    pending_rows.append({
+                        "campaign": campaign,
+                        "session_id": session_id,
+                        "student_id": recipient.student_id,
+                        "sent_at": moscow_now()
+                    })
+                    has_rows.set()
+
+                    if stats.sent % 100 == 0:
+                        logger.info(
+                            "Рассылка %s: отправлено %s из %s (%.1f сообщ./с)",
+                            campaign, stats.sent, stats.total - stats.skipped, stats.rate
+                        )
+
+        persist_task = asyncio.create_task(persister())
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, self.concurrency))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            sending_done = True
+            has_rows.set()
+            try:
+                await persist_task
+            finally:
+                stats.finished_at = time.monotonic()
+
+        logger.info("Рассылка %s завершена: %s", campaign, stats.as_dict())
+        return stats
+
+    async def _send(self, recipient: BroadcastRecipient, text: str, stats: BroadcastStats, send_kwargs: Dict) -> bool:
+        """Отправляет одно сообщение с повторами; True - доставлено"""
+        attempt = 0
+        while True:
+            await self.limiter.acquire(recipient.chat_id)
+            try:
+                await self.bot.send_message(recipient.chat_id, text, **send_kwargs)
+                return True
+            except TelegramRetryAfter as e:
+                # Флуд-контроль действует на весь бот - приостанавливаем всех
+                self.limiter.pause(e.retry_after)
+                error = e
+            except TelegramForbiddenError:
+                stats.blocked += 1
+                stats.failed += 1
+                return False
+            except TelegramBadRequest as e:
+                logger.error("Рассылка %s: чат %s недоступен: %s", stats.campaign, recipient.chat_id, e)
+                stats.failed += 1
+                return False
+            except (TelegramNetworkError, TelegramServerError) as e:
+                await asyncio.sleep(2 ** attempt)
+                error = e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                logger.error("Рассылка %s: не доставлено в чат %s: %s", stats.campaign, recipient.chat_id, error)
+                stats.failed += 1
+                return False
+            stats.retries += 1
+
+    async def _load_delivered(self, campaign: str) -> Set[int]:
+        if self.session_factory is None:
+            return set()
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(NotificationDelivery.student_id)
+                .where(NotificationDelivery.campaign == campaign)
+            )
+            return set(result.scalars().all())
+
+    async def _save_delivered(self, rows: List[Dict]):
+        if self.session_factory is None or not rows:
+            return
+
+        async with self.session_factory() as session:
+            dialect = session.get_bind().dialect.name
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            elif dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                dialect_insert = None
+
+            if dialect_insert is not None:
+                stmt = dialect_insert(NotificationDelivery).on_conflict_do_nothing(
+                    index_elements=["campaign", "student_id"]
+                )
+            else:
+                stmt = insert(NotificationDelivery)
+
+            await session.execute(stmt, rows)
+            await session.commit()
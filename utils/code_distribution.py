@@ -3,7 +3,8 @@ from sqlalchemy import select, and_, func
 from typing import List, Dict, Tuple
 import logging
 
-from database.models import Student, OlympiadSession, OlympiadCode, DistributionMode, Grade8ReserveCode
+from database.models import Student, OlympiadSession, OlympiadCode, Grade8ReserveCode
+from utils.reserve_allocation import allocate_reserve
 
 logger = logging.getLogger(__name__)
 
@@ -45,87 +46,22 @@ class CodeDistributor:
     @staticmethod
     async def create_reserve_from_grade9(
         session: AsyncSession,
-        session_id: int
+        session_id: int,
+        dry_run: bool = False
     ) -> Dict:
         """
         Создает резерв для 8 классов из кодов 9 класса
         
-        Логика:
-        1. Получаем все коды 9 класса
-        2. Получаем количество учеников в каждом из 8 классов
-        3. Распределяем коды 9 класса между 8 классами пропорционально
-        """
-        # Получаем коды 9 класса
-        result = await session.execute(
-            select(OlympiadCode).where(
-                and_(
-                    OlympiadCode.session_id == session_id,
-                    OlympiadCode.class_number == 9,
-                    OlympiadCode.is_reserve == False
-                )
-            )
-        )
-        grade9_codes = result.scalars().all()
+        Использует тот же механизм, что и API (utils/reserve_allocation):
+        избыток кодов 9 класса делится между параллелями 8 класса
+        пропорционально численности, повторный вызов идемпотентен.
         
-        if not grade9_codes:
-            logger.info("Нет кодов 9 класса для резервирования")
-            return {}
-        
-        # Получаем учеников 8 классов
-        result = await session.execute(
-            select(
-                Student.class_number,
-                func.count(Student.id).label('count')
-            ).where(
-                and_(
-                    Student.is_active == True,
-                    Student.class_number == 8
-                )
-            ).group_by(Student.class_number)
-        )
-        
-        # Это даст нам только количество учеников 8 класса
-        # Но нам нужно распределить между всеми 8-ми классами
-        # Предполагаю, что в БД у нас 8А, 8Б и т.д. хранятся как class_number=8
-        # Если в реальности есть 8А, 8Б как отдельные классы, нужно доработать
-        
-        eighth_grade_students = dict(result.fetchall())
-        
-        if not eighth_grade_students:
-            logger.info("Нет учеников 8 классов для резервирования")
-            return {}
-        
-        total_8th_graders = sum(eighth_grade_students.values())
-        reserve_count = len(grade9_codes)
-        
-        logger.info(f"Резервирование: {reserve_count} кодов 9 класса для {total_8th_graders} учеников 8 классов")
-        
-        # Распределяем коды пропорционально
-        distribution = {}
-        codes_to_reserve = []
-        
-        for class_num, student_count in eighth_grade_students.items():
-            # Количество кодов для этого класса
-            proportion = student_count / total_8th_graders
-            codes_for_class = int(reserve_count * proportion)
-            
-            distribution[class_num] = {
-                "students": student_count,
-                "reserved_codes": codes_for_class
-            }
-            
-            # Берем нужное количество кодов
-            for _ in range(codes_for_class):
-                if grade9_codes:
-                    code = grade9_codes.pop()
-                    code.is_reserve = True
-                    code.reserved_for_class = class_num
-                    codes_to_reserve.append(code)
-        
-        await session.commit()
-        
-        logger.info(f"Зарезервировано {len(codes_to_reserve)} кодов из {reserve_count}")
-        return distribution
+        Returns:
+            Распределение {параллель: добавлено резервных кодов}
+        """
+        result = await allocate_reserve(session, session_id, dry_run=dry_run)
+        logger.info(result["message"])
+        return result["distribution"]
     
     @staticmethod
     async def distribute_codes_pre_assign(
@@ -0,0 +1,206 @@
+"""
+Потоковая загрузка кодов олимпиад в БД
+
+- iter_csv_rows читает загруженный файл порциями и отдает строки CSV,
+  не держа файл целиком в памяти;
+- CodeImporter копит коды пачками и вставляет их одним запросом:
+  * "copy" - asyncpg COPY во временную таблицу и INSERT ... SELECT
+    (только PostgreSQL + asyncpg, самый быстрый путь);
+  * "insert" - многострочный INSERT (любая БД).
+
+Повторная загрузка того же файла не создает дублей: код, который уже
+есть в сессии (session_id, code), пропускается.
+"""
+
+import codecs
+import csv
+import logging
+from typing import Awaitable, Callable, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import OlympiadCode, moscow_now
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+IMPORT_BATCH_SIZE = 5000
+
+STAGING_TABLE = "olympiad_codes_staging"
+
+
+def _detect_encoding(head: bytes) -> str:
+    """utf-8, если начало файла им декодируется, иначе windows-1251 (выгрузки из Excel)"""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "windows-1251"
+
+
+async def iter_csv_rows(
+    read: Callable[[int], Awaitable[bytes]],
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    delimiter: str = ";"
+) -> AsyncIterator[List[List[str]]]:
+    """
+    Читает CSV порциями и отдает разобранные строки пачками
+
+    Args:
+        read: Асинхронное чтение (например, UploadFile.read)
+        chunk_size: Размер порции в байтах
+        delimiter: Разделитель CSV
+
+    Yields:
+        Списки строк CSV (по одной пачке на прочитанную порцию)
+    """
+    decoder = None
+    tail = ""
+
+    while True:
+        chunk = await read(chunk_size)
+        final = not chunk
+
+        if decoder is None:
+            if final:
+                return
+            encoding = _detect_encoding(chunk)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = chunk[3:] if encoding == "utf-8" and chunk.startswith(codecs.BOM_UTF8) else chunk
+
+        data = tail + decoder.decode(chunk, final=final)
+
+        # Разбираем только завершенные строки, хвост ждет следующую порцию
+        if final:
+            lines, tail = data, ""
+        else:
+            cut = data.rfind("\n") + 1
+            lines, tail = data[:cut], data[cut:]
+
+        if lines:
+            yield list(csv.reader(lines.splitlines(keepends=True), delimiter=delimiter))
+
+        if final:
+            return
+
+
+class CodeImporter:
+    """Пакетная вставка кодов в olympiad_codes"""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        method: Optional[str] = None
+    ):
+        """
+        Args:
+            session: Сессия БД (коммит - на вызывающем коде)
+            batch_size: Размер пачки
+            method: "copy", "insert" или None - COPY, если доступен
+        """
+        self.session = session
+        self.batch_size = batch_size
+        self.method = method or ("copy" if self._copy_supported() else "insert")
+        self.inserted = 0
+        self.duplicates = 0
+        self._buffer: List[Tuple[int, int, str]] = []
+        self._staging_ready = False
+
+    def _copy_supported(self) -> bool:
+        bind = self.session.get_bind()
+        return bind.dialect.name == "postgresql" and bind.dialect.driver == "asyncpg"
+
+    async def add(self, session_id: int, class_number: int, code: str):
+        """Добавляет код; пачка вставляется, когда буфер заполнен"""
+        self._buffer.append((session_id, class_number, code))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Вставляет накопленные коды"""
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        if self.method == "copy":
+            inserted = await self._copy_batch(batch)
+        else:
+            inserted = await self._insert_batch(batch)
+
+        self.inserted += inserted
+        self.duplicates += len(batch) - inserted
+
+    def stats(self) -> Dict:
+        return {"method": self.method, "inserted": self.inserted, "duplicates": self.duplicates}
+
+    async def _copy_batch(self, batch: List[Tuple[int, int, str]]) -> int:
+        connection = await self.session.connection()
+        raw = await connection.get_raw_connection()
+        asyncpg_connection = raw.driver_connection
+
+        if not self._staging_ready:
+            await self.session.execute(text(
+                f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+                f"(session_id integer, class_number integer, code varchar(100)) ON COMMIT DROP"
+            ))
+            self._staging_ready = True
+
+        await asyncpg_connection.copy_records_to_table(
+            STAGING_TABLE, records=batch, columns=["session_id", "class_number", "code"]
+        )
+
+        # ON CONFLICT страхует от параллельной загрузки (uq_olympiad_codes_session_code)
+        result = await self.session.execute(
+            text(f"""
+                INSERT INTO olympiad_codes (session_id, class_number, code, is_assigned, is_issued, created_at)
+                SELECT DISTINCT ON (s.session_id, s.code)
+                       s.session_id, s.class_number, s.code, false, false, :created_at
+                FROM {STAGING_TABLE} s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM olympiad_codes c
+                    WHERE c.session_id = s.session_id AND c.code = s.code
+                )
+                ON CONFLICT DO NOTHING
+            """),
+            {"created_at": moscow_now()}
+        )
+        await self.session.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        return result.rowcount
+
+    async def _insert_batch(self, batch: List[Tuple[int, int, str]]) -> int:
+        # Коды, которые уже есть в сессиях пачки
+        existing: Set[Tuple[int, str]] = set()
+        codes_by_session: Dict[int, Set[str]] = {}
+        for session_id, _, code in batch:
+            codes_by_session.setdefault(session_id, set()).add(code)
+
+        for session_id, codes in codes_by_session.items():
+            result = await self.session.execute(
+                select(OlympiadCode.code).where(
+                    OlympiadCode.session_id == session_id,
+                    OlympiadCode.code.in_(codes)
+                )
+            )
+            existing.update((session_id, code) for code in result.scalars())
+
+        created_at = moscow_now()
+        rows = []
+        for session_id, class_number, code in batch:
+            key = (session_id, code)
+            if key in existing:
+                continue
+            existing.add(key)
+            rows.append({
+                "session_id": session_id,
+                "class_number": class_number,
+                "code": code,
+                "is_assigned": False,
+                "is_issued": False,
+                "created_at": created_at
+            })
+
+        if rows:
+            await self.session.execute(insert(OlympiadCode), rows)
+        return len(rows)
@@ -0,0 +1,736 @@
+"""
+Пул кодов активной олимпиады в памяти процесса бота
+
+Коды активной сессии заранее загружаются в очереди по классам (и по
+параллелям для резерва 8-классников), поэтому выдача кода - это pop из
+deque без обращения к PostgreSQL. Выданные коды записываются в БД пачками
+(write-behind) фоновой задачей.
+
+Надежность:
+- перед ответом ученику выдача дописывается в журнал (JSON Lines, fsync);
+- журнал очищается только после коммита пачки в БД;
+- при старте журнал проигрывается повторно (идемпотентно), затем пул
+  загружается заново из БД;
+- выдача, которую нельзя записать (ученик удален, код уже выдан в обход
+  пула), не блокирует остальные: она откладывается в файл отклоненных
+  выдач рядом с журналом и пишется в лог.
+
+Ограничение: пул рассчитан на ОДИН экземпляр бота. Выдача кодов в обход
+пула (второй экземпляр бота, ручные правки в БД) во время работы пула
+может привести к выдаче одного кода двум ученикам.
+
+Включается переменной окружения CODE_POOL_ENABLED=true.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, insert, bindparam, and_
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database import events
+from database.models import (
+    OlympiadCode, Grade8ReserveCode, CodeRequest, moscow_now
+)
+
+logger = logging.getLogger(__name__)
+
+KIND_CLASS = "class"
+KIND_RESERVE = "reserve"
+
+
+@dataclass
+class PoolClaim:
+    """Код, выданный из пула (еще не обязательно записанный в БД)"""
+    kind: str  # KIND_CLASS или KIND_RESERVE
+    code_id: int
+    code: str
+    session_id: int
+    student_id: int
+    grade: int  # класс олимпиады, как в CodeRequest.grade
+    owner_id: Optional[int]  # кому код был распределен заранее (Вариант 1)
+    issued_at: str  # ISO-формат, для журнала
+
+    # Совместимость с CodeRequest в сообщениях бота
+    screenshot_submitted: bool = False
+
+    def issued_at_dt(self) -> datetime:
+        return datetime.fromisoformat(self.issued_at)
+
+
+class CodePoolService:
+    """Выдача кодов из памяти с отложенной пакетной записью в БД"""
+
+    def __init__(
+        self,
+        journal_path: str = "data/code_pool_journal.jsonl",
+        flush_interval: float = 0.5,
+        batch_size: int = 200,
+        reload_interval: float = 30.0
+    ):
+        self.enabled = os.getenv("CODE_POOL_ENABLED", "false").lower() == "true"
+        self.journal_path = os.getenv("CODE_POOL_JOURNAL", journal_path)
+        self.rejected_path = os.path.splitext(self.journal_path)[0] + "_rejected.jsonl"
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.reload_interval = reload_interval
+
+        self._session_factory = None
+        self._session_id: Optional[int] = None
+
+        # Свободные коды по классам: сначала нераспределенные, затем
+        # распределенные другим ученикам
+        self._class_queues: Dict[int, Deque[Tuple[int, str, Optional[int]]]] = {}
+        # Предварительно распределенные коды: student_id -> {класс: (id, code)}
+        self._assigned: Dict[int, Dict[int, Tuple[int, str]]] = {}
+        # Резерв 9 класса для 8-классников: "8А" -> deque[(id, code)]
+        self._reserve_queues: Dict[str, Deque[Tuple[int, str]]] = {}
+        # Все id, выданные из пула с момента загрузки (ленивый пропуск в очередях)
+        self._claimed_ids: Set[Tuple[str, int]] = set()
+
+        # Выдачи, еще не записанные в БД
+        self._pending: List[PoolClaim] = []
+        self._pending_by_student: Dict[Tuple[int, int], PoolClaim] = {}
+
+        self._last_reload = 0.0
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._journal_lock = asyncio.Lock()
+        self._journal_waiters: List[Tuple[PoolClaim, asyncio.Future]] = []
+        self._journal_writing = False
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ==================== ЖИЗНЕННЫЙ ЦИКЛ ====================
+
+    async def start(self, session_factory):
+        """Восстанавливает журнал и запускает фоновую запись в БД"""
+        if not self.enabled:
+            return
+
+        self._session_factory = session_factory
+        journal_dir = os.path.dirname(self.journal_path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+
+        await self.reconcile()
+        events.subscribe(events.TOPIC_CODES_CHANGED, self._on_codes_changed)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info("Пул кодов запущен (журнал: %s)", self.journal_path)
+
+    async def stop(self):
+        """Останавливает фоновую задачу и сбрасывает остаток выдач в БД"""
+        if self._flush_task is None:
+            return
+
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+
+        await self.flush()
+        logger.info("Пул кодов остановлен")
+
+    async def reconcile(self):
+        """
+        Проигрывает журнал после перезапуска
+
+        Запись в БД идемпотентна: уже выданные коды не обновляются повторно,
+        уже существующие запросы кодов не дублируются.
+        """
+        claims = await asyncio.to_thread(self._read_journal)
+        if not claims:
+            return
+
+        logger.warning("Восстановление %s выдач кодов из журнала", len(claims))
+        await self._persist(claims, [])
+
+        await asyncio.to_thread(self._rewrite_journal, [])
+
+    # ==================== ЗАГРУЗКА ====================
+
+    async def _ensure_loaded(self, session_id: int):
+        if self._session_id != session_id:
+            async with self._load_lock:
+                if self._session_id != session_id:
+                    await self._load(session_id)
+
+    def _on_codes_changed(self, payload: str):
+        """Коды сессии загружены или перераспределены - перечитываем пул"""
+        if self._session_id is None:
+            return None
+        if not payload or int(payload) == self._session_id:
+            self._last_reload = 0.0
+            return self._reload(self._session_id)
+        return None
+
+    async def _reload(self, session_id: int) -> bool:
+        """Перечитывает пул из БД не чаще reload_interval (новые загрузки кодов)"""
+        if time.monotonic() - self._last_reload < self.reload_interval:
+            return False
+
+        async with self._load_lock:
+            if time.monotonic() - self._last_reload < self.reload_interval:
+                return True
+            await self.flush()
+            await self._load(session_id)
+        return True
+
+    async def _load(self, session_id: int):
+        """Загружает невыданные коды сессии в очереди"""
+        if self._session_id != session_id:
+            # Новая сессия - старые выдачи уже записаны или в очереди на запись
+            self._claimed_ids = set()
+
+        async with self._session_factory() as session:
+            codes = await session.execute(
+                select(OlympiadCode.id, OlympiadCode.code,
+                       OlympiadCode.class_number, OlympiadCode.student_id)
+                .where(
+                    and_(
+                        OlympiadCode.session_id == session_id,
+                        OlympiadCode.is_issued == False,
+                        OlympiadCode.is_reserve == False
+                    )
+                )
+                .order_by(OlympiadCode.id)
+            )
+            reserve = await session.execute(
+                select(Grade8ReserveCode.id, Grade8ReserveCode.code,
+                       Grade8ReserveCode.class_parallel)
+                .where(
+                    and_(
+                        Grade8ReserveCode.session_id == session_id,
+                        Grade8ReserveCode.is_used == False
+                    )
+                )
+                .order_by(Grade8ReserveCode.id)
+            )
+
+            class_free: Dict[int, List] = {}
+            class_owned: Dict[int, List] = {}
+            assigned: Dict[int, Dict[int, Tuple[int, str]]] = {}
+            for row in codes:
+                if (KIND_CLASS, row.id) in self._claimed_ids:
+                    continue
+                if row.student_id is None:
+                    class_free.setdefault(row.class_number, []).append((row.id, row.code, None))
+                else:
+                    class_owned.setdefault(row.class_number, []).append((row.id, row.code, row.student_id))
+                    assigned.setdefault(row.student_id, {}).setdefault(
+                        row.class_number, (row.id, row.code)
+                    )
+
+            reserve_queues: Dict[str, Deque[Tuple[int, str]]] = {}
+            for row in reserve:
+                if (KIND_RESERVE, row.id) in self._claimed_ids:
+                    continue
+                reserve_queues.setdefault(row.class_parallel, deque()).append((row.id, row.code))
+
+        class_queues = {}
+        for class_number in set(class_free) | set(class_owned):
+            class_queues[class_number] = deque(
+                class_free.get(class_number, []) + class_owned.get(class_number, [])
+            )
+
+        self._class_queues = class_queues
+        self._assigned = assigned
+        self._reserve_queues = reserve_queues
+        self._session_id = session_id
+        self._last_reload = time.monotonic()
+
+        logger.info(
+            "Пул кодов загружен: сессия %s, кодов %s, резерв %s",
+            session_id,
+            sum(len(q) for q in class_queues.values()),
+            sum(len(q) for q in reserve_queues.values())
+        )
+
+    # ==================== ВЫДАЧА ====================
+
+    def _peek_class(self, class_number: int):
+        """Первый невыданный код класса (выданные выбрасываются лениво)"""
+        queue = self._class_queues.get(class_number)
+        while queue:
+            code_id, code, owner_id = queue[0]
+            if (KIND_CLASS, code_id) not in self._claimed_ids:
+                return queue
+            queue.popleft()
+        return None
+
+    def _take_class_code(self, class_number: int, student_id: int):
+        own = self._assigned.get(student_id, {}).get(class_number)
+        if own and (KIND_CLASS, own[0]) not in self._claimed_ids:
+            return own[0], own[1], student_id
+
+        queue = self._peek_class(class_number)
+        if queue is None:
+            return None
+        return queue.popleft()
+
+    def _take_reserve_code(self, class_parallel: str):
+        queue = self._reserve_queues.get(class_parallel)
+        while queue:
+            code_id, code = queue.popleft()
+            if (KIND_RESERVE, code_id) not in self._claimed_ids:
+                return code_id, code
+        return None
+
+    def get_pending_claim(self, session_id: int, student_id: int) -> Optional[PoolClaim]:
+        """Выдача ученику, которая еще не записана в БД"""
+        return self._pending_by_student.get((session_id, student_id))
+
+    async def find_nearest_available_class(
+        self,
+        session_id: int,
+        student_id: int,
+        start_class: int
+    ) -> Optional[int]:
+        """Ближайший класс от start_class до 11, в котором есть код для ученика"""
+        await self._ensure_loaded(session_id)
+
+        for class_number in range(start_class, 12):
+            own = self._assigned.get(student_id, {}).get(class_number)
+            if own and (KIND_CLASS, own[0]) not in self._claimed_ids:
+                return class_number
+            if self._peek_class(class_number) is not None:
+                return class_number
+
+        if await self._reload(session_id):
+            for class_number in range(start_class, 12):
+                if self._peek_class(class_number) is not None:
+                    return class_number
+
+        return None
+
+    async def count_available_reserve_codes_for_grade8(
+        self,
+        session_id: int,
+        class_parallel: str
+    ) -> int:
+        """Оценка количества свободных резервных кодов параллели"""
+        await self._ensure_loaded(session_id)
+        return len(self._reserve_queues.get(class_parallel, ()))
+
+    async def claim_olympiad_code(
+        self,
+        session_id: int,
+        class_number: int,
+        student_id: int
+    ) -> Optional[PoolClaim]:
+        """Выдает код класса из пула (аналог crud.claim_olympiad_code)"""
+        await self._ensure_loaded(session_id)
+
+        existing = self.get_pending_claim(session_id, student_id)
+        if existing:
+            return existing
+
+        taken = self._take_class_code(class_number, student_id)
+        if taken is None and await self._reload(session_id):
+            existing = self.get_pending_claim(session_id, student_id)
+            if existing:
+                return existing
+            taken = self._take_class_code(class_number, student_id)
+        if taken is None:
+            return None
+
+        code_id, code, owner_id = taken
+        return await self._register_claim(PoolClaim(
+            kind=KIND_CLASS,
+            code_id=code_id,
+            code=code,
+            session_id=session_id,
+            student_id=student_id,
+            grade=class_number,
+            owner_id=owner_id,
+            issued_at=moscow_now().isoformat()
+        ))
+
+    async def claim_reserve_code_for_grade8(
+        self,
+        session_id: int,
+        class_parallel: str,
+        student_id: int
+    ) -> Optional[PoolClaim]:
+        """Выдает резервный код 9 класса из пула (аналог crud.claim_reserve_code_for_grade8)"""
+        await self._ensure_loaded(session_id)
+
+        existing = self.get_pending_claim(session_id, student_id)
+        if existing:
+            return existing
+
+        taken = self._take_reserve_code(class_parallel)
+        if taken is None and await self._reload(session_id):
+            existing = self.get_pending_claim(session_id, student_id)
+            if existing:
+                return existing
+            taken = self._take_reserve_code(class_parallel)
+        if taken is None:
+            return None
+
+        code_id, code = taken
+        return await self._register_claim(PoolClaim(
+            kind=KIND_RESERVE,
+            code_id=code_id,
+            code=code,
+            session_id=session_id,
+            student_id=student_id,
+            grade=9,
+            owner_id=None,
+            issued_at=moscow_now().isoformat()
+        ))
+
+    async def _register_claim(self, claim: PoolClaim) -> PoolClaim:
+        """Фиксирует выдачу в памяти и журнале (до ответа ученику)"""
+        self._claimed_ids.add((claim.kind, claim.code_id))
+        self._pending.append(claim)
+        self._pending_by_student[(claim.session_id, claim.student_id)] = claim
+
+        await self._journal_claim(claim)
+
+        if len(self._pending) >= self.batch_size:
+            self._flush_event.set()
+
+        return claim
+
+    # ==================== ЗАПИСЬ В БД ====================
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Ошибка записи выдач кодов в БД: %s", e)
+
+    async def flush(self):
+        """
+        Записывает накопленные выдачи в БД
+
+        Записанные и отклоненные выдачи убираются из очереди и журнала;
+        при ошибке соединения с БД очередь остается до следующей попытки.
+        """
+        if not self._pending or self._session_factory is None:
+            return
+
+        async with self._flush_lock:
+            batch = self._pending[:]
+            if not batch:
+                return
+
+            done: List[PoolClaim] = []
+            try:
+                await self._persist(batch, done)
+            finally:
+                if done:
+                    self._forget(done)
+                    async with self._journal_lock:
+                        await asyncio.to_thread(self._rewrite_journal, self._pending[:])
+
+    async def _persist(self, claims: List[PoolClaim], done: List[PoolClaim]):
+        """
+        Пишет выдачи одной транзакцией, при ошибке данных - по одной
+
+        Выдача, которая не записывается и по одной (ученик удален,
+        нарушено ограничение) или чей код уже выдан другому, откладывается
+        в файл отклоненных. Обработанные выдачи добавляются в done.
+        Ошибки соединения пробрасываются.
+        """
+        try:
+            rejected = await self._write_batch(claims)
+        except (IntegrityError, DataError) as e:
+            logger.warning(
+                "Пачка из %s выдач кодов не записана (%s), запись по одной",
+                len(claims), e.orig if e.orig is not None else e
+            )
+        else:
+            await self._reject(rejected, "код уже выдан другому ученику")
+            done.extend(claims)
+            return
+
+        for claim in claims:
+            try:
+                rejected = await self._write_batch([claim])
+                reason = "код уже выдан другому ученику"
+            except (IntegrityError, DataError) as e:
+                rejected = [claim]
+                reason = str(e.orig if e.orig is not None else e)
+            await self._reject(rejected, reason)
+            done.append(claim)
+
+    async def _write_batch(self, claims: List[PoolClaim]) -> List[PoolClaim]:
+        """Одна транзакция записи; возвращает выдачи с уже занятыми кодами"""
+        async with self._session_factory() as session:
+            rejected = await self._write_claims(session, claims)
+            await session.commit()
+            written = {claim.session_id for claim in claims if claim not in rejected}
+            for session_id in written:
+                events.publish_coalesced(session, events.TOPIC_ACTIVITY, session_id)
+        return rejected
+
+    async def _reject(self, claims: List[PoolClaim], reason: str):
+        """Откладывает незаписываемые выдачи в файл отклоненных"""
+        if not claims:
+            return
+
+        for claim in claims:
+            logger.error(
+                "Выдача кода %s ученику %s (сессия %s) не записана: %s",
+                claim.code, claim.student_id, claim.session_id, reason
+            )
+        await asyncio.to_thread(self._append_rejected, claims, reason)
+
+    def _forget(self, claims: List[PoolClaim]):
+        """Убирает обработанные выдачи из очереди на запись"""
+        processed = {id(claim) for claim in claims}
+        self._pending = [claim for claim in self._pending if id(claim) not in processed]
+        for claim in claims:
+            key = (claim.session_id, claim.student_id)
+            if self._pending_by_student.get(key) is claim:
+                del self._pending_by_student[key]
+
+    @staticmethod
+    async def _write_claims(session, claims: List[PoolClaim]) -> List[PoolClaim]:
+        """
+        Пакетная идемпотентная запись выдач (коды + запросы кодов)
+
+        Запрос кода пишется только для выдач, чей код отмечен выданным
+        именно этой выдачей (issued_at и ученик совпадают - в том числе при
+        повторном проигрывании журнала). Остальные выдачи возвращаются:
+        их код успели выдать в обход пула.
+        """
+        conn = await session.connection()
+        claimed: Set[Tuple[str, int]] = set()
+
+        class_claims = [c for c in claims if c.kind == KIND_CLASS]
+        if class_claims:
+            codes_table = OlympiadCode.__table__
+            await conn.execute(
+                update(codes_table)
+                .where(
+                    and_(
+                        codes_table.c.id == bindparam("b_id"),
+                        codes_table.c.is_issued.isnot(True)
+                    )
+                )
+                .values(
+                    is_issued=True,
+                    issued_at=bindparam("b_issued_at"),
+                    student_id=bindparam("b_student_id")
+                ),
+                [
+                    {
+                        "b_id": c.code_id,
+                        "b_issued_at": c.issued_at_dt(),
+                        "b_student_id": c.owner_id or c.student_id
+                    }
+                    for c in class_claims
+                ]
+            )
+            result = await conn.execute(
+                select(codes_table.c.id, codes_table.c.issued_at, codes_table.c.student_id)
+                .where(
+                    and_(
+                        codes_table.c.id.in_([c.code_id for c in class_claims]),
+                        codes_table.c.is_issued == True
+                    )
+                )
+            )
+            issued = {row.id: row for row in result}
+            for c in class_claims:
+                row = issued.get(c.code_id)
+                if (row is not None and row.issued_at == c.issued_at_dt()
+                        and row.student_id == (c.owner_id or c.student_id)):
+                    claimed.add((KIND_CLASS, c.code_id))
+
+        reserve_claims = [c for c in claims if c.kind == KIND_RESERVE]
+        if reserve_claims:
+            reserve_table = Grade8ReserveCode.__table__
+            await conn.execute(
+                update(reserve_table)
+                .where(
+                    and_(
+                        reserve_table.c.id == bindparam("b_id"),
+                        reserve_table.c.is_used.isnot(True)
+                    )
+                )
+                .values(
+                    is_used=True,
+                    used_at=bindparam("b_used_at"),
+                    used_by_student_id=bindparam("b_student_id")
+                ),
+                [
+                    {
+                        "b_id": c.code_id,
+                        "b_used_at": c.issued_at_dt(),
+                        "b_student_id": c.student_id
+                    }
+                    for c in reserve_claims
+                ]
+            )
+            result = await conn.execute(
+                select(reserve_table.c.id, reserve_table.c.used_at, reserve_table.c.used_by_student_id)
+                .where(
+                    and_(
+                        reserve_table.c.id.in_([c.code_id for c in reserve_claims]),
+                        reserve_table.c.is_used == True
+                    )
+                )
+            )
+            used = {row.id: row for row in result}
+            for c in reserve_claims:
+                row = used.get(c.code_id)
+                if (row is not None and row.used_at == c.issued_at_dt()
+                        and row.used_by_student_id == c.student_id):
+                    claimed.add((KIND_RESERVE, c.code_id))
+
+        rejected = [c for c in claims if (c.kind, c.code_id) not in claimed]
+        claims = [c for c in claims if (c.kind, c.code_id) in claimed]
+        if not claims:
+            return rejected
+
+        # Запросы кодов: пропускаем уже записанные (повторное проигрывание журнала)
+        existing = set()
+        for session_id in {c.session_id for c in claims}:
+            student_ids = [c.student_id for c in claims if c.session_id == session_id]
+            result = await conn.execute(
+                select(CodeRequest.student_id).where(
+                    and_(
+                        CodeRequest.session_id == session_id,
+                        CodeRequest.student_id.in_(student_ids)
+                    )
+                )
+            )
+            existing.update((session_id, student_id) for student_id in result.scalars())
+
+        rows = []
+        for c in claims:
+            key = (c.session_id, c.student_id)
+            if key in existing:
+                continue
+            existing.add(key)
+            rows.append({
+                "student_id": c.student_id,
+                "session_id": c.session_id,
+                "grade": c.grade,
+                "code": c.code,
+                "requested_at": c.issued_at_dt(),
+                "screenshot_submitted": False
+            })
+
+        if rows:
+            # Страховка от запроса, записанного в обход пула (уникальный индекс)
+            dialect = conn.dialect.name
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            elif dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                dialect_insert = None
+
+            if dialect_insert is not None:
+                stmt = dialect_insert(CodeRequest.__table__).on_conflict_do_nothing(
+                    index_elements=["student_id", "session_id"]
+                )
+            else:
+                stmt = insert(CodeRequest.__table__)
+
+            await conn.execute(stmt, rows)
+
+        return rejected
+
+    # ==================== ЖУРНАЛ ====================
+
+    async def _journal_claim(self, claim: PoolClaim):
+        """
+        Дописывает выдачу в журнал и ждет fsync
+
+        Одновременные выдачи объединяются в одну запись с одним fsync
+        (group commit), чтобы пиковая нагрузка не упиралась в диск.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._journal_waiters.append((claim, waiter))
+
+        if not self._journal_writing:
+            self._journal_writing = True
+            asyncio.create_task(self._journal_writer())
+
+        await waiter
+
+    async def _journal_writer(self):
+        try:
+            while self._journal_waiters:
+                batch, self._journal_waiters = self._journal_waiters, []
+                try:
+                    async with self._journal_lock:
+                        await asyncio.to_thread(
+                            self._append_journal, [claim for claim, _ in batch]
+                        )
+                except Exception as e:
+                    for _, waiter in batch:
+                        waiter.set_exception(e)
+                    continue
+
+                for _, waiter in batch:
+                    waiter.set_result(None)
+        finally:
+            self._journal_writing = False
+
+    def _append_journal(self, claims: List[PoolClaim]):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            for claim in claims:
+                f.write(json.dumps(asdict(claim), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_journal(self, claims: List[PoolClaim]):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for claim in claims:
+                f.write(json.dumps(asdict(claim), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _append_rejected(self, claims: List[PoolClaim], reason: str):
+        rejected_at = moscow_now().isoformat()
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            for claim in claims:
+                entry = dict(asdict(claim), reason=reason, rejected_at=rejected_at)
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_journal(self) -> List[PoolClaim]:
+        if not os.path.exists(self.journal_path):
+            return []
+
+        claims = []
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    claims.append(PoolClaim(**json.loads(line)))
+                except (ValueError, TypeError):
+                    # Оборванная последняя строка при аварийной остановке
+                    logger.warning("Пропущена поврежденная строка журнала пула кодов")
+        return claims
+
+
+code_pool = CodePoolService()
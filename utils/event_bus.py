@@ -0,0 +1,179 @@
+"""
+Живая лента дашборда (Server-Sent Events)
+
+Панель администратора раньше опрашивала /api/monitoring/dashboard и
+recent-activity по таймеру из каждой вкладки. Теперь вкладки подписываются
+на /api/monitoring/stream, а данные готовит ОДИН производитель на процесс:
+- события выдачи кодов, скриншотов и регистраций приходят из бота через
+  PostgreSQL NOTIFY (database/events.py; выдачи объединяются в одно
+  событие в секунду) и только помечают ленту устаревшей;
+- производитель, выждав DEBOUNCE секунд (пачка событий - одно обновление),
+  выполняет запросы статистики и активности один раз на всех подписчиков -
+  мимо снимка dashboard_snapshot, который по выдачам кодов не сбрасывается;
+- подписчикам рассылаются только изменения: разделы статистики, которые
+  поменялись, и новые/измененные строки активности;
+- без событий данные перечитываются раз в REFRESH_INTERVAL секунд
+  (потерянные уведомления, БД без NOTIFY).
+
+Производитель работает, только пока есть подписчики.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from database import crud, events
+from database.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("DASHBOARD_STREAM_REFRESH_SECONDS", "30"))
+DEBOUNCE = float(os.getenv("DASHBOARD_STREAM_DEBOUNCE_SECONDS", "1"))
+HEARTBEAT_INTERVAL = 15.0
+ACTIVITY_LIMIT = 10
+QUEUE_SIZE = 100
+RETRY_MS = 5000
+
+
+def encode_event(event: str, data) -> str:
+    """Сообщение SSE"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class DashboardFeed:
+    """Общий производитель обновлений дашборда и его подписчики"""
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL, debounce: float = DEBOUNCE):
+        self.refresh_interval = refresh_interval
+        self.debounce = debounce
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._producer: Optional[asyncio.Task] = None
+        self._dirty = asyncio.Event()
+        self._loaded = asyncio.Event()
+        # Последнее разосланное состояние
+        self._dashboard: Optional[Dict] = None
+        self._activity: List[Dict] = []
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def notify(self, payload: str = ""):
+        """Данные изменились (обработчик событий БД)"""
+        self._dirty.set()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """
+        Поток сообщений SSE для одного клиента
+
+        Первым приходит текущее состояние целиком, затем изменения;
+        при отсутствии изменений - комментарий-пинг раз в HEARTBEAT_INTERVAL.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(queue)
+        self._start()
+        try:
+            await self._loaded.wait()
+            yield f"retry: {RETRY_MS}\n\n"
+            for message in self._snapshot():
+                yield message
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    message = ": ping\n\n"
+                yield message
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers:
+                await self.stop()
+
+    def _snapshot(self) -> List[str]:
+        return [
+            encode_event("dashboard", self._dashboard),
+            encode_event("activity", {"items": self._activity, "reset": True})
+        ]
+
+    def _broadcast(self, messages: List[str]):
+        for queue in list(self._subscribers):
+            if queue.qsize() + len(messages) > queue.maxsize:
+                # Клиент не успевает читать - вместо накопленных изменений отдаем состояние целиком
+                while not queue.empty():
+                    queue.get_nowait()
+                messages_for_queue = self._snapshot()
+            else:
+                messages_for_queue = messages
+            for message in messages_for_queue:
+                queue.put_nowait(message)
+
+    def _start(self):
+        if self._producer is None or self._producer.done():
+            self._producer = asyncio.get_running_loop().create_task(self._produce())
+
+    async def stop(self):
+        """Останавливает производителя (последний подписчик ушел или остановка API)"""
+        producer, self._producer = self._producer, None
+        if producer is not None and producer is not asyncio.current_task():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+        self._loaded.clear()
+        self._dashboard = None
+        self._activity = []
+
+    async def _produce(self):
+        while True:
+            self._dirty.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка обновления ленты дашборда: {e}")
+
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.refresh_interval)
+                # Пачка событий (массовая выдача) - одно обновление
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh(self):
+        """Перечитывает статистику и активность и рассылает изменения"""
+        async with AsyncSessionLocal() as session:
+            dashboard = await crud.get_dashboard_stats(session)
+            activity = await crud.get_recent_activity(session, ACTIVITY_LIMIT)
+
+        if not self._loaded.is_set():
+            self._dashboard, self._activity = dashboard, activity
+            self._loaded.set()
+            return
+
+        messages = []
+
+        changed = {key: value for key, value in dashboard.items() if self._dashboard.get(key) != value}
+        if changed:
+            messages.append(encode_event("dashboard", changed))
+
+        previous = {item["id"]: item for item in self._activity}
+        updated = [item for item in activity if previous.get(item["id"]) != item]
+        if updated:
+            messages.append(encode_event("activity", {"items": updated, "reset": False}))
+
+        self._dashboard, self._activity = dashboard, activity
+        if messages:
+            self._broadcast(messages)
+
+
+dashboard_feed = DashboardFeed()
+
+for _topic in (
+    events.TOPIC_ACTIVITY,
+    events.TOPIC_STUDENTS_CHANGED,
+    events.TOPIC_CODES_CHANGED,
+    events.TOPIC_ACTIVE_SESSION,
+):
+    events.subscribe(_topic, dashboard_feed.notify)
@@ -1,17 +1,286 @@
 """
-Модуль для экспорта данных в Excel
+Модуль для экспорта данных в Excel и CSV
+
+Таблицы (ученики, олимпиады) выгружаются одним движком, общим для API и бота:
+- строки читаются из БД курсором на сервере (stream + yield_per) только
+  нужными колонками, без загрузки ORM объектов целиком;
+- пишутся пачками в рабочем потоке в openpyxl write_only или csv;
+- ширина колонок считается по первым строкам (выборке), а не по всем ячейкам;
+- результат - временный файл (ExportFile): его можно отдать потоком
+  в StreamingResponse или отправить ботом как FSInputFile.
+
+Память при этом не зависит от числа строк.
 """
+import asyncio
+import csv
 import io
-from typing import List
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Any, Callable, Iterator, List, Mapping, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import OlympiadSession, Student
+
 try:
     from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, Alignment, PatternFill
     from openpyxl.utils import get_column_letter
     OPENPYXL_AVAILABLE = True
 except ImportError:
     OPENPYXL_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+WIDTH_SAMPLE_ROWS = 500
+MAX_COLUMN_WIDTH = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+def _format_datetime(value, fmt: str):
+    """Дата из datetime или строки ISO (старый формат словарей)"""
+    if value and isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime(fmt) if value else None
+
+
+def _student_row(student: Mapping) -> list:
+    return [
+        student.get("id"),
+        student.get("full_name"),
+        student.get("class_number"),
+        student.get("parallel"),
+        student.get("registration_code"),
+        "Да" if student.get("is_registered") else "Нет",
+        student.get("telegram_id") or "-",
+        _format_datetime(student.get("created_at"), "%d.%m.%Y %H:%M"),
+        _format_datetime(student.get("registered_at"), "%d.%m.%Y %H:%M") or "-"
+    ]
+
+
+def _olympiad_row(olympiad: Mapping) -> list:
+    return [
+        olympiad.get("id"),
+        olympiad.get("subject"),
+        olympiad.get("class_number") or "Разные",
+        _format_datetime(olympiad.get("date"), "%d.%m.%Y"),
+        olympiad.get("stage") or "-",
+        "Да" if olympiad.get("is_active") else "Нет",
+        olympiad.get("uploaded_file_name") or "-",
+        _format_datetime(olympiad.get("upload_time"), "%d.%m.%Y %H:%M")
+    ]
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    """Описание выгружаемой таблицы"""
+    name: str                                  # Имя файла без расширения
+    title: str                                 # Название листа
+    headers: Sequence[str]
+    header_fill: str
+    columns: Sequence[Any]                     # Колонки запроса (ключи строки - их имена)
+    order_by: Sequence[Any]
+    format_row: Callable[[Mapping], list]
+
+
+STUDENTS_TABLE = ExportTable(
+    name="students",
+    title="Ученики",
+    headers=["ID", "ФИО", "Класс", "Параллель", "Код регистрации", "Зарегистрирован", "Telegram ID", "Дата создания", "Дата регистрации"],
+    header_fill="4472C4",
+    columns=[
+        Student.id, Student.full_name, Student.class_number, Student.parallel,
+        Student.registration_code, Student.is_registered, Student.telegram_id,
+        Student.created_at, Student.registered_at
+    ],
+    order_by=[Student.id],
+    format_row=_student_row
+)
+
+OLYMPIADS_TABLE = ExportTable(
+    name="olympiads",
+    title="Олимпиады",
+    headers=["ID", "Предмет", "Класс", "Дата проведения", "Этап", "Активна", "Файл", "Дата загрузки"],
+    header_fill="70AD47",
+    columns=[
+        OlympiadSession.id, OlympiadSession.subject, OlympiadSession.class_number,
+        OlympiadSession.date, OlympiadSession.stage, OlympiadSession.is_active,
+        OlympiadSession.uploaded_file_name, OlympiadSession.upload_time
+    ],
+    order_by=[OlympiadSession.id],
+    format_row=_olympiad_row
+)
+
+
+def column_widths(headers: Sequence[str], sample: Sequence[list]) -> List[int]:
+    """Ширина колонок по заголовкам и выборке строк (не больше MAX_COLUMN_WIDTH)"""
+    widths = [len(str(header)) for header in headers]
+    for row in sample:
+        for col, value in enumerate(row):
+            if value:
+                widths[col] = max(widths[col], len(str(value)))
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+class _XlsxWriter:
+    """Лист write_only: первые строки копятся для расчета ширины колонок"""
+
+    def __init__(self, fileobj, table: ExportTable):
+        if not OPENPYXL_AVAILABLE:
+            raise ImportError("openpyxl не установлен. Установите: pip install openpyxl")
+        self.fileobj = fileobj
+        self.table = table
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(table.title)
+        self.sample: Optional[List[list]] = []
+
+    def write(self, rows: List[list]):
+        if self.sample is not None:
+            self.sample.extend(rows)
+            if len(self.sample) < WIDTH_SAMPLE_ROWS:
+                return
+            rows, self.sample = self._start(self.sample), None
+        for row in rows:
+            self.ws.append(row)
+
+    def _start(self, sample: List[list]) -> List[list]:
+        """Ширина колонок и заголовки (до первой строки данных)"""
+        widths = column_widths(self.table.headers, sample[:WIDTH_SAMPLE_ROWS])
+        for col, width in enumerate(widths, 1):
+            self.ws.column_dimensions[get_column_letter(col)].width = width
+
+        header_fill = PatternFill(start_color=self.table.header_fill, end_color=self.table.header_fill, fill_type="solid")
+        header_font = Font(bold=True, color="FFFFFF")
+        header_alignment = Alignment(horizontal="center", vertical="center")
+
+        header = []
+        for value in self.table.headers:
+            cell = WriteOnlyCell(self.ws, value=value)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = header_alignment
+            header.append(cell)
+        self.ws.append(header)
+        return sample
+
+    def close(self):
+        if self.sample is not None:
+            for row in self._start(self.sample):
+                self.ws.append(row)
+            self.sample = None
+        self.wb.save(self.fileobj)
+
+
+class _CsvWriter:
+    """CSV с BOM (для корректного открытия в Excel)"""
+
+    def __init__(self, fileobj, table: ExportTable):
+        self.stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(table.headers)
+
+    def write(self, rows: List[list]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.stream.flush()
+        self.stream.detach()
+
+
+_WRITERS = {"xlsx": _XlsxWriter, "csv": _CsvWriter}
+_MEDIA_TYPES = {"xlsx": XLSX_MEDIA_TYPE, "csv": CSV_MEDIA_TYPE}
+
+
+@dataclass
+class ExportFile:
+    """Готовая выгрузка во временном файле"""
+    path: str
+    filename: str
+    media_type: str
+    rows: int
+
+    def iter_chunks(self, remove: bool = True) -> Iterator[bytes]:
+        """Читает файл порциями (для StreamingResponse); после чтения удаляет его"""
+        try:
+            with open(self.path, "rb") as f:
+                while chunk := f.read(STREAM_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            if remove:
+                self.remove()
+
+    def input_file(self):
+        """Файл для отправки ботом (aiogram FSInputFile)"""
+        from aiogram.types import FSInputFile
+        return FSInputFile(self.path, filename=self.filename)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+async def export_table(session: AsyncSession, table: ExportTable, fmt: str = "xlsx") -> ExportFile:
+    """
+    Выгружает таблицу во временный файл
+
+    Args:
+        session: Сессия БД
+        table: Описание таблицы (STUDENTS_TABLE, OLYMPIADS_TABLE)
+        fmt: "xlsx" или "csv"
+
+    Returns:
+        ExportFile; удалить файл - iter_chunks() (после отдачи) или remove()
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    fd, path = tempfile.mkstemp(prefix=f"{table.name}_", suffix=f".{fmt}")
+    rows = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer = _WRITERS[fmt](f, table)
+
+            statement = (
+                select(*table.columns)
+                .order_by(*table.order_by)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            result = await session.stream(statement)
+            async for partition in result.mappings().partitions():
+                batch = [table.format_row(row) for row in partition]
+                await asyncio.to_thread(writer.write, batch)
+                rows += len(batch)
+
+            await asyncio.to_thread(writer.close)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    logger.info(f"Выгрузка {table.name}.{fmt}: {rows} строк")
+    return ExportFile(path=path, filename=f"{table.name}.{fmt}", media_type=_MEDIA_TYPES[fmt], rows=rows)
+
+
+def write_table(table: ExportTable, items: Sequence[Mapping], fmt: str = "xlsx") -> io.BytesIO:
+    """Выгрузка уже загруженных данных (список словарей) в память"""
+    output = io.BytesIO()
+    writer = _WRITERS[fmt](output, table)
+    for start in range(0, len(items), EXPORT_BATCH_SIZE):
+        writer.write([table.format_row(item) for item in items[start:start + EXPORT_BATCH_SIZE]])
+    writer.close()
+    output.seek(0)
+    return output
+
 
 class ExcelExporter:
     """Класс для экспорта данных в Excel"""
@@ -27,133 +296,12 @@ class ExcelExporter:
         Returns:
             BytesIO объект с Excel файлом
         """
-        if not OPENPYXL_AVAILABLE:
-            raise ImportError("openpyxl не установлен. Установите: pip install openpyxl")
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Ученики"
-
-        # Заголовки
-        headers = ["ID", "ФИО", "Класс", "Параллель", "Код регистрации", "Зарегистрирован", "Telegram ID", "Дата создания", "Дата регистрации"]
-
-        # Стилизация заголовков
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-
-        # Данные
-        for row, student in enumerate(students, 2):
-            ws.cell(row=row, column=1, value=student.get("id"))
-            ws.cell(row=row, column=2, value=student.get("full_name"))
-            ws.cell(row=row, column=3, value=student.get("class_number"))
-            ws.cell(row=row, column=4, value=student.get("parallel"))
-            ws.cell(row=row, column=5, value=student.get("registration_code"))
-            ws.cell(row=row, column=6, value="Да" if student.get("is_registered") else "Нет")
-            ws.cell(row=row, column=7, value=student.get("telegram_id") or "-")
-
-            # Форматирование дат
-            created_at = student.get("created_at")
-            if created_at and isinstance(created_at, str):
-                created_at = datetime.fromisoformat(created_at).strftime("%d.%m.%Y %H:%M")
-            ws.cell(row=row, column=8, value=created_at)
-
-            registered_at = student.get("registered_at")
-            if registered_at and isinstance(registered_at, str):
-                registered_at = datetime.fromisoformat(registered_at).strftime("%d.%m.%Y %H:%M")
-            ws.cell(row=row, column=9, value=registered_at or "-")
-
-        # Автоматическая ширина колонок
-        for col in range(1, len(headers) + 1):
-            max_length = 0
-            column = get_column_letter(col)
-
-            for cell in ws[column]:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-
-        # Сохранение в BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        return output
+        return write_table(STUDENTS_TABLE, students)
 
     @staticmethod
     def export_olympiads(olympiads: List[dict]) -> io.BytesIO:
         """Экспортирует список олимпиад в Excel"""
-        if not OPENPYXL_AVAILABLE:
-            raise ImportError("openpyxl не установлен. Установите: pip install openpyxl")
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Олимпиады"
-
-        # Заголовки
-        headers = ["ID", "Предмет", "Класс", "Дата проведения", "Этап", "Активна", "Файл", "Дата загрузки"]
-
-        # Стилизация заголовков
-        header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-
-        # Данные
-        for row, olympiad in enumerate(olympiads, 2):
-            ws.cell(row=row, column=1, value=olympiad.get("id"))
-            ws.cell(row=row, column=2, value=olympiad.get("subject"))
-            ws.cell(row=row, column=3, value=olympiad.get("class_number") or "Разные")
-
-            # Форматирование даты
-            date = olympiad.get("date")
-            if date and isinstance(date, str):
-                date = datetime.fromisoformat(date).strftime("%d.%m.%Y")
-            ws.cell(row=row, column=4, value=date)
-
-            ws.cell(row=row, column=5, value=olympiad.get("stage") or "-")
-            ws.cell(row=row, column=6, value="Да" if olympiad.get("is_active") else "Нет")
-            ws.cell(row=row, column=7, value=olympiad.get("uploaded_file_name") or "-")
-
-            # Дата загрузки
-            upload_time = olympiad.get("upload_time")
-            if upload_time and isinstance(upload_time, str):
-                upload_time = datetime.fromisoformat(upload_time).strftime("%d.%m.%Y %H:%M")
-            ws.cell(row=row, column=8, value=upload_time)
-
-        # Автоматическая ширина колонок
-        for col in range(1, len(headers) + 1):
-            max_length = 0
-            column = get_column_letter(col)
-
-            for cell in ws[column]:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-
-        # Сохранение в BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        return output
+        return write_table(OLYMPIADS_TABLE, olympiads)
 
     @staticmethod
     def export_statistics(stats: dict) -> io.BytesIO:
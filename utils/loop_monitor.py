@@ -0,0 +1,108 @@
+"""
+Детектор блокировок event loop (режим отладки)
+
+Включается переменной окружения DEBUG_LOOP_BLOCKING_MS (порог в мс).
+Корутина-пульс обновляет отметку времени в цикле событий, а отдельный
+поток-сторож проверяет ее: если цикл не отвечает дольше порога, в лог
+пишется текущий стек потока цикла - то есть тот код, который держит
+цикл (синхронный запрос к БД, тяжелый парсинг и т.п.).
+
+Дополнительно включается режим отладки asyncio с тем же порогом
+slow_callback_duration: asyncio сам сообщает о медленных callback'ах.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopBlockingMonitor:
+    """Сторож, логирующий стек цикла событий при его блокировке"""
+
+    def __init__(self, threshold_ms: float):
+        self.threshold = threshold_ms / 1000
+        self.interval = min(self.threshold / 2, 0.1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запускает сторож для текущего цикла событий"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._loop.set_debug(True)
+        self._loop.slow_callback_duration = self.threshold
+        self._last_beat = time.monotonic()
+
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+        logger.info("Детектор блокировок event loop включен (порог %.0f мс)", self.threshold * 1000)
+
+    async def stop(self):
+        """Останавливает сторож"""
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat
+            # Пульс опаздывает на интервал сна - его не считаем блокировкой
+            if blocked_for - self.interval < self.threshold or beat == reported_beat:
+                continue
+
+            # Об одной блокировке сообщаем один раз
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<стек недоступен>"
+            logger.warning(
+                "Event loop заблокирован дольше %.0f мс (уже %.0f мс). Стек:\n%s",
+                self.threshold * 1000, (blocked_for - self.interval) * 1000, stack
+            )
+
+
+def start_loop_monitor() -> Optional[LoopBlockingMonitor]:
+    """
+    Запускает детектор, если задана DEBUG_LOOP_BLOCKING_MS
+
+    Returns:
+        Запущенный монитор или None, если детектор выключен
+    """
+    value = os.getenv("DEBUG_LOOP_BLOCKING_MS", "").strip()
+    if not value:
+        return None
+
+    try:
+        threshold_ms = float(value)
+    except ValueError:
+        logger.error("Некорректное значение DEBUG_LOOP_BLOCKING_MS: %s", value)
+        return None
+
+    if threshold_ms <= 0:
+        return None
+
+    monitor = LoopBlockingMonitor(threshold_ms)
+    monitor.start()
+    return monitor
@@ -7,7 +7,8 @@ import os
 import logging
 from dotenv import load_dotenv
 from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, distinct
+from sqlalchemy.ext.asyncio import AsyncSession
 
 load_dotenv()
 
@@ -17,7 +18,7 @@ logger = logging.getLogger(__name__)
 ADMIN_TELEGRAM_ID = os.getenv("ADMIN_TELEGRAM_ID")
 
 
-async def check_notifications_enabled(db: Session, student_id: Optional[int] = None, check_olympiad: bool = False) -> bool:
+async def check_notifications_enabled(db: AsyncSession, student_id: Optional[int] = None, check_olympiad: bool = False) -> bool:
     """
     Проверка, включены ли уведомления глобально и для конкретного ученика
 
@@ -32,7 +33,8 @@ async def check_notifications_enabled(db: Session, student_id: Optional[int] = N
     from database.models import NotificationSettings, Student
 
     # Проверяем глобальную настройку
-    global_settings = db.query(NotificationSettings).first()
+    result = await db.execute(select(NotificationSettings).limit(1))
+    global_settings = result.scalar_one_or_none()
     if global_settings and not global_settings.notifications_enabled:
         return False
 
@@ -42,14 +44,16 @@ async def check_notifications_enabled(db: Session, student_id: Optional[int] = N
 
     # Если указан ученик, проверяем его настройки
     if student_id:
-        student = db.query(Student).filter(Student.id == student_id).first()
-        if student and not student.notifications_enabled:
+        result = await db.execute(
+            select(Student.notifications_enabled).where(Student.id == student_id)
+        )
+        if result.scalar_one_or_none() is False:
             return False
 
     return True
 
 
-async def notify_admin_new_session(bot: Bot, subject: str, grade8_count: int, grade9_count: int, db: Session = None):
+async def notify_admin_new_session(bot: Bot, subject: str, grade8_count: int, grade9_count: int, db: AsyncSession = None):
     """
     Уведомление о создании новой сессии олимпиады
     """
@@ -75,7 +79,7 @@ async def notify_admin_new_session(bot: Bot, subject: str, grade8_count: int, gr
         logger.error(f"Ошибка отправки уведомления администратору: {e}")
 
 
-async def notify_admin_code_requested(bot: Bot, student_name: str, grade: int, subject: str, db: Session = None, student_id: int = None):
+async def notify_admin_code_requested(bot: Bot, student_name: str, grade: int, subject: str, db: AsyncSession = None, student_id: int = None):
     """
     Уведомление о запросе кода учеником
     """
@@ -100,7 +104,7 @@ async def notify_admin_code_requested(bot: Bot, student_name: str, grade: int, s
         logger.error(f"Ошибка отправки уведомления: {e}")
 
 
-async def notify_admin_screenshot_received(bot: Bot, student_name: str, subject: str, db: Session = None, student_id: int = None):
+async def notify_admin_screenshot_received(bot: Bot, student_name: str, subject: str, db: AsyncSession = None, student_id: int = None):
     """
     Уведомление о получении скриншота
     """
@@ -131,7 +135,7 @@ async def notify_admin_daily_summary(
     requested_code: int,
     submitted_screenshots: int,
     missing_screenshots: int,
-    db: Session = None
+    db: AsyncSession = None
 ):
     """
     Ежедневная сводка для администратора
@@ -167,7 +171,7 @@ async def notify_admin_daily_summary(
         logger.error(f"Ошибка отправки сводки: {e}")
 
 
-async def notify_admin_missing_screenshots(bot: Bot, students: List[Dict], db: Session = None):
+async def notify_admin_missing_screenshots(bot: Bot, students: List[Dict], db: AsyncSession = None):
     """
     Уведомление о учениках без скриншотов
     """
@@ -193,7 +197,7 @@ async def notify_admin_missing_screenshots(bot: Bot, students: List[Dict], db: S
         logger.error(f"Ошибка отправки списка: {e}")
 
 
-async def notify_admin_student_registered(bot: Bot, student_name: str, db: Session = None, student_id: int = None):
+async def notify_admin_student_registered(bot: Bot, student_name: str, db: AsyncSession = None, student_id: int = None):
     """
     Уведомление о регистрации нового ученика
     """
@@ -217,7 +221,7 @@ async def notify_admin_student_registered(bot: Bot, student_name: str, db: Sessi
         print(f"Ошибка отправки уведомления: {e}")
 
 
-async def notify_admin_error(bot: Bot, error_message: str, context: str = "", db: Session = None):
+async def notify_admin_error(bot: Bot, error_message: str, context: str = "", db: AsyncSession = None):
     """
     Уведомление об ошибке в системе
     """
@@ -241,7 +245,7 @@ async def notify_admin_error(bot: Bot, error_message: str, context: str = "", db
         logger.error(f"Ошибка отправки уведомления об ошибке: {e}")
 
 
-async def notify_students_olympiad_activated(bot: Bot, session_id: int, subject: str, date: str, db: Session):
+async def notify_students_olympiad_activated(bot: Bot, session_id: int, subject: str, date: str, db: AsyncSession):
     """
     Уведомление всем ученикам об активации олимпиады
 
@@ -254,7 +258,6 @@ async def notify_students_olympiad_activated(bot: Bot, session_id: int, subject:
     """
     from database.models import Student, OlympiadSession, OlympiadCode
     from datetime import datetime
-    from sqlalchemy import distinct
 
     # Проверяем, включены ли уведомления об олимпиадах
     if not await check_notifications_enabled(db, check_olympiad=True):
@@ -262,15 +265,17 @@ async def notify_students_olympiad_activated(bot: Bot, session_id: int, subject:
         return
 
     # Получаем список классов, для которых доступны коды в этой сессии
-    available_classes = db.query(distinct(OlympiadCode.class_number)).filter(
-        OlympiadCode.session_id == session_id
-    ).all()
+    result = await db.execute(
+        select(distinct(OlympiadCode.class_number)).where(
+            OlympiadCode.session_id == session_id
+        )
+    )
+    available_class_numbers = result.scalars().all()
 
-    if not available_classes:
+    if not available_class_numbers:
         logger.info(f"Нет доступных кодов для сессии {session_id}")
         return
 
-    available_class_numbers = [c[0] for c in available_classes]
     logger.info(f"Олимпиада '{subject}' имеет коды для классов: {available_class_numbers}")
 
     # Определяем минимальный класс с кодами
@@ -282,13 +287,17 @@ async def notify_students_olympiad_activated(bot: Bot, session_id: int, subject:
     logger.info(f"Уведомления будут отправлены ученикам от 5 до 11 класса (минимальный доступный: {min_available_class})")
 
     # Получаем всех зарегистрированных учеников с 5 по 11 класс
-    students = db.query(Student).filter(
-        Student.is_registered == True,
-        Student.notifications_enabled == True,
-        Student.telegram_id.isnot(None),
-        Student.class_number >= 5,
-        Student.class_number <= 11
-    ).all()
+    result = await db.execute(
+        select(Student.id, Student.telegram_id).where(
+            Student.is_registered == True,
+            Student.is_active == True,
+            Student.notifications_enabled == True,
+            Student.telegram_id.isnot(None),
+            Student.class_number >= 5,
+            Student.class_number <= 11
+        )
+    )
+    students = result.all()
 
     if not students:
         logger.info("Нет учеников для отправки уведомлений (нет учеников подходящих классов)")
@@ -308,25 +317,36 @@ async def notify_students_olympiad_activated(bot: Bot, session_id: int, subject:
         f"Вы можете получить код для участия, написав команду /get_code"
     )
 
-    # Отправляем уведомления
-    sent_count = 0
-    failed_count = 0
-
-    for student in students:
-        try:
-            await bot.send_message(student.telegram_id, message, parse_mode="HTML")
-            sent_count += 1
-            logger.info(f"Уведомление отправлено ученику {student.full_name} (ID: {student.telegram_id})")
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Ошибка отправки уведомления ученику {student.full_name}: {e}")
+    # Отправляем уведомления через движок рассылок: лимиты Telegram,
+    # повторы при 429 и продолжение после перезапуска без повторной отправки
+    from database.database import AsyncSessionLocal
+    from utils.broadcast import BroadcastEngine, BroadcastRecipient
+
+    recipients = [
+        BroadcastRecipient(student_id=student.id, chat_id=student.telegram_id)
+        for student in students
+    ]
+    engine = BroadcastEngine(bot, session_factory=AsyncSessionLocal)
+    stats = await engine.run(
+        f"olympiad_activated:{session_id}",
+        recipients,
+        text=message,
+        session_id=session_id,
+        parse_mode="HTML"
+    )
 
-    logger.info(f"Уведомления об олимпиаде '{subject}': отправлено {sent_count}, ошибок {failed_count}")
+    logger.info(
+        f"Уведомления об олимпиаде '{subject}': отправлено {stats.sent}, "
+        f"ошибок {stats.failed}, пропущено (уже отправлено) {stats.skipped}, "
+        f"{stats.rate:.1f} сообщ./с"
+    )
 
     # Помечаем, что уведомление отправлено
-    session = db.query(OlympiadSession).filter(OlympiadSession.id == session_id).first()
-    if session:
-        session.notification_sent = True
-        db.commit()
+    await db.execute(
+        update(OlympiadSession)
+        .where(OlympiadSession.id == session_id)
+        .values(notification_sent=True)
+    )
+    await db.commit()
 
-    return {"sent": sent_count, "failed": failed_count}
+    return stats.as_dict()
@@ -0,0 +1,313 @@
+"""
+Резервирование кодов 9 класса для 8-классников
+
+Избыток кодов 9 класса (кодов больше, чем учеников 9 класса) делится
+между параллелями 8 класса пропорционально численности методом
+наибольших остатков: сумма квот всегда равна объему резерва, остаток
+не теряется на округлении.
+
+Резервирование идемпотентно:
+- исходный код 9 класса помечается флагом is_reserve и больше не
+  выдается 9-классникам и не резервируется повторно;
+- квота параллели уменьшается на уже созданные для нее резервные коды,
+  поэтому повторный запуск досоздает только недостающее.
+
+План (квоты) считается одним агрегирующим запросом, запись - одним
+запросом на PostgreSQL (UPDATE ... RETURNING в CTE + INSERT ... SELECT).
+"""
+
+import logging
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, List, Tuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Grade8ReserveCode, moscow_now
+
+logger = logging.getLogger(__name__)
+
+RESERVE_SOURCE_CLASS = 9
+RESERVE_TARGET_CLASS = 8
+
+# Код 9 класса свободен: не зарезервирован, не распределен и не выдан
+_FREE_CODE = """
+    NOT COALESCE(is_reserve, false)
+    AND NOT COALESCE(is_assigned, false)
+    AND NOT COALESCE(is_issued, false)
+    AND student_id IS NULL
+"""
+
+_PLAN_QUERY = f"""
+WITH source AS (
+    SELECT
+        COUNT(*) AS total_codes,
+        COALESCE(SUM(CASE WHEN COALESCE(is_reserve, false) THEN 1 ELSE 0 END), 0) AS reserved_codes,
+        COALESCE(SUM(CASE WHEN {_FREE_CODE} THEN 1 ELSE 0 END), 0) AS free_codes
+    FROM olympiad_codes
+    WHERE session_id = :session_id AND class_number = :source_class
+),
+source_students AS (
+    SELECT COUNT(*) AS students FROM students WHERE class_number = :source_class AND is_active
+),
+target AS (
+    SELECT
+        s.total_codes, s.reserved_codes, s.free_codes, st.students AS source_students,
+        CASE
+            WHEN s.total_codes - st.students <= 0 THEN 0
+            WHEN s.total_codes - st.students < s.free_codes + s.reserved_codes THEN s.total_codes - st.students
+            ELSE s.free_codes + s.reserved_codes
+        END AS target
+    FROM source s CROSS JOIN source_students st
+),
+parallels AS (
+    SELECT '8' || COALESCE(parallel, '') AS class_parallel, CAST(COUNT(*) AS INTEGER) AS students
+    FROM students
+    WHERE class_number = :target_class AND is_active
+    GROUP BY COALESCE(parallel, '')
+),
+existing AS (
+    SELECT class_parallel, CAST(COUNT(*) AS INTEGER) AS reserved
+    FROM grade8_reserve_codes
+    WHERE session_id = :session_id
+    GROUP BY class_parallel
+),
+quotas AS (
+    SELECT
+        p.class_parallel,
+        p.students,
+        COALESCE(e.reserved, 0) AS already_reserved,
+        t.target * p.students / CAST(SUM(p.students) OVER () AS INTEGER) AS base,
+        t.target * p.students % CAST(SUM(p.students) OVER () AS INTEGER) AS remainder,
+        t.target
+    FROM parallels p
+    CROSS JOIN target t
+    LEFT JOIN existing e ON e.class_parallel = p.class_parallel
+),
+ranked AS (
+    SELECT
+        quotas.*,
+        ROW_NUMBER() OVER (ORDER BY remainder DESC, students DESC, class_parallel) AS remainder_rank,
+        target - CAST(SUM(base) OVER () AS INTEGER) AS leftover
+    FROM quotas
+)
+SELECT
+    t.total_codes, t.reserved_codes, t.free_codes, t.source_students, t.target,
+    r.class_parallel, r.students, r.already_reserved,
+    r.base + CASE WHEN r.remainder_rank <= r.leftover THEN 1 ELSE 0 END AS quota
+FROM target t
+LEFT JOIN ranked r ON 1 = 1
+ORDER BY r.class_parallel
+"""
+
+
+@dataclass
+class ParallelQuota:
+    """Квота резерва одной параллели"""
+    class_parallel: str
+    students: int
+    quota: int  # Сколько резервных кодов должно быть у параллели
+    already_reserved: int  # Сколько уже создано
+    to_reserve: int = 0  # Сколько будет создано сейчас
+
+    def as_dict(self) -> Dict:
+        return {
+            "class_parallel": self.class_parallel,
+            "students": self.students,
+            "quota": self.quota,
+            "already_reserved": self.already_reserved,
+            "to_reserve": self.to_reserve
+        }
+
+
+@dataclass
+class ReservePlan:
+    """План резервирования для сессии"""
+    session_id: int
+    total_codes: int = 0  # Всего кодов 9 класса
+    source_students: int = 0  # Учеников 9 класса
+    free_codes: int = 0  # Свободных (незарезервированных) кодов 9 класса
+    reserved_codes: int = 0  # Уже зарезервировано кодов 9 класса
+    target: int = 0  # Итоговый объем резерва
+    parallels: List[ParallelQuota] = field(default_factory=list)
+
+    @property
+    def surplus(self) -> int:
+        return self.total_codes - self.source_students
+
+    @property
+    def to_reserve(self) -> int:
+        return sum(p.to_reserve for p in self.parallels)
+
+
+async def plan_reserve(session: AsyncSession, session_id: int) -> ReservePlan:
+    """Считает квоты параллелей (без записи в БД)"""
+    result = await session.execute(
+        text(_PLAN_QUERY),
+        {
+            "session_id": session_id,
+            "source_class": RESERVE_SOURCE_CLASS,
+            "target_class": RESERVE_TARGET_CLASS
+        }
+    )
+    rows = result.mappings().all()
+
+    first = rows[0]
+    plan = ReservePlan(
+        session_id=session_id,
+        total_codes=first["total_codes"],
+        source_students=first["source_students"],
+        free_codes=first["free_codes"],
+        reserved_codes=first["reserved_codes"],
+        target=first["target"]
+    )
+
+    # Резерв не превышает целевой объем, даже если квоты параллелей сдвинулись
+    available = min(plan.free_codes, max(0, plan.target - plan.reserved_codes))
+    for row in rows:
+        if row["class_parallel"] is None:
+            continue
+        quota = ParallelQuota(
+            class_parallel=row["class_parallel"],
+            students=row["students"],
+            quota=row["quota"],
+            already_reserved=row["already_reserved"]
+        )
+        quota.to_reserve = min(max(0, quota.quota - quota.already_reserved), available)
+        available -= quota.to_reserve
+        plan.parallels.append(quota)
+
+    return plan
+
+
+async def allocate_reserve(
+    session: AsyncSession,
+    session_id: int,
+    dry_run: bool = False
+) -> Dict:
+    """
+    Резервирует коды 9 класса для параллелей 8 класса
+
+    Args:
+        session: Сессия БД
+        session_id: ID сессии олимпиады
+        dry_run: Только посчитать план, ничего не записывая
+
+    Returns:
+        Результат в формате API: message, reserved, parallels, distribution, plan
+    """
+    plan = await plan_reserve(session, session_id)
+    logger.info(
+        f"Резерв 9→8 для сессии {session_id}: кодов 9 класса {plan.total_codes}, "
+        f"учеников 9 класса {plan.source_students}, избыток {plan.surplus}, "
+        f"объем резерва {plan.target}, уже зарезервировано {plan.reserved_codes}"
+    )
+
+    response = {
+        "reserved": 0,
+        "parallels": len(plan.parallels),
+        "distribution": {p.class_parallel: p.to_reserve for p in plan.parallels},
+        "plan": [p.as_dict() for p in plan.parallels],
+        "dry_run": dry_run
+    }
+
+    if not plan.parallels:
+        return {**response, "message": "Нет учеников 8 класса"}
+    if plan.surplus <= 0:
+        return {
+            **response,
+            "message": f"Нет избыточных кодов 9 класса (всего кодов: {plan.total_codes}, учеников: {plan.source_students})"
+        }
+    if plan.to_reserve == 0:
+        return {**response, "message": f"Резерв уже создан: {plan.reserved_codes} кодов, новых не требуется"}
+
+    if dry_run:
+        return {**response, "message": f"План: будет зарезервировано {plan.to_reserve} кодов из 9 класса для 8 классов"}
+
+    reserved = await _write_reserve(session, plan)
+    await session.commit()
+
+    for quota in plan.parallels:
+        logger.info(
+            f"Для {quota.class_parallel}: {quota.students} учеников, квота {quota.quota}, "
+            f"было {quota.already_reserved}, добавлено {quota.to_reserve}"
+        )
+
+    return {
+        **response,
+        "reserved": reserved,
+        "message": f"Зарезервировано {reserved} кодов из 9 класса для 8 классов (пропорционально численности)"
+    }
+
+
+def _slot_case(plan: ReservePlan) -> Tuple[str, Dict]:
+    """CASE, раздающий пронумерованные коды параллелям по их квотам"""
+    whens = []
+    params = {}
+    upper = 0
+    for i, quota in enumerate(p for p in plan.parallels if p.to_reserve > 0):
+        upper += quota.to_reserve
+        whens.append(f"WHEN rn <= :slot_{i} THEN CAST(:parallel_{i} AS VARCHAR)")
+        params[f"slot_{i}"] = upper
+        params[f"parallel_{i}"] = quota.class_parallel
+    return f"CASE {' '.join(whens)} END", params
+
+
+async def _write_reserve(session: AsyncSession, plan: ReservePlan) -> int:
+    """Помечает исходные коды флагом is_reserve и создает резервные коды"""
+    params = {
+        "session_id": plan.session_id,
+        "source_class": RESERVE_SOURCE_CLASS,
+        "limit": plan.to_reserve,
+        "created_at": moscow_now()
+    }
+    free_codes = f"""
+        SELECT id FROM olympiad_codes
+        WHERE session_id = :session_id AND class_number = :source_class AND {_FREE_CODE}
+        ORDER BY id
+        LIMIT :limit
+    """
+
+    if session.get_bind().dialect.name == "postgresql":
+        # Один запрос: захват кодов флагом и вставка резерва
+        slot_case, slot_params = _slot_case(plan)
+        result = await session.execute(
+            text(f"""
+                WITH claimed AS (
+                    UPDATE olympiad_codes SET is_reserve = true
+                    WHERE id IN ({free_codes} FOR UPDATE SKIP LOCKED)
+                    RETURNING id, code
+                ),
+                numbered AS (
+                    SELECT code, ROW_NUMBER() OVER (ORDER BY id) AS rn FROM claimed
+                )
+                INSERT INTO grade8_reserve_codes (session_id, class_parallel, code, is_used, created_at)
+                SELECT CAST(:session_id AS INTEGER), {slot_case}, code, false, CAST(:created_at AS TIMESTAMP)
+                FROM numbered
+            """),
+            {**params, **slot_params}
+        )
+        return result.rowcount
+
+    # Без CTE с изменением данных (SQLite): захват и многострочная вставка
+    result = await session.execute(
+        text(f"UPDATE olympiad_codes SET is_reserve = true WHERE id IN ({free_codes}) RETURNING id, code"),
+        params
+    )
+    claimed = iter(code for _, code in sorted(result.all()))
+
+    rows = []
+    for quota in plan.parallels:
+        for code in islice(claimed, quota.to_reserve):
+            rows.append({
+                "session_id": plan.session_id,
+                "class_parallel": quota.class_parallel,
+                "code": code,
+                "is_used": False,
+                "created_at": params["created_at"]
+            })
+
+    if rows:
+        await session.execute(insert(Grade8ReserveCode), rows)
+    return len(rows)
@@ -0,0 +1,442 @@
+"""
+Сверка списка учеников с базой
+
+Новый список (из Excel/CSV) загружается во временную таблицу, и разница
+с таблицей students считается запросами над множествами:
+- added       - строки списка без пары в базе;
+- updated     - ученики, у которых изменились класс/параллель
+                или которые возвращаются после выбытия;
+- deactivated - активные ученики, которых нет в списке;
+- unchanged   - без изменений.
+
+Сопоставление идет по нормализованному ФИО (регистр, ё/е, лишние
+пробелы), в режиме "name_class" - еще и по классу. Однофамильцы
+сопоставляются по шагам: сначала по ФИО, классу и параллели, затем
+оставшиеся - по ФИО и классу, затем (режим "name") - только по ФИО;
+каждая строка списка и каждый ученик попадают не больше чем в одну
+пару. class_offset
+позволяет сверять список следующего учебного года: при переводе
+(class_offset=1) ученик 7 класса в базе сопоставляется с 8 классом
+в списке.
+
+preview=True только считает разницу. Иначе все изменения применяются
+в одной транзакции: пакетные UPDATE, многострочный INSERT новых учеников
+и записи в student_history.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from sqlalchemy import insert, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import events
+from database.models import Student, StudentHistory, moscow_now
+from utils.student_import import StudentImporter
+
+logger = logging.getLogger(__name__)
+
+MATCH_NAME = "name"
+MATCH_NAME_CLASS = "name_class"
+
+STAGING_TABLE = "roster_staging"
+KEYS_TABLE = "roster_student_keys"
+PAIRS_TABLE = "roster_pairs"
+TEMP_TABLES = (STAGING_TABLE, KEYS_TABLE, PAIRS_TABLE)
+
+
+def normalize_name(full_name: str) -> str:
+    """Ключ сопоставления ФИО: нижний регистр, ё -> е, одиночные пробелы"""
+    return " ".join(full_name.replace("Ё", "Е").replace("ё", "е").split()).lower()
+
+
+def _pg_name_key(column: str) -> str:
+    """То же, что normalize_name, средствами PostgreSQL"""
+    return f"lower(btrim(regexp_replace(translate({column}, 'Ёё', 'Ее'), '[[:space:]]+', ' ', 'g')))"
+
+
+@dataclass
+class RosterDiff:
+    """Разница между списком и базой"""
+    added: List[Dict] = field(default_factory=list)
+    updated: List[Dict] = field(default_factory=list)
+    deactivated: List[Dict] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    not_found: List[Dict] = field(default_factory=list)  # Нет в базе, а добавление выключено
+    duplicates: List[Dict] = field(default_factory=list)
+
+    def as_dict(self, preview: bool) -> Dict:
+        return {
+            "preview": preview,
+            "summary": {
+                "added": len(self.added),
+                "updated": len(self.updated),
+                "deactivated": len(self.deactivated),
+                "unchanged": len(self.unchanged),
+                "not_found": len(self.not_found),
+                "duplicates": len(self.duplicates)
+            },
+            "added": self.added,
+            "updated": self.updated,
+            "deactivated": self.deactivated,
+            "unchanged": self.unchanged,
+            "not_found": self.not_found,
+            "duplicates": self.duplicates
+        }
+
+
+class RosterSync:
+    """Сверка и применение списка учеников"""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        match: str = MATCH_NAME,
+        class_offset: int = 0,
+        add_new: bool = True,
+        deactivate_missing: bool = True
+    ):
+        """
+        Args:
+            session: Сессия БД
+            match: "name" - по ФИО, "name_class" - по ФИО и классу
+            class_offset: Сдвиг класса базы относительно списка (1 - перевод в следующий класс)
+            add_new: Создавать учеников, которых нет в базе
+            deactivate_missing: Деактивировать активных учеников, которых нет в списке
+        """
+        if match not in (MATCH_NAME, MATCH_NAME_CLASS):
+            raise ValueError(f"Неизвестный режим сопоставления: {match}")
+
+        self.session = session
+        self.match = match
+        self.class_offset = class_offset
+        self.add_new = add_new
+        self.deactivate_missing = deactivate_missing
+
+    async def run(self, students: Iterable[Dict], preview: bool = False) -> Dict:
+        """
+        Сверяет список с базой и (если не preview) применяет изменения
+
+        Args:
+            students: Dict с ключами full_name, class_number, parallel
+                (и row_number, если есть)
+            preview: Только показать разницу
+
+        Returns:
+            Разница (RosterDiff.as_dict)
+        """
+        try:
+            diff = await self.diff(students)
+            if preview:
+                await self.session.rollback()
+            else:
+                await self._apply(diff)
+                await self.session.commit()
+                await events.publish(self.session, events.TOPIC_STUDENTS_CHANGED)
+        except Exception:
+            await self.session.rollback()
+            raise
+
+        logger.info(
+            f"Сверка списка{' (предпросмотр)' if preview else ''}: "
+            f"добавлено {len(diff.added)}, обновлено {len(diff.updated)}, "
+            f"деактивировано {len(diff.deactivated)}, без изменений {len(diff.unchanged)}"
+        )
+        return diff.as_dict(preview)
+
+    async def diff(self, students: Iterable[Dict]) -> RosterDiff:
+        """Загружает список во временную таблицу и считает разницу"""
+        diff = RosterDiff()
+        rows = self._dedupe(students, diff)
+
+        await self._stage(rows)
+        await self._pair()
+
+        for row in (await self.session.execute(text(self._matches_query()), self._params())).mappings():
+            new_parallel = row["parallel"] or None
+            if row["student_id"] is None:
+                item = {
+                    "name": row["full_name"],
+                    "class": row["class_number"],
+                    "parallel": new_parallel,
+                    "row_number": row["row_number"]
+                }
+                if self.add_new:
+                    diff.added.append({**item, "student_id": None})
+                else:
+                    diff.not_found.append(item)
+                continue
+
+            if (
+                row["old_class"] == row["class_number"]
+                and (row["old_parallel"] or None) == new_parallel
+                and row["is_active"]
+            ):
+                diff.unchanged.append(row["old_full_name"])
+                continue
+
+            diff.updated.append({
+                "name": row["old_full_name"],
+                "student_id": row["student_id"],
+                "old_class": row["old_class"],
+                "new_class": row["class_number"],
+                "old_parallel": row["old_parallel"],
+                "new_parallel": new_parallel,
+                "reactivated": not row["is_active"]
+            })
+
+        if self.deactivate_missing:
+            result = await self.session.execute(text(self._missing_query()), self._params())
+            for row in result.mappings():
+                diff.deactivated.append({
+                    "name": row["full_name"],
+                    "class": row["class_number"],
+                    "parallel": row["parallel"],
+                    "student_id": row["id"]
+                })
+
+        return diff
+
+    def _dedupe(self, students: Iterable[Dict], diff: RosterDiff) -> List[Dict]:
+        """Повторы строки (ФИО, класс, параллель) внутри списка: остается первая"""
+        rows = []
+        seen: Dict[tuple, int] = {}
+        for number, student in enumerate(students, start=1):
+            row_number = student.get("row_number") or number
+            name_key = normalize_name(student["full_name"])
+            key = (name_key, student.get("class_number"), student.get("parallel") or "")
+
+            if key in seen:
+                diff.duplicates.append({"name": student["full_name"], "rows": [seen[key], row_number]})
+                continue
+            seen[key] = row_number
+
+            rows.append({
+                "row_number": row_number,
+                "full_name": student["full_name"].strip(),
+                "name_key": name_key,
+                "class_number": student.get("class_number"),
+                "parallel": student.get("parallel") or ""
+            })
+        return rows
+
+    def _params(self) -> Dict:
+        return {"class_offset": self.class_offset}
+
+    async def _stage(self, rows: List[Dict]):
+        """Временные таблицы: строки списка, ключи ФИО учеников базы и пары"""
+        postgres = self.session.get_bind().dialect.name == "postgresql"
+
+        for table in TEMP_TABLES:
+            await self.session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        await self.session.execute(text(
+            f"CREATE TEMP TABLE {STAGING_TABLE} "
+            f"(row_number integer, full_name varchar(255), name_key varchar(255), "
+            f"class_number integer, parallel varchar(10))"
+        ))
+        await self.session.execute(text(
+            f"CREATE TEMP TABLE {KEYS_TABLE} (student_id integer, name_key varchar(255))"
+        ))
+        await self.session.execute(text(
+            f"CREATE TEMP TABLE {PAIRS_TABLE} (row_number integer, student_id integer)"
+        ))
+
+        if rows:
+            await self.session.execute(
+                text(
+                    f"INSERT INTO {STAGING_TABLE} (row_number, full_name, name_key, class_number, parallel) "
+                    f"VALUES (:row_number, :full_name, :name_key, :class_number, :parallel)"
+                ),
+                rows
+            )
+
+        if postgres:
+            # Обе стороны нормализуются одной функцией БД
+            await self.session.execute(text(
+                f"UPDATE {STAGING_TABLE} SET name_key = {_pg_name_key('full_name')}"
+            ))
+            await self.session.execute(text(
+                f"INSERT INTO {KEYS_TABLE} (student_id, name_key) "
+                f"SELECT id, {_pg_name_key('full_name')} FROM students"
+            ))
+        else:
+            # lower() в SQLite не работает с кириллицей - ключи считаются в Python
+            result = await self.session.execute(text("SELECT id, full_name FROM students"))
+            keys = [{"student_id": id_, "name_key": normalize_name(name)} for id_, name in result]
+            if keys:
+                await self.session.execute(
+                    text(f"INSERT INTO {KEYS_TABLE} (student_id, name_key) VALUES (:student_id, :name_key)"),
+                    keys
+                )
+
+    async def _pair(self):
+        """
+        Пары (строка списка, ученик базы) - по шагам от точного совпадения к общему
+
+        На каждом шаге оставшиеся без пары строки и ученики группируются по
+        ключу шага и в каждой группе сопоставляются по порядку: строки - по
+        номеру, ученики - сначала активные, затем по id. Так два ученика
+        "Иванов Иван" из 5А и 5Б получают каждый свою строку списка.
+        """
+        steps = [("class", "parallel"), ("class",)]
+        if self.match == MATCH_NAME:
+            steps.append(())
+
+        for step in steps:
+            await self.session.execute(text(self._pair_step_query(step)), self._params())
+
+    def _pair_step_query(self, step: tuple) -> str:
+        row_keys = {"class": "r.class_number", "parallel": "r.parallel"}
+        student_keys = {"class": "e.class_number + :class_offset", "parallel": "COALESCE(e.parallel, '')"}
+
+        row_columns = "".join(f", {row_keys[key]} AS {key}_key" for key in step)
+        student_columns = "".join(f", {student_keys[key]} AS {key}_key" for key in step)
+        partition = "".join(f", {key}_key" for key in step)
+        join = "".join(f" AND s.{key}_key = r.{key}_key" for key in step)
+
+        return f"""
+            INSERT INTO {PAIRS_TABLE} (row_number, student_id)
+            SELECT r.row_number, s.student_id
+            FROM (
+                SELECT row_number, name_key{partition},
+                       ROW_NUMBER() OVER (PARTITION BY name_key{partition} ORDER BY row_number) AS position
+                FROM (
+                    SELECT r.row_number, r.name_key{row_columns}
+                    FROM {STAGING_TABLE} r
+                    WHERE NOT EXISTS (SELECT 1 FROM {PAIRS_TABLE} p WHERE p.row_number = r.row_number)
+                ) r
+            ) r
+            JOIN (
+                SELECT student_id, name_key{partition},
+                       ROW_NUMBER() OVER (
+                           PARTITION BY name_key{partition}
+                           ORDER BY CASE WHEN is_active THEN 0 ELSE 1 END, student_id
+                       ) AS position
+                FROM (
+                    SELECT e.id AS student_id, k.name_key, e.is_active{student_columns}
+                    FROM {KEYS_TABLE} k
+                    JOIN students e ON e.id = k.student_id
+                    WHERE NOT EXISTS (SELECT 1 FROM {PAIRS_TABLE} p WHERE p.student_id = e.id)
+                ) e
+            ) s ON s.name_key = r.name_key{join} AND s.position = r.position
+        """
+
+    def _matches_query(self) -> str:
+        return f"""
+            SELECT
+                r.row_number, r.full_name, r.class_number, r.parallel,
+                e.id AS student_id, e.full_name AS old_full_name,
+                e.class_number AS old_class, e.parallel AS old_parallel, e.is_active
+            FROM {STAGING_TABLE} r
+            LEFT JOIN {PAIRS_TABLE} p ON p.row_number = r.row_number
+            LEFT JOIN students e ON e.id = p.student_id
+            ORDER BY r.row_number
+        """
+
+    def _missing_query(self) -> str:
+        return f"""
+            SELECT s.id, s.full_name, s.class_number, s.parallel
+            FROM students s
+            WHERE s.is_active
+              AND NOT EXISTS (SELECT 1 FROM {PAIRS_TABLE} p WHERE p.student_id = s.id)
+            ORDER BY s.class_number, s.parallel, s.full_name
+        """
+
+    async def _apply(self, diff: RosterDiff):
+        """Применяет разницу в текущей транзакции"""
+        now = moscow_now()
+        history = []
+
+        if diff.updated:
+            await self.session.execute(
+                update(Student),
+                [
+                    {
+                        "id": item["student_id"],
+                        "class_number": item["new_class"],
+                        "parallel": item["new_parallel"],
+                        "is_active": True,
+                        "updated_at": now
+                    }
+                    for item in diff.updated
+                ]
+            )
+            for item in diff.updated:
+                history.append({
+                    "student_id": item["student_id"],
+                    "action": "reactivated" if item["reactivated"] else "class_changed",
+                    "old_data": json.dumps(
+                        {"class_number": item["old_class"], "parallel": item["old_parallel"]},
+                        ensure_ascii=False
+                    ),
+                    "new_data": json.dumps(
+                        {"class_number": item["new_class"], "parallel": item["new_parallel"]},
+                        ensure_ascii=False
+                    ),
+                    "created_at": now
+                })
+
+        if diff.deactivated:
+            await self.session.execute(
+                update(Student),
+                [
+                    {"id": item["student_id"], "is_active": False, "updated_at": now}
+                    for item in diff.deactivated
+                ]
+            )
+            for item in diff.deactivated:
+                history.append({
+                    "student_id": item["student_id"],
+                    "action": "deactivated",
+                    "old_data": json.dumps({"is_active": True}),
+                    "new_data": json.dumps({"is_active": False}),
+                    "created_at": now
+                })
+
+        if diff.added:
+            importer = StudentImporter(self.session, skip_existing=False)
+            created = await importer.add(
+                {"full_name": item["name"], "class_number": item["class"], "parallel": item["parallel"]}
+                for item in diff.added
+            )
+            for item, student in zip(diff.added, created):
+                item["student_id"] = student["id"]
+                item["registration_code"] = student["registration_code"]
+                history.append({
+                    "student_id": student["id"],
+                    "action": "created",
+                    "old_data": None,
+                    "new_data": json.dumps(
+                        {"full_name": item["name"], "class_number": item["class"], "parallel": item["parallel"]},
+                        ensure_ascii=False
+                    ),
+                    "created_at": now
+                })
+
+        if history:
+            await self.session.execute(insert(StudentHistory), history)
+
+        for table in TEMP_TABLES:
+            await self.session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+
+async def sync_roster(
+    session: AsyncSession,
+    students: Iterable[Dict],
+    preview: bool = False,
+    match: str = MATCH_NAME,
+    class_offset: int = 0,
+    add_new: bool = True,
+    deactivate_missing: bool = True
+) -> Dict:
+    """Сверяет список учеников с базой (см. RosterSync)"""
+    sync = RosterSync(
+        session,
+        match=match,
+        class_offset=class_offset,
+        add_new=add_new,
+        deactivate_missing=deactivate_missing
+    )
+    return await sync.run(students, preview=preview)
@@ -2,10 +2,13 @@
 Планировщик задач для отложенных уведомлений
 """
 
-import asyncio
-from datetime import datetime, timedelta
+import os
+from datetime import datetime
 from aiogram import Bot
-from database.database import SessionLocal
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import select
+from database.database import AsyncSessionLocal
+from database import crud, events
 from database.models import OlympiadSession, MOSCOW_TZ, moscow_now
 from utils.notifications import notify_students_olympiad_activated
 import logging
@@ -13,42 +16,153 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-async def send_pending_olympiad_notifications(bot: Bot):
+NOTIFICATION_JOB_PREFIX = "olympiad_notification"
+COUNTER_COMPACT_SECONDS = int(os.getenv("COUNTER_COMPACT_SECONDS", "60"))
+
+
+def _notification_job_id(session_id: int) -> str:
+    return f"{NOTIFICATION_JOB_PREFIX}:{session_id}"
+
+
+async def send_olympiad_notification(bot: Bot, session_id: int):
     """
-    Проверяет и отправляет отложенные уведомления об олимпиадах
+    Отправляет отложенное уведомление об олимпиаде
 
-    Вызывается планировщиком каждую минуту после 9:00
+    Вызывается date-задачей планировщика в запланированное время.
+    Перед отправкой состояние сессии перечитывается: если сессию
+    деактивировали или уведомление уже ушло, задача ничего не делает.
     """
-    db = SessionLocal()
     try:
-        current_time = moscow_now()
-
-        # Находим сессии с запланированными уведомлениями
-        sessions = db.query(OlympiadSession).filter(
-            OlympiadSession.notification_sent == False,
-            OlympiadSession.notification_scheduled_for.isnot(None),
-            OlympiadSession.notification_scheduled_for <= current_time,
-            OlympiadSession.is_active == True
-        ).all()
-
-        for session in sessions:
-            try:
-                logger.info(f"Отправка отложенного уведомления для олимпиады: {session.subject}")
-                await notify_students_olympiad_activated(
-                    bot=bot,
-                    session_id=session.id,
-                    subject=session.subject,
-                    date=session.date.isoformat() if session.date else "",
-                    db=db
-                )
-                logger.info(f"Отложенное уведомление отправлено для олимпиады: {session.subject}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки отложенного уведомления для олимпиады {session.subject}: {e}")
+        async with AsyncSessionLocal() as db:
+            session = await db.get(OlympiadSession, session_id)
+
+            if (
+                not session
+                or not session.is_active
+                or session.notification_sent
+                or session.notification_scheduled_for is None
+            ):
+                logger.info(f"Отложенное уведомление для сессии {session_id} больше не актуально")
+                return
+
+            logger.info(f"Отправка отложенного уведомления для олимпиады: {session.subject}")
+            await notify_students_olympiad_activated(
+                bot=bot,
+                session_id=session.id,
+                subject=session.subject,
+                date=session.date.isoformat() if session.date else "",
+                db=db
+            )
+            logger.info(f"Отложенное уведомление отправлено для олимпиады: {session.subject}")
+
+    except Exception as e:
+        logger.error(f"Ошибка отправки отложенного уведомления для сессии {session_id}: {e}")
+
+
+def schedule_olympiad_notification(scheduler: AsyncIOScheduler, bot: Bot, session_id: int, run_at: datetime):
+    """
+    Регистрирует date-задачу отправки уведомления
+
+    Args:
+        scheduler: Планировщик бота
+        bot: Экземпляр бота
+        session_id: ID сессии олимпиады
+        run_at: Время отправки (naive - московское время, как в БД)
+    """
+    if run_at.tzinfo is None:
+        run_at = run_at.replace(tzinfo=MOSCOW_TZ)
+
+    # misfire_grace_time=None: если бот был остановлен в момент срабатывания,
+    # уведомление уходит сразу после запуска
+    scheduler.add_job(
+        send_olympiad_notification,
+        'date',
+        run_date=run_at,
+        args=[bot, session_id],
+        id=_notification_job_id(session_id),
+        replace_existing=True,
+        misfire_grace_time=None
+    )
+    logger.info(f"Уведомление для сессии {session_id} запланировано на {run_at.isoformat()}")
+
+
+async def restore_olympiad_notification_jobs(scheduler: AsyncIOScheduler, bot: Bot) -> int:
+    """
+    Восстанавливает задачи уведомлений из notification_scheduled_for
+
+    Вызывается при запуске бота и после переподключения к каналу событий.
 
+    Returns:
+        Количество запланированных задач
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(OlympiadSession.id, OlympiadSession.notification_scheduled_for).where(
+                OlympiadSession.notification_sent == False,
+                OlympiadSession.notification_scheduled_for.isnot(None),
+                OlympiadSession.is_active == True
+            )
+        )
+        pending = result.all()
+
+    for session_id, run_at in pending:
+        schedule_olympiad_notification(scheduler, bot, session_id, run_at)
+
+    return len(pending)
+
+
+def setup_olympiad_notifications(scheduler: AsyncIOScheduler, bot: Bot):
+    """
+    Подписывает планировщик на события планирования уведомлений
+
+    API активирует сессию в другом процессе и публикует событие
+    TOPIC_NOTIFICATION_SCHEDULED с ID сессии; бот по нему ставит
+    date-задачу. Пустой payload (переподключение к каналу, когда события
+    могли потеряться) - полная пересборка задач из БД.
+    """
+    async def on_notification_scheduled(payload: str):
+        try:
+            if payload:
+                async with AsyncSessionLocal() as db:
+                    session = await db.get(OlympiadSession, int(payload))
+                if session and session.notification_scheduled_for and not session.notification_sent:
+                    schedule_olympiad_notification(
+                        scheduler, bot, session.id, session.notification_scheduled_for
+                    )
+            else:
+                await restore_olympiad_notification_jobs(scheduler, bot)
+        except Exception as e:
+            logger.error(f"Ошибка планирования уведомления (событие '{payload}'): {e}")
+
+    events.subscribe(events.TOPIC_NOTIFICATION_SCHEDULED, on_notification_scheduled)
+
+
+async def compact_code_counters():
+    """Сворачивает изменения счетчиков кодов (database/counters.py)"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await crud.compact_session_class_counters(db)
     except Exception as e:
-        logger.error(f"Ошибка в send_pending_olympiad_notifications: {e}")
-    finally:
-        db.close()
+        logger.error(f"Ошибка свертки счетчиков кодов: {e}")
+
+
+def setup_counter_compaction(scheduler: AsyncIOScheduler):
+    """
+    Периодическая свертка счетчиков кодов
+
+    Выдача кодов только добавляет строки изменений; задача раз в
+    COUNTER_COMPACT_SECONDS переносит их в строки счетчиков, чтобы
+    чтение статистики не суммировало растущую таблицу изменений.
+    """
+    scheduler.add_job(
+        compact_code_counters,
+        'interval',
+        seconds=COUNTER_COMPACT_SECONDS,
+        id='code_counters_compaction',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
 
 
 def should_delay_notification() -> tuple[bool, datetime]:
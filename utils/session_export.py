@@ -0,0 +1,280 @@
+"""
+Экспорт кодов сессии: ZIP с Excel файлами по классам и параллелям
+
+- данные читаются из БД одним запросом на таблицу (только нужные колонки);
+- книги строятся в рабочем потоке в режиме write_only и пишутся в архив
+  через временный файл, не держа книги и архив целиком в памяти;
+- готовый архив кэшируется на диске по "версии содержимого" сессии:
+  пока коды и ученики сессии не менялись, повторная выгрузка отдается
+  с диска без построения. Архив отдается уже открытым файлом: после
+  построения новой версии старая удаляется, но запросы, которые ее уже
+  открыли, дочитывают ее до конца.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import defaultdict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import BigInteger, Integer, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Grade8ReserveCode, OlympiadCode, OlympiadSession, Student
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "olympus_exports")
+EXPORT_FORMAT_VERSION = 1  # Увеличить при изменении формата файлов
+STREAM_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+HEADER_FILL = "D3D3D3"
+RESERVE_FILL = "FFF2CC"
+
+_build_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def session_content_version(session: AsyncSession, olympiad: OlympiadSession) -> str:
+    """
+    Версия содержимого выгрузки сессии
+
+    Меняется при загрузке/удалении кодов, распределении и выдаче
+    (student_id, assigned_at, issued_at), использовании резервных кодов
+    и изменении учеников (updated_at).
+    """
+    codes = (await session.execute(
+        select(
+            func.count(OlympiadCode.id),
+            func.max(OlympiadCode.id),
+            func.count(OlympiadCode.student_id),
+            func.sum(cast(OlympiadCode.id, BigInteger) * OlympiadCode.student_id),
+            func.max(OlympiadCode.assigned_at),
+            func.max(OlympiadCode.issued_at)
+        ).where(OlympiadCode.session_id == olympiad.id)
+    )).one()
+
+    reserve = (await session.execute(
+        select(
+            func.count(Grade8ReserveCode.id),
+            func.max(Grade8ReserveCode.id),
+            func.sum(cast(Grade8ReserveCode.is_used, Integer)),
+            func.sum(cast(Grade8ReserveCode.id, BigInteger) * Grade8ReserveCode.used_by_student_id),
+            func.max(Grade8ReserveCode.used_at)
+        ).where(Grade8ReserveCode.session_id == olympiad.id)
+    )).one()
+
+    students = (await session.execute(
+        select(func.count(Student.id), func.max(Student.id), func.max(Student.updated_at))
+    )).one()
+
+    fingerprint = repr((
+        EXPORT_FORMAT_VERSION, olympiad.subject, olympiad.date,
+        tuple(codes), tuple(reserve), tuple(students)
+    ))
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+
+
+async def load_export_rows(session: AsyncSession, session_id: int) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Строки выгрузки
+
+    Returns:
+        (коды: class_number, parallel, full_name, code - только распределенные ученикам с параллелью;
+         резерв: class_parallel, code, is_used, full_name использовавшего)
+    """
+    result = await session.execute(
+        select(OlympiadCode.class_number, Student.parallel, Student.full_name, OlympiadCode.code)
+        .join(Student, Student.id == OlympiadCode.student_id)
+        .where(
+            OlympiadCode.session_id == session_id,
+            Student.parallel.isnot(None),
+            Student.parallel != ""
+        )
+        .order_by(OlympiadCode.class_number, OlympiadCode.student_id, OlympiadCode.id)
+    )
+    codes = result.all()
+
+    result = await session.execute(
+        select(
+            Grade8ReserveCode.class_parallel, Grade8ReserveCode.code,
+            Grade8ReserveCode.is_used, Student.full_name
+        )
+        .outerjoin(Student, Student.id == Grade8ReserveCode.used_by_student_id)
+        .where(Grade8ReserveCode.session_id == session_id)
+        .order_by(Grade8ReserveCode.class_parallel, Grade8ReserveCode.id)
+    )
+    reserve = result.all()
+
+    return codes, reserve
+
+
+def build_session_zip(subject: str, codes: List[tuple], reserve: List[tuple], path: str):
+    """
+    Строит ZIP с книгами по классам и параллелям (синхронно, для рабочего потока)
+
+    Структура: "<класс>_класс/<класс><параллель>.xlsx"; в файлы 8 класса
+    добавляются резервные коды параллели из пула 9 класса.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+
+    codes_by_class_parallel: Dict[int, Dict[str, List[tuple]]] = defaultdict(lambda: defaultdict(list))
+    for class_number, parallel, full_name, code in codes:
+        codes_by_class_parallel[class_number][parallel].append((full_name, code))
+
+    # "8А" -> "А", "8И" -> "И"
+    reserve_by_parallel: Dict[str, List[tuple]] = defaultdict(list)
+    for class_parallel, code, is_used, used_by in reserve:
+        parallel = class_parallel[1:] if class_parallel.startswith('8') else class_parallel
+        reserve_by_parallel[parallel].append((code, is_used, used_by))
+
+    header_fill = PatternFill(start_color=HEADER_FILL, end_color=HEADER_FILL, fill_type="solid")
+    reserve_fill = PatternFill(start_color=RESERVE_FILL, end_color=RESERVE_FILL, fill_type="solid")
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for class_num in sorted(codes_by_class_parallel):
+            parallels = codes_by_class_parallel[class_num]
+
+            for parallel in sorted(parallels):
+                wb = Workbook(write_only=True)
+                ws = wb.create_sheet(f"{class_num}{parallel}")
+                ws.column_dimensions['A'].width = 40
+                ws.column_dimensions['B'].width = 30
+
+                def cell(value, **style):
+                    c = WriteOnlyCell(ws, value=value)
+                    for name, style_value in style.items():
+                        setattr(c, name, style_value)
+                    return c
+
+                # Заголовок
+                ws.append([
+                    cell(
+                        f"Коды для {class_num}{parallel} - {subject}",
+                        font=Font(bold=True, size=14),
+                        alignment=Alignment(horizontal='center')
+                    )
+                ])
+                ws.merged_cells.add("A1:B1")
+                ws.append([])
+
+                # Заголовки колонок
+                ws.append([
+                    cell("ФИО", font=Font(bold=True), fill=header_fill),
+                    cell("Код", font=Font(bold=True), fill=header_fill)
+                ])
+
+                # Данные
+                row = 4
+                for full_name, code in parallels[parallel]:
+                    ws.append([full_name, code])
+                    row += 1
+
+                # Добавляем резервные коды для 8 класса
+                if class_num == 8 and parallel in reserve_by_parallel:
+                    if row > 4:  # Есть основные коды - добавляем разделитель
+                        ws.append([])
+                        row += 1
+                        ws.append([
+                            cell(
+                                "РЕЗЕРВНЫЕ КОДЫ (из пула 9 класса)",
+                                font=Font(bold=True, italic=True),
+                                fill=reserve_fill
+                            )
+                        ])
+                        ws.merged_cells.add(f"A{row}:B{row}")
+                        row += 1
+
+                    for code, is_used, used_by in reserve_by_parallel[parallel]:
+                        # Если код уже использован, показываем кто его получил
+                        if is_used and used_by:
+                            name = cell(f"{used_by} (резервный)", font=Font(italic=True, color="0070C0"))
+                        else:
+                            name = "Резервный код"
+                        ws.append([name, code])
+                        row += 1
+
+                # Книга - во временный файл, оттуда потоком в архив
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                    wb.save(spool)
+                    spool.seek(0)
+                    arcname = f"{class_num}_класс/{class_num}{parallel}.xlsx"
+                    with zip_file.open(arcname, 'w') as entry:
+                        shutil.copyfileobj(spool, entry, STREAM_CHUNK_SIZE)
+
+
+def _cache_path(session_id: int, version: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, f"session_{session_id}_{version}.zip")
+
+
+def _drop_stale(session_id: int, keep: str):
+    """Удаляет устаревшие архивы сессии"""
+    prefix = f"session_{session_id}_"
+    for name in os.listdir(EXPORT_CACHE_DIR):
+        path = os.path.join(EXPORT_CACHE_DIR, name)
+        if name.startswith(prefix) and name.endswith(".zip") and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _open_cached(path: str) -> Optional[BinaryIO]:
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+
+async def get_session_export(session: AsyncSession, olympiad: OlympiadSession) -> BinaryIO:
+    """
+    ZIP выгрузки сессии, открытый на чтение: из кэша или построенный заново
+
+    Файл открывается здесь, а не при отправке ответа: построение новой
+    версии удаляет старые архивы, и уже открытый файл остается читаемым.
+    Одновременные запросы одной версии строят архив один раз.
+    Закрывает файл вызывающий (iter_file).
+    """
+    version = await session_content_version(session, olympiad)
+    path = _cache_path(olympiad.id, version)
+    cached = _open_cached(path)
+    if cached is not None:
+        return cached
+
+    lock = _build_locks.setdefault(path, asyncio.Lock())
+    async with lock:
+        cached = _open_cached(path)
+        if cached is not None:
+            return cached
+
+        codes, reserve = await load_export_rows(session, olympiad.id)
+
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".part")
+        os.close(fd)
+        try:
+            await asyncio.to_thread(build_session_zip, olympiad.subject, codes, reserve, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        export = open(path, "rb")
+        _drop_stale(olympiad.id, keep=path)
+        logger.info(f"Выгрузка сессии {olympiad.id} построена: {len(codes)} кодов, {len(reserve)} резервных")
+
+    _build_locks.pop(path, None)
+    return export
+
+
+def iter_file(file: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Читает открытый файл порциями и закрывает его (для StreamingResponse)"""
+    with file:
+        while chunk := file.read(chunk_size):
+            yield chunk
@@ -0,0 +1,263 @@
+"""
+Статистика по ученикам и олимпиадам
+
+Все разрезы (классы, параллели, регистрация, отказ от уведомлений)
+считаются одним запросом с GROUP BY (class_number, parallel); итоги по
+классам и по всей школе складываются из групп в Python. Групп - десятки,
+поэтому стоимость не зависит от числа учеников. Используется эндпоинтами
+API и экранами статистики бота.
+
+Статистика кодов читается из счетчиков session_class_counters
+(database/counters.py), а не подсчетом по таблицам кодов; на СУБД без
+триггеров счетчики считаются группирующим запросом.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import crud
+from database.models import CodeRequest, OlympiadSession, Student
+
+
+@dataclass
+class GroupStats:
+    """Счетчики группы учеников (класс, параллель или вся школа)"""
+    class_number: Optional[int] = None
+    parallel: Optional[str] = None
+    total: int = 0
+    registered: int = 0
+    notifications_off: int = 0
+
+    @property
+    def unregistered(self) -> int:
+        return self.total - self.registered
+
+    @property
+    def display(self) -> str:
+        return f"{self.class_number}{self.parallel or ''}"
+
+    def add(self, other: "GroupStats"):
+        self.total += other.total
+        self.registered += other.registered
+        self.notifications_off += other.notifications_off
+
+
+@dataclass
+class StudentStatistics:
+    """Группы (класс, параллель), упорядоченные по классу и параллели"""
+    groups: List[GroupStats] = field(default_factory=list)
+
+    @property
+    def overall(self) -> GroupStats:
+        overall = GroupStats()
+        for group in self.groups:
+            overall.add(group)
+        return overall
+
+    def by_class(self) -> Dict[int, GroupStats]:
+        """Итоги по классам (ученики без класса не учитываются)"""
+        classes: Dict[int, GroupStats] = OrderedDict()
+        for group in self.groups:
+            if group.class_number is None:
+                continue
+            classes.setdefault(group.class_number, GroupStats(class_number=group.class_number)).add(group)
+        return classes
+
+    def by_parallel(self) -> List[GroupStats]:
+        """Группы с указанным классом (класс + параллель)"""
+        return [group for group in self.groups if group.class_number is not None]
+
+
+async def get_student_statistics(session: AsyncSession) -> StudentStatistics:
+    """Счетчики учеников по (класс, параллель) одним запросом"""
+    result = await session.execute(
+        select(
+            Student.class_number,
+            Student.parallel,
+            func.count(Student.id).label("total"),
+            func.count(Student.id).filter(Student.is_registered == True).label("registered"),
+            func.count(Student.id).filter(Student.notifications_enabled == False).label("notifications_off")
+        )
+        .where(Student.is_active == True)
+        .group_by(Student.class_number, Student.parallel)
+        .order_by(Student.class_number, Student.parallel)
+    )
+
+    return StudentStatistics(groups=[
+        GroupStats(
+            class_number=row.class_number,
+            parallel=row.parallel,
+            total=row.total,
+            registered=row.registered,
+            notifications_off=row.notifications_off
+        )
+        for row in result
+    ])
+
+
+async def get_olympiad_counts(session: AsyncSession) -> Dict[str, int]:
+    """Всего сессий олимпиад и активных (один запрос)"""
+    result = await session.execute(
+        select(
+            func.count(OlympiadSession.id).label("total"),
+            func.count(OlympiadSession.id).filter(OlympiadSession.is_active == True).label("active")
+        )
+    )
+    row = result.one()
+    return {"total": row.total, "active": row.active}
+
+
+async def get_overview(session: AsyncSession) -> Dict:
+    """Общая статистика системы: ученики, классы, олимпиады, активная олимпиада"""
+    stats = await get_student_statistics(session)
+    olympiads = await get_olympiad_counts(session)
+    active_session = await crud.get_active_session(session)
+    overall = stats.overall
+
+    return {
+        "students": {
+            "total": overall.total,
+            "registered": overall.registered,
+            "unregistered": overall.unregistered,
+            "notifications_off": overall.notifications_off
+        },
+        "olympiads": {
+            "total": olympiads["total"],
+            "active": 1 if active_session else 0,
+            "inactive": olympiads["total"] - (1 if active_session else 0)
+        },
+        "classes": [
+            {
+                "class_number": class_stats.class_number,
+                "total": class_stats.total,
+                "registered": class_stats.registered,
+                "unregistered": class_stats.unregistered,
+                "notifications_off": class_stats.notifications_off
+            }
+            for class_stats in stats.by_class().values()
+        ],
+        "parallels": [
+            {
+                "class_number": group.class_number,
+                "parallel": group.parallel,
+                "display": group.display,
+                "total": group.total,
+                "registered": group.registered,
+                "notifications_off": group.notifications_off
+            }
+            for group in stats.by_parallel()
+        ],
+        "active_olympiad": {
+            "id": active_session.id,
+            "subject": active_session.subject,
+            "date": active_session.date.isoformat()
+        } if active_session else None
+    }
+
+
+async def get_export_statistics(session: AsyncSession) -> Dict:
+    """Данные для ExcelExporter.export_statistics"""
+    stats = await get_student_statistics(session)
+    olympiads = await get_olympiad_counts(session)
+    overall = stats.overall
+
+    return {
+        "general": {
+            "Всего учеников": overall.total,
+            "Зарегистрировано": overall.registered,
+            "Не зарегистрировано": overall.unregistered,
+            "Отключили уведомления": overall.notifications_off,
+            "Всего олимпиад": olympiads["total"],
+            "Активных олимпиад": olympiads["active"]
+        },
+        "classes": [
+            {
+                "class_number": class_stats.class_number,
+                "total": class_stats.total,
+                "registered": class_stats.registered
+            }
+            for class_stats in stats.by_class().values()
+        ]
+    }
+
+
+async def get_codes_stats(session: AsyncSession) -> Dict:
+    """Коды по классам и резерв 8 класса по всем сессиям (из счетчиков)"""
+    by_class: Dict[int, Dict[str, int]] = {}
+    reserve = {"total": 0, "used": 0}
+
+    for counter in await crud.get_session_class_counters(session):
+        reserve["total"] += counter.reserve_total
+        reserve["used"] += counter.reserve_used
+        if counter.total:
+            totals = by_class.setdefault(counter.class_number, {"total": 0, "assigned": 0, "issued": 0})
+            totals["total"] += counter.total
+            totals["assigned"] += counter.assigned
+            totals["issued"] += counter.issued
+
+    return {
+        "by_class": {
+            f"grade{class_num}": {
+                "class": class_num,
+                "total": totals["total"],
+                "assigned": totals["assigned"],
+                "unassigned": totals["total"] - totals["assigned"],
+                "issued": totals["issued"]
+            }
+            for class_num, totals in sorted(by_class.items())
+        },
+        "grade8_reserve": {
+            "total": reserve["total"],
+            "used": reserve["used"],
+            "available": reserve["total"] - reserve["used"]
+        }
+    }
+
+
+async def get_olympiad_code_stats(session: AsyncSession, session_id: int) -> Dict:
+    """
+    Коды сессии по классам, резерв по параллелям 8 класса и запросы кодов
+
+    Коды и резерв - из счетчиков сессии, запросы - один агрегатный запрос.
+    """
+    classes = []
+    reserve = []
+    for counter in await crud.get_session_class_counters(session, session_id):
+        if counter.total:
+            classes.append({
+                "class_number": counter.class_number,
+                "total": counter.total,
+                "assigned": counter.assigned,
+                "issued": counter.issued,
+                "available": counter.total - counter.issued
+            })
+        if counter.reserve_total:
+            reserve.append({
+                "class_parallel": f"8{counter.parallel}",
+                "total": counter.reserve_total,
+                "used": counter.reserve_used,
+                "available": counter.reserve_total - counter.reserve_used
+            })
+
+    result = await session.execute(
+        select(
+            func.count(CodeRequest.id).label("total"),
+            func.count(CodeRequest.id).filter(CodeRequest.screenshot_submitted == True).label("with_screenshot")
+        ).where(CodeRequest.session_id == session_id)
+    )
+    requests = result.one()
+
+    return {
+        "classes": classes,
+        "reserve": reserve,
+        "requests": {
+            "total": requests.total,
+            "with_screenshot": requests.with_screenshot,
+            "without_screenshot": requests.total - requests.with_screenshot,
+            "completion_rate": int((requests.with_screenshot / requests.total) * 100) if requests.total > 0 else 0
+        }
+    }
@@ -0,0 +1,156 @@
+"""
+Массовая загрузка учеников
+
+StudentImporter добавляет учеников пачками:
+- уже существующие ФИО находятся одним запросом на пачку
+  (на PostgreSQL - список VALUES, соединенный с students);
+- новые ученики вставляются одним многострочным INSERT ... RETURNING,
+  регистрационные коды генерируются для всей пачки сразу.
+
+Если сгенерированный код совпал с уже существующим (уникальный индекс
+registration_code), строка пропускается ON CONFLICT DO NOTHING и
+вставляется повторно с новым кодом.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy import String, column, insert, select, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Student, moscow_now
+from utils.auth import generate_multiple_codes
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+MAX_CODE_ATTEMPTS = 5
+
+
+class StudentImporter:
+    """Пакетное создание учеников"""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        skip_existing: bool = True,
+        batch_size: int = IMPORT_BATCH_SIZE
+    ):
+        """
+        Args:
+            session: Сессия БД (коммит - на вызывающем коде)
+            skip_existing: Пропускать учеников, чьи ФИО уже есть в базе или
+                встречались раньше в загрузке
+            batch_size: Размер пачки (ограничивает число параметров запроса)
+        """
+        self.session = session
+        self.skip_existing = skip_existing
+        self.batch_size = batch_size
+        self.created: List[Dict] = []
+        self.skipped: List[str] = []
+        self._seen: Set[str] = set()
+
+    async def add(self, students: Iterable[Dict]) -> List[Dict]:
+        """
+        Добавляет учеников
+
+        Args:
+            students: Dict с ключами full_name и (необязательно)
+                class_number, parallel
+
+        Returns:
+            Созданные в этом вызове: id, full_name, registration_code,
+            class_number, parallel
+        """
+        students = list(students)
+        created = []
+        for start in range(0, len(students), self.batch_size):
+            created.extend(await self._add_batch(students[start:start + self.batch_size]))
+        self.created.extend(created)
+        return created
+
+    async def _add_batch(self, batch: List[Dict]) -> List[Dict]:
+        if self.skip_existing:
+            existing = await self._existing_names({s["full_name"] for s in batch} - self._seen)
+            new = []
+            for student in batch:
+                name = student["full_name"]
+                if name in self._seen or name in existing:
+                    self.skipped.append(name)
+                    continue
+                self._seen.add(name)
+                new.append(student)
+        else:
+            new = batch
+
+        pending = list(range(len(new)))
+        created: Dict[int, Dict] = {}
+        for _ in range(MAX_CODE_ATTEMPTS):
+            if not pending:
+                break
+            pending = await self._insert(new, pending, created)
+
+        if pending:
+            raise RuntimeError(f"Не удалось сгенерировать уникальные коды для {len(pending)} учеников")
+
+        return [created[i] for i in range(len(new))]
+
+    async def _existing_names(self, names: Set[str]) -> Set[str]:
+        """ФИО из пачки, которые уже есть в базе (один запрос)"""
+        if not names:
+            return set()
+
+        if self.session.get_bind().dialect.name == "postgresql":
+            incoming = values(column("full_name", String), name="incoming").data([(n,) for n in names])
+            statement = (
+                select(incoming.c.full_name)
+                .join(Student, Student.full_name == incoming.c.full_name)
+                .distinct()
+            )
+        else:
+            # SQLite не поддерживает имена колонок у VALUES в FROM
+            statement = select(Student.full_name).where(Student.full_name.in_(names)).distinct()
+
+        result = await self.session.execute(statement)
+        return set(result.scalars())
+
+    async def _insert(self, students: List[Dict], indexes: List[int], created: Dict[int, Dict]) -> List[int]:
+        """Вставляет учеников с новыми кодами; возвращает индексы, чьи коды оказались заняты"""
+        codes = generate_multiple_codes(len(indexes))
+        by_code = dict(zip(codes, indexes))
+        created_at = moscow_now()
+
+        rows = [
+            {
+                "full_name": students[i]["full_name"],
+                "registration_code": code,
+                "is_registered": False,
+                "class_number": students[i].get("class_number"),
+                "parallel": students[i].get("parallel"),
+                "created_at": created_at
+            }
+            for code, i in by_code.items()
+        ]
+
+        statement = self._insert_statement().values(rows).returning(
+            Student.id, Student.full_name, Student.registration_code,
+            Student.class_number, Student.parallel
+        )
+        result = await self.session.execute(statement)
+
+        for row in result.mappings():
+            created[by_code.pop(row["registration_code"])] = dict(row)
+
+        if by_code:
+            logger.info(f"Повторная генерация {len(by_code)} занятых регистрационных кодов")
+        return list(by_code.values())
+
+    def _insert_statement(self):
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            return insert(Student)
+        return dialect_insert(Student).on_conflict_do_nothing(index_elements=["registration_code"])
@@ -7,6 +7,7 @@ import logging
 
 from database.models import Student, StudentHistory
 from utils.auth import generate_multiple_codes
+from utils.roster_sync import MATCH_NAME, sync_roster
 
 logger = logging.getLogger(__name__)
 
@@ -179,81 +180,26 @@ class StudentManager:
     @staticmethod
     async def compare_and_update(
         session: AsyncSession,
-        new_students: List[Dict]
+        new_students: List[Dict],
+        preview: bool = False,
+        match: str = MATCH_NAME
     ) -> Dict:
         """
         Сравнивает новый список учеников с существующим и обновляет БД
         
+        Разница считается запросами над множествами (utils/roster_sync),
+        изменения применяются одной транзакцией.
+        
         Args:
             new_students: список словарей с ключами full_name, class_number
+                (и необязательно parallel)
+            preview: только посчитать разницу, ничего не меняя
+            match: "name" - по ФИО, "name_class" - по ФИО и классу
             
         Returns:
-            Dict с результатами сверки
+            Dict с результатами сверки: added, updated, deactivated, unchanged
         """
-        # Получаем всех активных учеников
-        result = await session.execute(
-            select(Student).where(Student.is_active == True)
-        )
-        existing_students = {s.full_name: s for s in result.scalars().all()}
-        
-        new_students_dict = {s["full_name"]: s for s in new_students}
-        
-        results = {
-            "added": [],
-            "updated": [],
-            "deactivated": [],
-            "unchanged": []
-        }
-        
-        # Находим учеников для добавления и обновления
-        for name, data in new_students_dict.items():
-            if name not in existing_students:
-                # Новый ученик
-                student = await StudentManager.create_student(
-                    session,
-                    full_name=name,
-                    class_number=data["class_number"]
-                )
-                results["added"].append({
-                    "name": name,
-                    "class": data["class_number"],
-                    "student_id": student.id
-                })
-            else:
-                # Существующий ученик
-                existing = existing_students[name]
-                if existing.class_number != data["class_number"]:
-                    # Изменился класс
-                    await StudentManager.change_class(
-                        session,
-                        student_id=existing.id,
-                        new_class=data["class_number"]
-                    )
-                    results["updated"].append({
-                        "name": name,
-                        "old_class": existing.class_number,
-                        "new_class": data["class_number"]
-                    })
-                else:
-                    results["unchanged"].append(name)
-        
-        # Находим учеников для деактивации
-        for name, student in existing_students.items():
-            if name not in new_students_dict:
-                await StudentManager.deactivate_student(session, student.id)
-                results["deactivated"].append({
-                    "name": name,
-                    "class": student.class_number,
-                    "student_id": student.id
-                })
-        
-        logger.info(
-            f"Сверка завершена: добавлено {len(results['added'])}, "
-            f"обновлено {len(results['updated'])}, "
-            f"деактивировано {len(results['deactivated'])}"
-        )
-        
-        return results
+        return await sync_roster(session, new_students, preview=preview, match=match)
     
     @staticmethod
     async def get_class_students(